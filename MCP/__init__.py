@@ -0,0 +1,3 @@
+# MCP package: the iverilog MCP server (iverilog_mcp_server.py), its simulators, jobs and metrics.
+# Modules import each other through this package (MCP.simulators), as the in-process simulation
+# backend does, so a process holds one copy of the simulator process registry and metrics.
@@ -1,6 +1,10 @@
 # fast_iverilog_client.py
 # Launch server
 # To run the client, poetry run python iverilog_mcp_client.py --endpoint http://localhost:8000/sse --working-dir ../RTLLM/Arithmetic/Adder/adder_8bit
+# Pick a simulator with --simulator icarus|verilator|auto, compare verdicts with --cross-check,
+# add a port trace around the first mismatch of a failing design with --trace,
+# run as a server-side job (submit_job, then get_result until it finishes) with --job,
+# stop at the first failure line with --fail-fast, print the simulator output as it runs with --stream
 
 import argparse
 import asyncio
@@ -10,11 +14,31 @@ from mcp import types
 
 
 
-async def main(endpoint: str, working_dir: str) -> None:
+async def print_line(message) -> None:
+    print(message.data, flush=True)
+
+
+async def run_job(endpoint: str, working_dir: str, simulator: str, trace: bool, fail_fast: bool) -> None:
     async with Client(endpoint) as client:
+        result = await client.call_tool(
+            "submit_job",
+            {"working_dir": working_dir, "simulator": simulator, "trace": trace, "fail_fast": fail_fast})
+        job = json.loads(result[0].text)
+        print(f"Submitted job {job['job_id']} (position {job.get('position', 0)})")
+        while job["status"] in ("queued", "running"):
+            result = await client.call_tool("get_result", {"job_id": job["job_id"], "wait": 10})
+            job = json.loads(result[0].text)
+            print(f"Job {job['job_id']}: {job['status']}")
+        print(json.dumps(job, indent=2))
+
+
+async def main(endpoint: str, working_dir: str, simulator: str, cross_check: bool, trace: bool,
+               fail_fast: bool, stream: bool) -> None:
+    async with Client(endpoint, log_handler=print_line if stream else None) as client:
         result = await client.call_tool(
             "run_verilog_tests",
-            {"working_dir": working_dir}
+            {"working_dir": working_dir, "simulator": simulator, "cross_check": cross_check, "trace": trace,
+             "fail_fast": fail_fast, "stream": stream}
         )
 
         # Convert TextContent to string for JSON serialization
@@ -38,5 +62,40 @@ if __name__ == "__main__":
         required=True,
         help="Path to the directory with design.v and testbench.v"
     )
+    parser.add_argument(
+        "--simulator",
+        default="auto",
+        choices=["auto", "icarus", "verilator"],
+        help="Simulator backend"
+    )
+    parser.add_argument(
+        "--cross-check",
+        action="store_true",
+        help="Run every installed simulator and compare verdicts"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Trace the design's ports around the first mismatch if it fails"
+    )
+    parser.add_argument(
+        "--job",
+        action="store_true",
+        help="Submit the run as a job and poll for its result"
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop the simulation at the first output line matching a failure pattern"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the simulator output while it runs"
+    )
     args = parser.parse_args()
-    asyncio.run(main(args.endpoint, args.working_dir))
+    if args.job:
+        asyncio.run(run_job(args.endpoint, args.working_dir, args.simulator, args.trace, args.fail_fast))
+    else:
+        asyncio.run(main(args.endpoint, args.working_dir, args.simulator, args.cross_check, args.trace,
+                         args.fail_fast, args.stream))
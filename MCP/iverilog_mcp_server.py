@@ -1,25 +1,104 @@
 # iverilog_mcp_server.py
 # Launch server - poetry run fastmcp run iverilog_mcp_server.py:mcp --transport sse --host 0.0.0.0 --port 8000
+# Load metrics - curl http://localhost:8000/metrics (add ?format=json for JSON, see metrics.py)
+# Long runs - submit_job returns a job id at once; collect with get_result, stop with cancel_job (see jobs.py)
+# Streaming - with stream, run_verilog_tests sends every simulator output line as a log message
+# whose logger name is the working directory; fail_fast stops at the first failure line
 
-from fastmcp import FastMCP
+import asyncio
+import sys
 from pathlib import Path
-import asyncio, subprocess
+
+from fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+
+# `fastmcp run` loads this file outside its package; make the MCP package importable
+if not __package__:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from MCP.jobs import JOBS
+from MCP.metrics import METRICS
+from MCP.simulators import simulate
 
 mcp = FastMCP("iverilog")
 
 @mcp.tool()
-async def run_verilog_tests(working_dir: str) -> dict[str, str | bool]:
-    """Compile `design.v` and `testbench.v` with Icarus and run the VVP."""
-    wd = Path(working_dir).resolve()
-    compile = await asyncio.create_subprocess_exec(
-        "iverilog", "-o", "netlist.vvp", "design.v", "testbench.v",
-        cwd=wd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    out, _ = await compile.communicate()
-    if compile.returncode:
-        return {"success": False, "output": out.decode()}
-    run = await asyncio.create_subprocess_exec(
-        "vvp", "netlist.vvp", cwd=wd,
-        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    rout, _ = await run.communicate()
-    return {"success": run.returncode == 0,
-            "output": (out + rout).decode()}
+async def run_verilog_tests(working_dir: str, simulator: str = "auto", cross_check: bool = False,
+                            timeout: float = 0, trace: bool = False, fail_fast: bool = False,
+                            fail_patterns: list[str] | None = None, stream: bool = False,
+                            ctx: Context | None = None) -> dict[str, str | bool | float | dict]:
+    """Compile `design.v` and `testbench.v` and run the simulation.
+
+    `simulator` is "icarus", "verilator" or "auto" (Verilator for long
+    testbenches when installed). With `cross_check`, every installed
+    simulator runs the design and the verdicts are compared. A positive
+    `timeout` (seconds) bounds compilation and simulation. With `trace`, a
+    design that fails its checks is re-run and `trace` holds a table of its
+    ports around the first mismatch. With `fail_fast`, the simulation stops
+    at the first output line matching `fail_patterns` (regular expressions;
+    default: built-in patterns plus the design's fail_patterns.txt) and
+    `stopped` is true. With `stream`, each output line is sent as a log
+    message from logger `working_dir` while the simulation runs.
+    """
+    async def on_output(line: str) -> None:
+        await ctx.log(line.rstrip("\n"), "info", working_dir)
+
+    async with METRICS.request():
+        res = None
+        try:
+            res = await simulate(working_dir, simulator, cross_check, timeout or None, trace,
+                                 fail_fast, fail_patterns, on_output if stream and ctx else None)
+            return res
+        finally:
+            METRICS.record(res)
+
+@mcp.tool()
+async def submit_job(working_dir: str, simulator: str = "auto", timeout: float = 0,
+                     trace: bool = False, fail_fast: bool = False,
+                     fail_patterns: list[str] | None = None) -> dict:
+    """Queue a `run_verilog_tests` run and return its `job_id` without waiting for it."""
+    job = JOBS.submit(working_dir, simulator, timeout or None, trace, fail_fast, fail_patterns)
+    return job.info(JOBS.position(job))
+
+@mcp.tool()
+async def get_job_status(job_id: str) -> dict:
+    """Status of a job: queued (with its queue position), running, done, failed, cancelled or unknown."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "unknown"}
+    return job.info(JOBS.position(job))
+
+@mcp.tool()
+async def get_result(job_id: str, wait: float = 0) -> dict:
+    """Status of a job and, once it is done, its `run_verilog_tests` result as `result`.
+
+    A positive `wait` (seconds) blocks until the job finishes or the wait expires.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "unknown"}
+    if wait > 0 and not job.done.is_set():
+        try:
+            await asyncio.wait_for(job.done.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+    info = job.info(JOBS.position(job))
+    if job.result is not None:
+        info["result"] = job.result
+    return info
+
+@mcp.tool()
+async def cancel_job(job_id: str) -> dict:
+    """Cancel a queued or running job, killing its simulator; finished jobs are unaffected."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "unknown"}
+    JOBS.cancel(job)
+    return job.info()
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> Response:
+    if request.query_params.get("format") == "json":
+        return JSONResponse({**METRICS.json(), "jobs": JOBS.counts()})
+    return PlainTextResponse(METRICS.prometheus() + JOBS.prometheus(), media_type="text/plain; version=0.0.4")
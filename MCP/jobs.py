@@ -0,0 +1,141 @@
+# jobs.py
+# Server-side job queue behind the submit_job / get_job_status / get_result / cancel_job tools.
+# Jobs run on MCP_JOB_WORKERS worker tasks (default: CPU count); finished jobs are kept for
+# MCP_JOB_RETENTION_S seconds (default: 1 hour) so clients can reconnect and collect them.
+
+import asyncio, os, time, uuid
+from dataclasses import dataclass, field
+
+from .metrics import METRICS
+from .simulators import simulate
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    id: str
+    working_dir: str
+    simulator: str = "auto"
+    timeout: float | None = None
+    trace: bool = False
+    fail_fast: bool = False
+    fail_patterns: list[str] | None = None
+    status: str = "queued"  # queued, running, done, failed or cancelled
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    result: dict | None = None
+    error: str = ""
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    task: asyncio.Task | None = None
+
+    def info(self, position: int | None = None) -> dict:
+        now = time.time()
+        info = {"job_id": self.id, "status": self.status, "working_dir": self.working_dir,
+                "queued_s": round((self.started or self.finished or now) - self.submitted, 3),
+                "running_s": round((self.finished or now) - self.started, 3) if self.started else 0.0}
+        if position is not None:
+            info["position"] = position
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class JobQueue:
+    """FIFO of simulation jobs with a fixed number of worker tasks."""
+
+    def __init__(self, workers: int, retention_s: float):
+        self.workers = workers
+        self.retention_s = retention_s
+        self.jobs: dict[str, Job] = {}
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def _start(self) -> None:
+        # Created on first use, inside the server's event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.retention_s
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def submit(self, working_dir: str, simulator: str = "auto", timeout: float | None = None,
+               trace: bool = False, fail_fast: bool = False, fail_patterns: list[str] | None = None) -> Job:
+        self._start()
+        self._purge()
+        job = Job(uuid.uuid4().hex, working_dir, simulator, timeout, trace, fail_fast, fail_patterns)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self._purge()
+        return self.jobs.get(job_id)
+
+    def position(self, job: Job) -> int | None:
+        """Jobs queued ahead of a queued job."""
+        if job.status != "queued":
+            return None
+        return sum(1 for j in self.jobs.values() if j.status == "queued" and j.submitted < job.submitted)
+
+    def cancel(self, job: Job) -> None:
+        """Drop a queued job or kill a running one; finished jobs are left alone."""
+        if job.status in FINISHED:
+            return
+        if job.task is not None:
+            job.task.cancel()  # kills its compiler/simulator subprocess
+        self._finish(job, "cancelled")
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished = time.time()
+        job.done.set()
+
+    async def _run(self, job: Job) -> None:
+        async with METRICS.request():
+            try:
+                res = await simulate(job.working_dir, job.simulator, timeout=job.timeout, trace=job.trace,
+                                     fail_fast=job.fail_fast, fail_patterns=job.fail_patterns)
+            except asyncio.CancelledError:
+                METRICS.record(None, "cancelled")
+                raise
+            except Exception:
+                METRICS.record(None)
+                raise
+            METRICS.record(res)
+        job.result = res
+        self._finish(job, "done")
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue  # cancelled while waiting
+            job.status, job.started = "running", time.time()
+            job.task = asyncio.create_task(self._run(job))
+            await asyncio.wait([job.task])  # returns on completion or cancellation
+            if not job.task.cancelled() and job.task.exception() is not None:
+                job.error = str(job.task.exception())
+                self._finish(job, "failed")
+            job.task = None
+
+    def counts(self) -> dict[str, int]:
+        self._purge()
+        counts = dict.fromkeys(("queued", "running") + FINISHED, 0)
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def prometheus(self) -> str:
+        lines = ["# HELP mcp_jobs Jobs in the job queue by status (finished jobs within retention).",
+                 "# TYPE mcp_jobs gauge"]
+        lines += [f'mcp_jobs{{status="{s}"}} {n}' for s, n in self.counts().items()]
+        return "\n".join(lines) + "\n"
+
+
+JOBS = JobQueue(int(os.environ.get("MCP_JOB_WORKERS", os.cpu_count() or 4)),
+                float(os.environ.get("MCP_JOB_RETENTION_S", "3600")))
@@ -0,0 +1,210 @@
+# load_test.py
+# Load generator and throughput benchmark for the iverilog MCP server.
+# Replays the verified RTLLM designs against `run_verilog_tests` and reports
+# throughput, latency percentiles, error rate and a transport/compile/sim breakdown.
+#
+# Launch server - poetry run fastmcp run iverilog_mcp_server.py:mcp --transport sse --host 0.0.0.0 --port 8000
+# 60 s at up to 8 concurrent calls, as fast as possible:
+#   poetry run python load_test.py --concurrency 8 --duration 60
+# 500 requests at a fixed 20 req/s, compared against an earlier report:
+#   poetry run python load_test.py --rate 20 --requests 500 --json new.json --baseline old.json
+#
+# Designs are staged below --stage-dir, which must be visible to the server at the same path.
+
+import argparse
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from fastmcp import Client
+from mcp import types
+
+RTLLM_DIR = Path(__file__).resolve().parent.parent / "RTLLM"
+GENERATED = {"design.v", "netlist.vvp", "output.txt", "makefile", "design_description.txt"}
+
+
+@dataclass
+class Sample:
+    design: str
+    ok: bool
+    passed: bool
+    latency_s: float
+    compile_s: float = 0.0
+    sim_s: float = 0.0
+    backend: str = ""
+    error: str = ""
+
+
+def find_designs(rtllm_dir: Path, pattern: str) -> list[Path]:
+    """Design directories with a testbench and a verified reference design."""
+    return sorted(
+        tb.parent for tb in rtllm_dir.glob("**/testbench.v")
+        if any(tb.parent.glob("verified_*.v")) and tb.parent.match(pattern)
+    )
+
+
+def stage(design_dir: Path, target: Path) -> Path:
+    """Copy a design's testbench and data files, with the verified design as design.v."""
+    if not (target / "design.v").exists():
+        target.mkdir(parents=True, exist_ok=True)
+        for src in design_dir.iterdir():
+            if src.is_file() and src.name not in GENERATED and not src.name.startswith("verified_"):
+                shutil.copy2(src, target / src.name)
+        shutil.copy2(next(design_dir.glob("verified_*.v")), target / "design.v")
+    return target
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+async def worker(slot: int, args, designs: list[Path], stage_root: Path,
+                 tickets: asyncio.Queue, samples: list[Sample], ready: asyncio.Event) -> None:
+    """Send requests for tickets from the queue over one client session."""
+    async with Client(args.endpoint) as client:
+        ready.set()
+        while True:
+            ticket = await tickets.get()
+            if ticket is None:
+                return
+            index, scheduled = ticket
+            design = designs[index % len(designs)]
+            name = str(design.relative_to(args.rtllm_dir))
+            wd = stage(design, stage_root / f"slot_{slot}" / name)
+            # With a fixed rate, latency counts from the scheduled send time so
+            # queueing behind a slow server is not hidden
+            start = scheduled if args.rate else time.perf_counter()
+            try:
+                result = await client.call_tool(
+                    "run_verilog_tests", {"working_dir": str(wd), "simulator": args.simulator})
+                text = result[0].text if isinstance(result[0], types.TextContent) else str(result[0])
+                payload = json.loads(text)
+                samples.append(Sample(
+                    design=name, ok=True,
+                    passed=bool(payload.get("success")) and "passed" in payload.get("output", "").lower(),
+                    latency_s=time.perf_counter() - start,
+                    compile_s=float(payload.get("compile_s", 0.0)),
+                    sim_s=float(payload.get("sim_s", 0.0)),
+                    backend=str(payload.get("backend", ""))))
+            except Exception as e:
+                samples.append(Sample(design=name, ok=False, passed=False,
+                                      latency_s=time.perf_counter() - start, error=str(e)))
+
+
+async def run(args) -> tuple[list[Sample], float]:
+    designs = find_designs(args.rtllm_dir, args.designs)
+    if not designs:
+        raise SystemExit(f"No verified designs match {args.designs} in {args.rtllm_dir}")
+    stage_root = Path(args.stage_dir or tempfile.mkdtemp(prefix="mcp_load_"))
+    print(f"Replaying {len(designs)} designs from {stage_root} against {args.endpoint}")
+
+    samples: list[Sample] = []
+    tickets: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency)
+    ready = [asyncio.Event() for _ in range(args.concurrency)]
+    workers = [asyncio.create_task(worker(i, args, designs, stage_root, tickets, samples, ready[i]))
+               for i in range(args.concurrency)]
+    # Connect every session before the clock starts
+    connected = asyncio.create_task(asyncio.wait([asyncio.create_task(e.wait()) for e in ready]))
+    await asyncio.wait([connected, *workers], return_when=asyncio.FIRST_COMPLETED)
+    if not connected.done():
+        await asyncio.gather(*workers)  # a worker failed to connect; re-raise its error
+
+    start = time.perf_counter()
+    index = 0
+    while (args.requests and index < args.requests) or \
+            (not args.requests and time.perf_counter() - start < args.duration):
+        scheduled = start + index / args.rate if args.rate else time.perf_counter()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await tickets.put((index, scheduled))
+        index += 1
+    for _ in workers:
+        await tickets.put(None)
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - start
+
+    if not args.stage_dir:
+        shutil.rmtree(stage_root, ignore_errors=True)
+    return samples, elapsed
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    ok = [s for s in samples if s.ok]
+    latencies = [s.latency_s for s in ok]
+    compile_s = sum(s.compile_s for s in ok)
+    sim_s = sum(s.sim_s for s in ok)
+    total = sum(latencies)
+    return {
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "pass_rate": round(sum(s.passed for s in ok) / len(ok), 4) if ok else 0.0,
+        "latency_p50_s": round(percentile(latencies, 50), 4),
+        "latency_p95_s": round(percentile(latencies, 95), 4),
+        "latency_p99_s": round(percentile(latencies, 99), 4),
+        # Share of request time spent in each phase; transport covers queueing,
+        # MCP/SSE round trips and server overhead outside the simulator
+        "compile_share": round(compile_s / total, 4) if total else 0.0,
+        "sim_share": round(sim_s / total, 4) if total else 0.0,
+        "transport_share": round(max(total - compile_s - sim_s, 0.0) / total, 4) if total else 0.0,
+        "backends": sorted({s.backend for s in ok if s.backend}),
+        "errors": sorted({s.error for s in samples if s.error})[:5],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of throughput and tail latency beyond the tolerance."""
+    problems = []
+    if report["requests_per_s"] < baseline["requests_per_s"] * (1 - tolerance):
+        problems.append(f"throughput {report['requests_per_s']} req/s < baseline {baseline['requests_per_s']}")
+    for key in ("latency_p95_s", "latency_p99_s"):
+        if report[key] > baseline[key] * (1 + tolerance):
+            problems.append(f"{key} {report[key]} > baseline {baseline[key]}")
+    if report["error_rate"] > baseline["error_rate"]:
+        problems.append(f"error rate {report['error_rate']} > baseline {baseline['error_rate']}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the iverilog MCP server")
+    parser.add_argument("--endpoint", default="http://localhost:8000/sse",
+                        help="URL of the MCP server's SSE endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent in-flight requests")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Requests per second (default: as fast as concurrency allows)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Run length in seconds")
+    parser.add_argument("--requests", type=int, default=0, help="Run length in requests (overrides --duration)")
+    parser.add_argument("--designs", default="*", help="Glob over design paths, e.g. 'Arithmetic/*/*'")
+    parser.add_argument("--simulator", default="auto", choices=["auto", "icarus", "verilator"])
+    parser.add_argument("--rtllm-dir", type=Path, default=RTLLM_DIR)
+    parser.add_argument("--stage-dir", help="Directory for staged designs (kept after the run)")
+    parser.add_argument("--json", type=Path, help="Write the report as JSON")
+    parser.add_argument("--baseline", type=Path, help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    try:
+        samples, elapsed = asyncio.run(run(args))
+    except Exception as e:
+        raise SystemExit(f"Could not reach {args.endpoint}: {e!r}")
+    report = summarize(samples, elapsed)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps({"report": report, "samples": [asdict(s) for s in samples]}, indent=2))
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["report"]
+        problems = compare(report, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        raise SystemExit(1 if problems else 0)
@@ -0,0 +1,166 @@
+# metrics.py
+# Load and latency metrics of the iverilog MCP server, served next to the MCP transport:
+#   curl http://localhost:8000/metrics              # Prometheus text format
+#   curl http://localhost:8000/metrics?format=json  # JSON
+#
+# Requests beyond MCP_MAX_CONCURRENCY (environment, default unlimited) wait in a queue
+# whose depth is reported, so worker counts can be tuned against the server's capacity.
+
+import asyncio, os, time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+
+from . import simulators
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+OUTCOMES = ("passed", "failed", "compile_error", "timeout", "error", "cancelled")
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (0..1)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def prometheus(self, name: str, labels: str = "") -> list[str]:
+        sep = "," if labels else ""
+        lines, seen = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {seen}')
+        braces = f"{{{labels}}}" if labels else ""
+        lines += [f"{name}_sum{braces} {self.sum:.6f}", f"{name}_count{braces} {self.count}"]
+        return lines
+
+    def json(self) -> dict:
+        return {"count": self.count, "sum_s": round(self.sum, 3),
+                "mean_s": round(self.sum / self.count, 4) if self.count else 0.0,
+                "p50_s": self.quantile(0.5), "p95_s": self.quantile(0.95), "p99_s": self.quantile(0.99)}
+
+
+def outcome(res: dict) -> str:
+    """Classify a normalized simulation result."""
+    if simulators.TIMEOUT_MESSAGE in res["output"]:
+        return "timeout"
+    if res["success"] and "passed" in res["output"].lower():
+        return "passed"
+    if not res["sim_output"] and not res["sim_s"]:
+        return "compile_error"
+    return "failed"
+
+
+class Metrics:
+    """Counters, gauges and latency histograms of one server process."""
+
+    def __init__(self, max_concurrency: int = 0):
+        self.started = time.time()
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.queued = 0
+        self.in_flight = 0
+        self.requests: dict[tuple[str, str], int] = {}  # (backend, outcome) -> count
+        self.request_latency = Histogram()
+        self.compile_latency: dict[str, Histogram] = {}
+        self.sim_latency: dict[str, Histogram] = {}
+
+    @asynccontextmanager
+    async def request(self):
+        """Hold a simulation slot for one tool call, counting the time spent queued."""
+        start = time.perf_counter()
+        self.queued += 1
+        try:
+            if self._slots:
+                await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self._slots:
+                self._slots.release()
+            self.request_latency.observe(time.perf_counter() - start)
+
+    def record(self, res: dict | None, failure: str = "error") -> None:
+        """Count a finished call; None marks a call that raised (or was cancelled)."""
+        if res is None:
+            key = ("none", failure)
+        else:
+            key = (res["backend"], outcome(res))
+            if res["compile_s"]:
+                self.compile_latency.setdefault(res["backend"], Histogram()).observe(res["compile_s"])
+            if res["sim_s"]:
+                self.sim_latency.setdefault(res["backend"], Histogram()).observe(res["sim_s"])
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def json(self) -> dict:
+        total = sum(self.requests.values())
+        by_outcome = {o: sum(n for (_, k), n in self.requests.items() if k == o) for o in OUTCOMES}
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "active_processes": simulators.active_processes,
+            "requests": total,
+            "outcomes": by_outcome,
+            "timeout_rate": round(by_outcome["timeout"] / total, 4) if total else 0.0,
+            "failure_rate": round((total - by_outcome["passed"]) / total, 4) if total else 0.0,
+            "request_latency": self.request_latency.json(),
+            "compile_latency": {b: h.json() for b, h in sorted(self.compile_latency.items())},
+            "sim_latency": {b: h.json() for b, h in sorted(self.sim_latency.items())},
+        }
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP mcp_uptime_seconds Seconds since the server started.",
+            "# TYPE mcp_uptime_seconds gauge",
+            f"mcp_uptime_seconds {time.time() - self.started:.1f}",
+            "# HELP mcp_queue_depth Tool calls waiting for a simulation slot.",
+            "# TYPE mcp_queue_depth gauge",
+            f"mcp_queue_depth {self.queued}",
+            "# HELP mcp_in_flight Tool calls currently simulating.",
+            "# TYPE mcp_in_flight gauge",
+            f"mcp_in_flight {self.in_flight}",
+            "# HELP mcp_active_processes Compiler and simulator subprocesses currently running.",
+            "# TYPE mcp_active_processes gauge",
+            f"mcp_active_processes {simulators.active_processes}",
+            "# HELP mcp_requests_total Finished tool calls by backend and outcome.",
+            "# TYPE mcp_requests_total counter",
+        ]
+        lines += [f'mcp_requests_total{{backend="{b}",outcome="{o}"}} {n}'
+                  for (b, o), n in sorted(self.requests.items())]
+        lines += ["# HELP mcp_request_seconds Tool call latency including queueing.",
+                  "# TYPE mcp_request_seconds histogram"]
+        lines += self.request_latency.prometheus("mcp_request_seconds")
+        for name, table, text in (("mcp_compile_seconds", self.compile_latency, "Compilation"),
+                                  ("mcp_sim_seconds", self.sim_latency, "Simulation")):
+            lines += [f"# HELP {name} {text} time by backend.", f"# TYPE {name} histogram"]
+            for backend, hist in sorted(table.items()):
+                lines += hist.prometheus(name, f'backend="{backend}"')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics(int(os.environ.get("MCP_MAX_CONCURRENCY", "0")))
@@ -0,0 +1,465 @@
+# simulators.py
+# Simulator backends used by the iverilog MCP server and the local simulation backend.
+# Each backend compiles `design.v` + `testbench.v` in a working directory, runs the
+# simulation and returns the same normalized result dict.
+# Failing designs can be re-run with a windowed, port-only VCD trace (see trace_failure).
+# Simulator output is read line by line when it is streamed to a callback or when the
+# simulation should stop at the first failure (fail-fast).
+# Results report wall seconds per step (compile_s, sim_s) and the CPU seconds of the
+# compiler and simulator processes (cpu_s), taken from os.wait4 when they are reaped.
+
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio, os, re, shutil, signal, subprocess, threading, time
+
+DESIGN_FILE = "design.v"
+TESTBENCH_FILE = "testbench.v"
+
+# Testbenches with at least this many loop iterations are simulated with a
+# compiled simulator when "auto" is requested and one is installed
+AUTO_COMPILED_ITERATIONS = 1000
+
+TIMEOUT_MESSAGE = "Simulation timed out"
+
+# Fail-fast: the simulation is killed at the first output line matching a failure pattern
+# (case-insensitive regular expressions: DEFAULT_FAIL_PATTERNS, plus one per line of
+# FAIL_PATTERNS_FILE in the working directory, staged from the RTLLM design directory)
+FAIL_PATTERNS_FILE = "fail_patterns.txt"
+# ("Error: ..." lines count, error counter dumps such as "error = 0" do not)
+DEFAULT_FAIL_PATTERNS = (r"\btest failed\b", r"^\s*failed\b", r"^\s*error\b(?!\s*=)", r"=+\s*(?:error|failed)\s*=+",
+                         r"\bmismatch\b")
+FAIL_FAST_MESSAGE = "Simulation stopped at the first failure"
+STOPPED = -2  # _exec return code of a command stopped by its line callback
+MAX_LINE = 1 << 20  # longest streamed output line (bytes)
+
+LineCallback = Callable[[str], Awaitable[bool]]  # returns True to stop the command
+
+# Failure tracing: ports of the design under test are dumped from TRACE_BEFORE testbench
+# time units before the first mismatch (first increment of the testbench's error
+# counter) to TRACE_AFTER units after it
+TRACE_FILE = "trace.v"
+TRACE_VCD = "trace.vcd"
+TRACE_HEADER = "--- Port trace"
+TRACE_MARK = "RTLLM_TRACE_MISMATCH"
+TRACE_BEFORE = 100
+TRACE_AFTER = 20
+MAX_TRACE_ROWS = 16
+
+LOOP_BOUND_RE = re.compile(r"\brepeat\s*\(\s*(\d+)\s*\)|for\s*\([^;]*;[^;<]*<=?\s*(\d+)\s*;")
+MODULE_RE = re.compile(r"^\s*module\s+(\w+)", re.MULTILINE)
+COUNTER_RE = re.compile(
+    r"^\s*(?:integer|reg(?:\s*\[[^\]]*\])?)\s+(\w*(?:err|fail|mismatch)\w*)", re.MULTILINE | re.IGNORECASE)
+TIMESCALE_RE = re.compile(r"`timescale\s+(\d+)\s*([munpf]?s)\b")
+VCD_TIMESCALE_RE = re.compile(r"\$timescale\s+(\d+)\s*([munpf]?s)\s+\$end")
+COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+PARAMS_RE = r"(?:#\s*\((?:[^()]|\([^()]*\))*\)\s*)?"
+UNIT_S = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9, "ps": 1e-12, "fs": 1e-15}
+
+active_processes = 0  # compiler/simulator subprocesses currently running (see metrics.py)
+
+
+def _reap(pid: int, exited: asyncio.Future) -> None:
+    """Wait for a process in a thread and resolve exited with (returncode, CPU seconds)."""
+    _, status, usage = os.wait4(pid, 0)
+    outcome = (os.waitstatus_to_exitcode(status), usage.ru_utime + usage.ru_stime)
+    try:
+        exited.get_loop().call_soon_threadsafe(lambda: exited.done() or exited.set_result(outcome))
+    except RuntimeError:
+        pass  # the loop is gone
+
+
+async def _kill(pid: int, exited: asyncio.Future) -> tuple[int, float]:
+    """Kill a command with everything it started (which could hold its output pipe open) and reap it."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    return await asyncio.shield(exited)
+
+
+async def _exec(*cmd: str, cwd: Path, timeout: float | None = None,
+                on_line: LineCallback | None = None) -> tuple[int, str, float, float]:
+    """
+    Run a command, returning (returncode, combined output, seconds, CPU seconds); killed after timeout seconds
+    or on cancellation.
+
+    With on_line, output is read line by line and each line is passed to on_line as it arrives;
+    the command is killed as soon as on_line returns True, with returncode STOPPED. CPU seconds are the
+    user and system time of the command and the children it waited for.
+    """
+    global active_processes
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    # Reaped here rather than by asyncio's child watcher, for the process's resource usage
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+    active_processes += 1
+    exited = loop.create_future()
+    threading.Thread(target=_reap, args=(proc.pid, exited), name="reap", daemon=True).start()
+    reader = asyncio.StreamReader(limit=MAX_LINE)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), proc.stdout)
+    lines: list[str] = []
+
+    async def communicate() -> bool:
+        """Read the output until the command exits; True if on_line stopped it."""
+        if on_line is None:
+            lines.append((await reader.read()).decode(errors="replace"))
+        else:
+            while line := await reader.readline():
+                lines.append(line.decode(errors="replace"))
+                if await on_line(lines[-1]):
+                    return True
+        await asyncio.shield(exited)
+        return False
+
+    try:
+        if await asyncio.wait_for(communicate(), timeout):
+            code, cpu_s = await _kill(proc.pid, exited)
+            return STOPPED, "".join(lines), time.perf_counter() - start, cpu_s
+        code, cpu_s = exited.result()
+    except asyncio.TimeoutError:
+        code, cpu_s = await _kill(proc.pid, exited)
+        # Streamed output up to the timeout is kept
+        return (-1, "".join(lines) + f"{TIMEOUT_MESSAGE} after {round(timeout, 3):g}s: {' '.join(cmd)}\n",
+                time.perf_counter() - start, cpu_s)
+    except asyncio.CancelledError:
+        await _kill(proc.pid, exited)
+        raise
+    finally:
+        transport.close()
+        active_processes -= 1
+        if exited.done():
+            proc.returncode = exited.result()[0]  # reaped by _reap
+    return code, "".join(lines), time.perf_counter() - start, cpu_s
+
+
+def _remaining(timeout: float | None, elapsed: float) -> float | None:
+    """Seconds of timeout left after elapsed seconds (None when unbounded)."""
+    return None if timeout is None else timeout - elapsed
+
+
+def _timed_out(timeout: float, cmd: str) -> str:
+    """Output of a step that was not started because the run's timeout was spent."""
+    return f"{TIMEOUT_MESSAGE} after {timeout:g}s: {cmd}\n"
+
+
+def result(backend: str, success: bool, compile_output: str = "", sim_output: str = "",
+           compile_s: float = 0.0, sim_s: float = 0.0, code: int = 0, cpu_s: float = 0.0) -> dict:
+    """
+    Normalized simulation result shared by all backends; code is the simulator's return code,
+    cpu_s the CPU seconds of the compiler and simulator.
+    """
+    if code == STOPPED:
+        sim_output += f"{FAIL_FAST_MESSAGE} after {sim_s:.2f}s\n"
+    return {"success": success,
+            "stopped": code == STOPPED,
+            "output": compile_output + sim_output,
+            "backend": backend,
+            "compile_output": compile_output,
+            "sim_output": sim_output,
+            "compile_s": round(compile_s, 3),
+            "sim_s": round(sim_s, 3),
+            "cpu_s": round(cpu_s, 3)}
+
+
+@dataclass
+class IcarusBackend:
+    """Icarus Verilog: fast to compile, interpreted simulation."""
+    name: str = "icarus"
+
+    def available(self) -> bool:
+        return bool(shutil.which("iverilog") and shutil.which("vvp"))
+
+    async def run(self, wd: Path, timeout: float | None = None, on_line: LineCallback | None = None) -> dict:
+        code, cout, cs, ccpu = await _exec(
+            "iverilog", "-o", "netlist.vvp", DESIGN_FILE, TESTBENCH_FILE, cwd=wd, timeout=timeout)
+        if code:
+            return result(self.name, False, cout, compile_s=cs, cpu_s=ccpu)
+        # One timeout bounds compilation and simulation together
+        left = _remaining(timeout, cs)
+        if left is not None and left <= 0:
+            return result(self.name, False, cout, _timed_out(timeout, "vvp netlist.vvp"), cs, code=-1, cpu_s=ccpu)
+        code, sout, ss, scpu = await _exec("vvp", "netlist.vvp", cwd=wd, timeout=left, on_line=on_line)
+        return result(self.name, code == 0, cout, sout, cs, ss, code, ccpu + scpu)
+
+
+@dataclass
+class VerilatorBackend:
+    """Verilator: slower to compile, much faster on long testbenches."""
+    name: str = "verilator"
+    build_dir: str = "obj_dir"
+
+    def available(self) -> bool:
+        return bool(shutil.which("verilator"))
+
+    async def run(self, wd: Path, timeout: float | None = None, on_line: LineCallback | None = None) -> dict:
+        top = testbench_top(wd / TESTBENCH_FILE)
+        cmd = ["verilator", "--binary", "--timing", "-j", "0", "-Wno-fatal", "-Wno-lint",
+               "-Wno-style", "--Mdir", self.build_dir, "-o", "Vsim"]
+        if top:
+            cmd += ["--top-module", top]
+        code, cout, cs, ccpu = await _exec(*cmd, DESIGN_FILE, TESTBENCH_FILE, cwd=wd, timeout=timeout)
+        if code:
+            return result(self.name, False, cout, compile_s=cs, cpu_s=ccpu)
+        sim = str(wd / self.build_dir / "Vsim")
+        left = _remaining(timeout, cs)
+        if left is not None and left <= 0:
+            return result(self.name, False, cout, _timed_out(timeout, sim), cs, code=-1, cpu_s=ccpu)
+        code, sout, ss, scpu = await _exec(sim, cwd=wd, timeout=left, on_line=on_line)
+        return result(self.name, code == 0, cout, sout, cs, ss, code, ccpu + scpu)
+
+
+BACKENDS = {"icarus": IcarusBackend(), "verilator": VerilatorBackend()}
+
+
+def testbench_top(testbench: Path) -> str | None:
+    """Name of the top-level testbench module (the last module in the file)."""
+    if not testbench.exists():
+        return None
+    modules = MODULE_RE.findall(testbench.read_text(errors="replace"))
+    return modules[-1] if modules else None
+
+
+def testbench_iterations(testbench: Path) -> int:
+    """Largest constant loop bound in a testbench, a rough proxy for simulation length."""
+    if not testbench.exists():
+        return 0
+    bounds = [int(a or b) for a, b in LOOP_BOUND_RE.findall(testbench.read_text(errors="replace"))]
+    return max(bounds, default=0)
+
+
+def select_backend(wd: Path, simulator: str = "auto"):
+    """
+    Pick the backend for a working directory.
+
+    "auto" uses Verilator for long testbenches when it is installed and
+    Icarus otherwise. Explicit names fail if the simulator is missing.
+    """
+    if simulator == "auto":
+        verilator = BACKENDS["verilator"]
+        if verilator.available() and testbench_iterations(wd / TESTBENCH_FILE) >= AUTO_COMPILED_ITERATIONS:
+            return verilator
+        return BACKENDS["icarus"]
+    if simulator not in BACKENDS:
+        raise ValueError(f"Unknown simulator: {simulator} (choose from auto, {', '.join(BACKENDS)})")
+    backend = BACKENDS[simulator]
+    if not backend.available():
+        raise RuntimeError(f"Simulator {simulator} is not installed")
+    return backend
+
+
+def fail_pattern(wd: Path, patterns: list[str] | None = None) -> re.Pattern:
+    """
+    Combined failure pattern of a working directory: the given patterns, else
+    DEFAULT_FAIL_PATTERNS extended by those in its FAIL_PATTERNS_FILE (blank lines and
+    # comments ignored).
+    """
+    if not patterns:
+        patterns = list(DEFAULT_FAIL_PATTERNS)
+        if (wd / FAIL_PATTERNS_FILE).exists():
+            lines = (wd / FAIL_PATTERNS_FILE).read_text(errors="replace").splitlines()
+            patterns += [l.strip() for l in lines if l.strip() and not l.strip().startswith("#")]
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
+def error_counter(testbench: str) -> str | None:
+    """Name of the testbench's error counter, preferring one that is incremented."""
+    names = COUNTER_RE.findall(testbench)
+    incremented = [n for n in names if re.search(rf"\b{n}\s*(?:\+\+|\+\s*1\b)", testbench)]
+    return (incremented or names or [None])[0]
+
+
+def dut_instance(testbench: str, design: str) -> tuple[str, str] | None:
+    """(module, instance name) of the first design module instantiated by the testbench."""
+    for module in MODULE_RE.findall(design):
+        m = re.search(rf"^\s*{module}\s*{PARAMS_RE}(\w+)\s*\(", testbench, re.MULTILINE)
+        if m:
+            return module, m.group(1)
+    return None
+
+
+def module_ports(design: str, module: str) -> list[str]:
+    """Port names in the header of a module (ANSI or non-ANSI style)."""
+    m = re.search(rf"\bmodule\s+{module}\s*{PARAMS_RE}\(([^;]*)\)\s*;", COMMENT_RE.sub("", design))
+    if not m:
+        return []
+    ports = [re.findall(r"\w+", re.sub(r"\[[^\]]*\]", "", item)) for item in m.group(1).split(",")]
+    return [p[-1] for p in ports if p]
+
+
+def trace_module(top: str, instance: str, counter: str, ports: list[str]) -> str:
+    """
+    Testbench companion that either reports the first mismatch time or, given
+    +trace_start/+trace_stop (testbench time units), dumps the DUT ports in that window.
+    It has no `timescale of its own and inherits the testbench's by compiling last.
+    """
+    signals = ", ".join(f"{top}.{instance}.{p}" for p in ports)
+    return f"""module rtllm_trace;
+  reg [63:0] trace_start, trace_stop;
+  initial begin
+    if ($value$plusargs("trace_start=%d", trace_start) && $value$plusargs("trace_stop=%d", trace_stop)) begin
+      $dumpfile("{TRACE_VCD}");
+      $dumpvars(0, {signals});
+      $dumpoff;
+      #(trace_start) $dumpon;
+      #(trace_stop - trace_start) begin $dumpoff; $finish; end
+    end else begin
+      wait ({top}.{counter} > 0);
+      $display("{TRACE_MARK} %0d", $time);
+      $finish;
+    end
+  end
+endmodule
+"""
+
+
+def parse_vcd(text: str) -> tuple[float, dict[str, tuple[str, int]], list[tuple[int, str, str]]]:
+    """(seconds per time step, {id: (name, width)}, [(time, id, value)]) of a VCD dump."""
+    m = VCD_TIMESCALE_RE.search(text)
+    scale = int(m.group(1)) * UNIT_S[m.group(2)] if m else 1.0
+    header, _, body = text.partition("$enddefinitions")
+    signals = {}
+    for var in re.finditer(r"\$var\s+\w+\s+(\d+)\s+(\S+)\s+(\w+)", header):
+        signals.setdefault(var.group(2), (var.group(3), int(var.group(1))))
+    changes, time, muted = [], 0, False
+    for token in body.split("\n"):
+        token = token.strip()
+        if token.startswith("#"):
+            time = int(token[1:])
+        elif token == "$dumpoff":
+            muted = True  # values inside a $dumpoff block are all x
+        elif token == "$end":
+            muted = False
+        elif token and not muted and token[0] in "01xzXZbBrR":
+            if token[0] in "bBrR":
+                value, _, ident = token[1:].partition(" ")
+            else:
+                value, ident = token[0], token[1:]
+            if ident in signals:
+                changes.append((time, ident, value.lower()))
+    return scale, signals, changes
+
+
+def format_value(value: str, width: int) -> str:
+    """Hex for known vectors, bits otherwise."""
+    if width == 1 or any(c in value for c in "xz"):
+        return value
+    return f"{int(value, 2):0{(width + 3) // 4}x}"
+
+
+def trace_table(vcd: str, mismatch: int, unit_s: float, label: str) -> str:
+    """Compact table of port values per change time around the first mismatch."""
+    scale, signals, changes = parse_vcd(vcd)
+    if not changes:
+        return ""
+    to_units = scale / unit_s
+    ids = list(signals)
+    state = dict.fromkeys(ids, "x")
+    rows = []
+    for time in sorted({t for t, _, _ in changes}):
+        for t, ident, value in changes:
+            if t == time:
+                state[ident] = value
+        rows.append((time * to_units, [format_value(state[i], signals[i][1]) for i in ids]))
+    # Keep the rows leading up to the mismatch and a few after it
+    first = next((i for i, (t, _) in enumerate(rows) if t >= mismatch), len(rows))
+    start = max(0, min(first - MAX_TRACE_ROWS + 4, len(rows) - MAX_TRACE_ROWS))
+    shown = rows[start:start + MAX_TRACE_ROWS]
+
+    names = [signals[i][0] for i in ids]
+    widths = [max(len(n), *(len(r[1][k]) for r in shown)) for k, n in enumerate(names)]
+    time_width = max(4, *(len(f"{t:g}") for t, _ in shown))
+    lines = [f"{TRACE_HEADER} of {label} around the first mismatch at t={mismatch} (vectors in hex) ---",
+             f"{'time':>{time_width}}  " + "  ".join(f"{n:>{w}}" for n, w in zip(names, widths))]
+    for i, (t, values) in enumerate(shown, start):
+        mark = "  <- error counter increments" if i == first else ""
+        lines.append(f"{t:>{time_width}g}  " + "  ".join(f"{v:>{w}}" for v, w in zip(values, widths)) + mark)
+    if start + MAX_TRACE_ROWS < len(rows):
+        lines.append(f"... {len(rows) - start - MAX_TRACE_ROWS} later changes")
+    return "\n".join(lines)
+
+
+async def trace_failure(wd: Path, timeout: float | None = None) -> str:
+    """
+    Re-run a failing design with Icarus to trace its ports around the first mismatch.
+
+    A first run stops at the first increment of the testbench's error counter and
+    reports its time; a second run dumps only the DUT's ports within the window
+    around it. Returns an empty string when the testbench has no recognizable
+    error counter or DUT instance, or the mismatch is never reached.
+    """
+    if not BACKENDS["icarus"].available():
+        return ""
+    testbench = (wd / TESTBENCH_FILE).read_text(errors="replace")
+    design = (wd / DESIGN_FILE).read_text(errors="replace")
+    top, instance, counter = testbench_top(wd / TESTBENCH_FILE), dut_instance(testbench, design), error_counter(testbench)
+    if not (top and instance and counter):
+        return ""
+    ports = module_ports(design, instance[0])
+    if not ports:
+        return ""
+    (wd / TRACE_FILE).write_text(trace_module(top, instance[1], counter, ports))
+    code, _, _, _ = await _exec(
+        "iverilog", "-o", "trace.vvp", DESIGN_FILE, TESTBENCH_FILE, TRACE_FILE, cwd=wd, timeout=timeout)
+    if code:
+        return ""
+    _, out, _, _ = await _exec("vvp", "trace.vvp", cwd=wd, timeout=timeout)
+    mark = re.search(rf"{TRACE_MARK} (\d+)", out)
+    if not mark:
+        return ""
+    mismatch = int(mark.group(1))
+    (wd / TRACE_VCD).unlink(missing_ok=True)
+    await _exec("vvp", "trace.vvp", f"+trace_start={max(mismatch - TRACE_BEFORE, 0)}",
+                f"+trace_stop={mismatch + TRACE_AFTER}", cwd=wd, timeout=timeout)
+    if not (wd / TRACE_VCD).exists():
+        return ""
+    # The testbench's time unit is the last `timescale in effect when it is compiled
+    timescales = TIMESCALE_RE.findall(design + testbench)
+    unit_s = int(timescales[-1][0]) * UNIT_S[timescales[-1][1]] if timescales else 1.0
+    return trace_table((wd / TRACE_VCD).read_text(errors="replace"), mismatch, unit_s,
+                       f"{instance[1]} ({instance[0]})")
+
+
+async def simulate(working_dir: str | Path, simulator: str = "auto", cross_check: bool = False,
+                   timeout: float | None = None, trace: bool = False, fail_fast: bool = False,
+                   fail_patterns: list[str] | None = None,
+                   on_output: Callable[[str], Awaitable[None]] | None = None) -> dict:
+    """
+    Compile and simulate a working directory with the selected backend.
+
+    With cross_check, every installed backend runs the design and the result
+    records each verdict and whether they agree. The selected backend's
+    result is returned. Compilation and simulation are each killed after
+    timeout seconds. With trace, a design that compiles but fails its checks
+    is re-run to add a port trace around the first mismatch as "trace".
+    With fail_fast, the simulation is stopped at the first output line
+    matching a failure pattern (see fail_pattern) and "stopped" is set.
+    on_output receives each simulation output line as it is printed.
+    """
+    wd = Path(working_dir).resolve()
+    try:
+        backend = select_backend(wd, simulator)
+        pattern = fail_pattern(wd, fail_patterns) if fail_fast else None
+    except (ValueError, RuntimeError, re.error) as e:
+        return result(simulator, False, f"{e}\n")
+
+    async def on_line(line: str) -> bool:
+        if on_output:
+            await on_output(line)
+        return bool(pattern and pattern.search(line))
+
+    res = await backend.run(wd, timeout, on_line if pattern or on_output else None)
+    if cross_check:
+        verdicts = {backend.name: res["success"] and "passed" in res["output"].lower()}
+        for other in BACKENDS.values():
+            if other.name != backend.name and other.available():
+                o = await other.run(wd, timeout)
+                verdicts[other.name] = o["success"] and "passed" in o["output"].lower()
+        res["verdicts"] = verdicts
+        res["verdicts_agree"] = len(set(verdicts.values())) <= 1
+    failed_checks = res["sim_output"] and "passed" not in res["output"].lower() \
+        and TIMEOUT_MESSAGE not in res["output"]
+    if trace and failed_checks:
+        res["trace"] = await trace_failure(wd, timeout)
+    return res
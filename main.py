@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """
 Main entry point for Verilog generation tools.
-iverilog is accessible via MCP server.
+Testbenches are simulated in-process by default (iverilog/verilator must be on PATH).
+With --sim-backend mcp they run on the MCP server instead.
 To run the server, poetry run fastmcp run iverilog_mcp_server.py:mcp --transport sse --host 0.0.0.0 --port 8000
 
-RAG database is stored in rag_dataset/chroma/. Delete the directory to re-create the database.
+RAG database is stored in rag_dataset/chroma/. Delete the directory to re-create the database;
+passing generated designs are added to it incrementally with --grow-rag (see rag_index.py).
+
+Designs are selected from RTLLM/manifest.json, which is refreshed incrementally on every run.
+Generated files are written below runs/<run id>/; every iteration's prompt, response, design,
+reflection and test output is kept in the artifact store (artifacts/, see artifacts.py).
 
 This module provides command-line interface to run different Verilog generation methods:
 1. Basic generation
@@ -28,9 +34,79 @@ Usage examples:
 
     # Basic generation for specific design 
     poetry run python main.py -g -d Arithmetic/Adder/adder_8bit
+
+    # Record reference runs of the verified designs (runtime budgets, reference outputs)
+    poetry run python main.py --calibrate
+
+    # Basic generation for pipelined or data-driven designs (manifest filters)
+    poetry run python main.py -g --glob '*pipe*' --tag sequential
+    poetry run python main.py -g --regex 'RISC-V/(alu|pe)$'
     
     # RAG-enhanced generation with custom model and temperature
     poetry run python main.py -r --model anthropic --temperature 0.5
+
+    # RAG-enhanced generation with up to 5 diverse references in ~2000 tokens
+    poetry run python main.py -r --rag-top-k 5 --rag-token-budget 2000
+
+    # RAG-enhanced generation with the memory-mapped flat index (exported from Chroma on first use)
+    poetry run python main.py -r --rag-index flat
+
+    # Agentic flow within 50k tokens and 10 minutes per design, and 4 hours for the whole sweep
+    poetry run python main.py -a 5 --budget tokens=50000,wall=600 --run-budget wall=14400
+
+    # RAG sweep that stops generating once 2M tokens or an hour of simulator CPU are spent
+    poetry run python main.py -r --samples 5 --run-budget tokens=2000000,sim=3600
+
+    # RAG sweep re-sending calls slower than the 90th percentile of recent calls to a second provider
+    poetry run python main.py -r --samples 5 --hedge 0.9 --hedge-model anthropic
+
+    # Agentic flow whose passing designs are added to the RAG database afterwards
+    poetry run python main.py -a 3 --grow-rag
+
+    # Agentic flow trying 4 repairs per iteration in parallel at different temperatures
+    poetry run python main.py -a 3 --branches 4 --branch-temperatures 0.2,0.5,0.8,1.0
+
+    # Agentic flow with testbenches simulated by Verilator
+    poetry run python main.py -a 3 --simulator verilator
+
+    # Agentic flow whose reflections see the design's ports around the first failing check
+    poetry run python main.py -a 3 --trace-failures
+
+    # pass@5 screening: failing samples stop simulating at their first failure line
+    poetry run python main.py -g --samples 5 --fail-fast
+
+    # Agentic flow printing the simulator output of every run as it is produced
+    poetry run python main.py -a 3 --stream
+
+    # Simulate on a running MCP server instead of in-process
+    poetry run python main.py -g --sim-backend mcp --mcp-endpoint http://simhost:8000/sse
+
+    # Simulate as server-side jobs, collected by polling (long runs survive dropped connections)
+    poetry run python main.py -a 3 --sim-backend mcp-jobs --mcp-endpoint http://simhost:8000/sse
+
+    # Shard 0 of 4 of a 5-sample sweep, balanced by a previous run's timings
+    poetry run python main.py -g --samples 5 --shard 0/4 --balance-by-cost results/prev.jsonl \
+        --results results/shard-0.jsonl
+
+    # Agentic flow on 8 workers, longest designs first by a previous run's timings
+    poetry run python main.py -a 3 --workers 8 --balance-by-cost results/prev.jsonl
+
+    # RAG sweep with overlapping retrieval, LLM calls and simulation (bounded stage queues)
+    poetry run python main.py -r --samples 5 --pipeline --stage-workers generate=8,simulate=4
+
+    # Two-phase RAG sweep: write all prompts for a batch endpoint, then simulate its results
+    poetry run python main.py -r --samples 5 --batch-prepare batches/rag.jsonl
+    poetry run python main.py -r --batch-ingest batches/rag.jsonl batches/rag_results.jsonl
+
+    # Compare providers and temperatures in one run (shared RAG and simulation cache)
+    poetry run python main.py -r --matrix openai:0.2,openai:0.7,anthropic,gemini
+
+    # Re-simulate designs and testbenches of a category as they are edited (see watch.py)
+    poetry run python -m run_verilog_generation_agent.watch -d Arithmetic
+
+    # Merge the shard result stores and check coverage
+    poetry run python -m run_verilog_generation_agent.results merge results/shard-*.jsonl \
+        -o results/merged.jsonl -d "" --samples 5
 """
 
 from pathlib import Path
@@ -46,40 +122,26 @@ from langchain_openai import OpenAIEmbeddings
 
 # Import our modules
 from run_verilog_generation_agent.setup_verilog_generation_agent import (
-    setup_agent, ModelConfig, AgentConfig, create_logger
+    setup_agent, ModelConfig, AgentConfig, RetrievalConfig, create_logger, create_model_config, get_embeddings
 )
 from run_verilog_generation_agent.basic_verilog_generation import basic_generation
-from run_verilog_generation_agent.rag_verilog_generation import rag_generation
+from run_verilog_generation_agent.rag_verilog_generation import rag_generation, prefetch_similar_designs
 from run_verilog_generation_agent.agentic_verilog_generation import run_agentic_generation
-
-def process_rtllm_directory(
-    category_dir: Path,
-    logger: Any,
-    args: argparse.Namespace,
-    model_config: ModelConfig,
-    agent_config: AgentConfig
-) -> None:
-    """
-    Process all test cases in a given RTLLM category directory.
-    
-    Args:
-        category_dir: Directory containing test cases
-        logger: Logger instance
-        args: Command line arguments
-        model_config: Model configuration
-        agent_config: Agent configuration
-    """
-    # Check if current directory has design_description.txt
-    design_file = category_dir / "design_description.txt"
-    if design_file.exists():
-        print(f"\nProcessing test case: {category_dir.name}")
-        process_test_case(category_dir, design_file, logger, args, model_config, agent_config)
-        return
-        
-    # Recursively process subdirectories
-    for subdir in category_dir.iterdir():
-        if subdir.is_dir():
-            process_rtllm_directory(subdir, logger, args, model_config, agent_config)
+from run_verilog_generation_agent.manifest import MANIFEST_FILE, load_manifest, filter_designs, save_manifest
+from run_verilog_generation_agent.calibration import calibrate, format_calibration_report, reference_index
+from run_verilog_generation_agent.matrix import MatrixRun, parse_matrix, run_matrix
+from run_verilog_generation_agent.scheduler import DurationModel, sim_runtimes
+from run_verilog_generation_agent.artifacts import SampleArtifacts
+from run_verilog_generation_agent.budget import BudgetLimits, parse_budget
+from run_verilog_generation_agent.hedging import HedgeConfig
+from run_verilog_generation_agent.batch import BATCH_PROVIDERS, build_requests, ingest, write_jsonl
+from run_verilog_generation_agent.pipeline import PipelineConfig, parse_stage_workers, run_pipeline
+from run_verilog_generation_agent.rag_index import DEFAULT_PERSIST_DIR, grow_from_runs
+from run_verilog_generation_agent.simulation import DEFAULT_ENDPOINT, SimulationConfig, print_output
+from run_verilog_generation_agent.results import (
+    ResultStore, default_results_path, historical_costs,
+    load_results, parse_shard, shard_designs
+)
 
 def process_test_case(
     test_dir: Path,
@@ -87,8 +149,11 @@ def process_test_case(
     logger: Any,
     args: argparse.Namespace,
     model_config: ModelConfig,
-    agent_config: AgentConfig
-) -> None:
+    agent_config: AgentConfig,
+    output_dir: Optional[Path] = None,
+    sim_config: Optional[SimulationConfig] = None,
+    artifacts: Optional[SampleArtifacts] = None
+) -> tuple[bool, str, int]:
     """
     Process a single test case directory.
     
@@ -99,34 +164,72 @@ def process_test_case(
         args: Command line arguments
         model_config: Model configuration
         agent_config: Agent configuration
+        output_dir: Directory for generated files (defaults to test_dir)
+        sim_config: Simulation configuration
+        artifacts: Artifact recorder for this sample
+        
+    Returns:
+        Tuple of (passed, test output, iterations used)
     """
     if args.generate:
-        basic_generation(logger, model_config, working_dir=test_dir)
+        passed, output = basic_generation(
+            logger, model_config, working_dir=test_dir,
+            output_dir=output_dir, sim_config=sim_config, artifacts=artifacts,
+            budget=agent_config.budget
+        )
+        return passed, output, 1
         
     elif args.rag:
-        rag_generation(logger, model_config, working_dir=test_dir)
+        passed, output = rag_generation(
+            logger, model_config, working_dir=test_dir,
+            output_dir=output_dir, sim_config=sim_config, artifacts=artifacts,
+            budget=agent_config.budget
+        )
+        return passed, output, 1
         
-    elif args.agentic_flow > 0:
+    else:
         # Update agent configuration with design prompt
         agent_config.design_prompt = design_file.read_text()
         agent_config.working_dir = test_dir
-        run_agentic_generation(logger, model_config, agent_config)
+        agent_config.output_dir = output_dir
+        agent_config.branches = args.branches
+        agent_config.branch_temperatures = args.branch_temperatures
+        return run_agentic_generation(logger, model_config, agent_config, sim_config, artifacts)
 
-def get_rtllm_categories(rtllm_dir: Path) -> List[Path]:
-    """
-    Get list of RTLLM category directories.
-    
-    Args:
-        rtllm_dir: Root RTLLM directory
-        
-    Returns:
-        List of category directory paths
-    """
-    categories = []
-    for path in rtllm_dir.iterdir():
-        if path.is_dir() and not path.name.startswith('.'):
-            categories.append(path)
-    return sorted(categories)
+def report_hedging(
+    runs: List[MatrixRun],
+    retrieval: RetrievalConfig,
+    hedging: Optional[HedgeConfig],
+    logger: Any
+) -> None:
+    """Print the hedged calls and their extra cost per provider."""
+    if not hedging:
+        return
+    for run in runs:
+        # Model configs are cached, so this returns the run's own client
+        client = create_model_config(run.provider, run.temperature, retrieval=retrieval, hedging=hedging).generation_client
+        print(f"Hedging [{run.label}]: {client.policy.summary()}")
+        logger.info(f"Hedging [{run.label}]: {client.policy.summary()}")
+
+def grow_rag(results: List[Any], rtllm_dir: Path, logger: Any) -> None:
+    """Add the passing designs of the runs behind some results to the RAG database."""
+    run_ids = sorted({r.run_id for r in results if r.passed})
+    if not run_ids:
+        print("No passing designs to add to the RAG database")
+        return
+    try:
+        grow_from_runs(run_ids, rtllm_dir, str(DEFAULT_PERSIST_DIR), get_embeddings(), logger)
+    except Exception as e:
+        print(f"Failed to add passing designs to the RAG database: {str(e)}")
+        logger.error(f"Failed to add passing designs to the RAG database: {str(e)}")
+
+def method_name(args: argparse.Namespace) -> str:
+    """Name of the selected generation method for result records."""
+    if args.generate:
+        return "basic"
+    if args.rag:
+        return "rag"
+    return "agentic"
 
 def main() -> None:
     """Main entry point for the Verilog generation tools."""
@@ -152,6 +255,11 @@ def main() -> None:
         default=0,
         help="Use agentic flow with specified maximum iterations"
     )
+    method_group.add_argument(
+        '--calibrate',
+        action='store_true',
+        help="Simulate the verified designs of the selection, store reference runs in the manifest and exit"
+    )
     
     # Directory selection
     parser.add_argument(
@@ -159,6 +267,58 @@ def main() -> None:
         type=str,
         help="Specific RTLLM subdirectory to process (e.g., 'Arithmetic', 'Control')"
     )
+    parser.add_argument(
+        '--glob',
+        action='append',
+        default=[],
+        help="Only process designs whose path or name matches this glob (repeatable)"
+    )
+    parser.add_argument(
+        '--tag',
+        action='append',
+        default=[],
+        help="Only process designs with this manifest tag, e.g. 'sequential' (repeatable)"
+    )
+    parser.add_argument(
+        '--regex',
+        type=str,
+        help="Only process designs whose path matches this regular expression"
+    )
+    parser.add_argument(
+        '--rebuild-manifest',
+        action='store_true',
+        help="Re-parse every design instead of reusing the cached manifest"
+    )
+    
+    # Sweep configuration
+    parser.add_argument(
+        '--samples',
+        type=int,
+        default=1,
+        help="Number of samples to generate per design"
+    )
+    parser.add_argument(
+        '--shard',
+        type=str,
+        help="Only process shard i of N of the selected designs (format: i/N)"
+    )
+    parser.add_argument(
+        '--balance-by-cost',
+        type=Path,
+        nargs='+',
+        metavar='RESULTS',
+        help="Balance shards and schedule samples longest-first by timings from previous result stores"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help="Samples generated concurrently (default: one per provider/temperature combination)"
+    )
+    parser.add_argument(
+        '--results',
+        type=Path,
+        help="Result store to append to (default: results/<timestamp>.jsonl)"
+    )
     
     # Model configuration
     parser.add_argument(
@@ -175,8 +335,182 @@ def main() -> None:
         help="Temperature parameter for the LLM"
     )
     
+    # RAG reference selection
+    parser.add_argument(
+        '--rag-top-k',
+        type=int,
+        default=RetrievalConfig.top_k,
+        help="Number of reference designs to include in RAG prompts"
+    )
+    parser.add_argument(
+        '--rag-min-score',
+        type=float,
+        default=RetrievalConfig.min_relevance,
+        help="Minimum cosine similarity for a reference design to be used"
+    )
+    parser.add_argument(
+        '--rag-token-budget',
+        type=int,
+        default=RetrievalConfig.context_token_budget,
+        help="Approximate token budget for all reference designs in a prompt"
+    )
+    parser.add_argument(
+        '--rag-index',
+        type=str,
+        default=RetrievalConfig.index,
+        choices=['chroma', 'flat'],
+        help="Vector index for RAG search ('flat' = memory-mapped exact search)"
+    )
+    parser.add_argument(
+        '--grow-rag',
+        action='store_true',
+        help="Add the designs that passed their testbench in this run to the RAG database"
+    )
+    parser.add_argument(
+        '--sim-backend',
+        type=str,
+        default=SimulationConfig.backend,
+        choices=['local', 'mcp', 'mcp-session', 'mcp-jobs'],
+        help="Run simulations in-process ('local'), on the MCP server ('mcp'; 'mcp-session' over one "
+             "persistent connection), or as polled server-side jobs that survive dropped connections ('mcp-jobs')"
+    )
+    parser.add_argument(
+        '--mcp-endpoint',
+        type=str,
+        default=DEFAULT_ENDPOINT,
+        help="SSE endpoint of the MCP server for --sim-backend mcp/mcp-jobs"
+    )
+    parser.add_argument(
+        '--sim-workers',
+        type=int,
+        default=SimulationConfig.max_workers,
+        help="Maximum concurrent local simulations"
+    )
+    parser.add_argument(
+        '--simulator',
+        type=str,
+        default=SimulationConfig.simulator,
+        choices=['auto', 'icarus', 'verilator'],
+        help="Simulator backend ('auto' picks Verilator for long testbenches)"
+    )
+    parser.add_argument(
+        '--trace-failures',
+        action='store_true',
+        help="Re-run designs that fail their checks with a port trace around the first mismatch"
+    )
+    parser.add_argument(
+        '--fail-fast',
+        action='store_true',
+        help="Stop simulations at the first output line matching the design's failure patterns "
+             "(built-in patterns plus fail_patterns.txt in the design directory)"
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help="Print the simulator output while it runs (not with --sim-backend mcp-jobs)"
+    )
+    parser.add_argument(
+        '--branches',
+        type=int,
+        default=1,
+        help="Candidate repairs generated and simulated concurrently per agentic iteration"
+    )
+    parser.add_argument(
+        '--branch-temperatures',
+        type=lambda s: [float(t) for t in s.split(',')],
+        help="Comma-separated temperatures cycled over the repair branches, e.g. '0.2,0.6,1.0'"
+    )
+    parser.add_argument(
+        '--hedge',
+        type=float,
+        default=0.0,
+        metavar='PERCENTILE',
+        help="Re-send LLM calls slower than this percentile of recent calls (e.g. 0.9); 0 disables hedging"
+    )
+    parser.add_argument(
+        '--hedge-model',
+        type=str,
+        choices=['openai', 'anthropic', 'gemini'],
+        help="Provider of the hedge requests (default: the same model)"
+    )
+    parser.add_argument(
+        '--budget',
+        type=str,
+        default="",
+        help="Per-design limits, e.g. 'tokens=50000,wall=600,sim=120' (seconds; sim counts simulator CPU time)"
+    )
+    parser.add_argument(
+        '--run-budget',
+        type=str,
+        default="",
+        help="Limits of the whole run; remaining samples are skipped once exhausted, e.g. 'wall=14400'"
+    )
+    parser.add_argument(
+        '--matrix',
+        type=str,
+        help="Run several providers/temperatures concurrently, e.g. 'openai:0.2,anthropic,gemini:0.7'"
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help="Run -g/-r through the staged retrieve/generate/lint/simulate/score pipeline"
+    )
+    parser.add_argument(
+        '--stage-workers',
+        type=str,
+        default="",
+        help="Pipeline workers per stage, e.g. 'generate=8,simulate=4'"
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=PipelineConfig.queue_size,
+        help="Pipeline items buffered in front of each stage"
+    )
+    batch_group = parser.add_mutually_exclusive_group()
+    batch_group.add_argument(
+        '--batch-prepare',
+        type=Path,
+        metavar='REQUESTS',
+        help="Write all prompts (-g/-r) to a batch request file instead of calling the LLM"
+    )
+    batch_group.add_argument(
+        '--batch-ingest',
+        type=Path,
+        nargs=2,
+        metavar=('REQUESTS', 'RESULTS'),
+        help="Simulate the responses of a finished batch and record the results"
+    )
+    
     args = parser.parse_args()
     print(f"Starting Verilog generation with args: {args}")
+    
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+        matrix = parse_matrix(args.matrix, args.temperature) if args.matrix else None
+        budget = parse_budget(args.budget) if args.budget else BudgetLimits()
+        run_budget = parse_budget(args.run_budget) if args.run_budget else BudgetLimits()
+        if not 0.0 <= args.hedge < 1.0:
+            raise ValueError(f"Invalid hedge percentile: {args.hedge}")
+        pipeline_config = PipelineConfig(simulate_workers=args.sim_workers, queue_size=args.queue_size)
+        if args.stage_workers:
+            parse_stage_workers(args.stage_workers, pipeline_config)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.pipeline and not (args.generate or args.rag):
+        parser.error("--pipeline supports basic (-g) and RAG (-r) generation only")
+    if (args.batch_prepare or args.batch_ingest) and not (args.generate or args.rag):
+        parser.error("batch mode supports basic (-g) and RAG (-r) generation only")
+    if (args.batch_prepare or args.batch_ingest) and (budget or run_budget):
+        # The batch endpoint spends the tokens outside this process
+        parser.error("--budget and --run-budget are not supported in batch mode")
+    if args.batch_prepare:
+        providers = {run.provider for run in matrix} if matrix else {args.model}
+        unsupported = sorted(providers - set(BATCH_PROVIDERS))
+        if unsupported:
+            parser.error(f"--batch-prepare writes OpenAI batch requests, which {', '.join(unsupported)} does not accept")
+    if args.stream and args.sim_backend == "mcp-jobs":
+        parser.error("--stream is not supported with --sim-backend mcp-jobs (job output is collected by polling)")
 
     # Create single logger for entire run
     logger = create_logger()
@@ -195,35 +529,141 @@ def main() -> None:
         print(f"Error: RTLLM directory not found at {rtllm_dir}")
         return
         
-    # Get categories to process
-    if args.directory:
-        category_dir = rtllm_dir / args.directory
-        print(f"Processing specific category: {category_dir}")
-        if not category_dir.exists():
-            print(f"Error: Category directory {args.directory} not found")
-            return
-        categories = [category_dir]
-    else:
-        categories = get_rtllm_categories(rtllm_dir)
-        print(f"Found categories: {[c.name for c in categories]}")
-        
-    # Process each category
-    for category_dir in categories:
-        print(f"\nProcessing category: {category_dir.name}")
+    # Select designs from the cached manifest
+    manifest = load_manifest(rtllm_dir, rebuild=args.rebuild_manifest)
+    if args.directory and not (rtllm_dir / args.directory).exists():
+        print(f"Error: Category directory {args.directory} not found")
+        return
+    designs = filter_designs(
+        manifest,
+        prefix=args.directory,
+        globs=args.glob,
+        tags=args.tag,
+        regex=args.regex
+    )
+    if not designs:
+        print("Error: No designs match the selection")
+        return
+    print(f"Selected {len(designs)} of {len(manifest)} designs")
+    
+    if args.calibrate:
+        broken = calibrate(designs, rtllm_dir, args.simulator, args.sim_workers)
+        save_manifest(manifest, rtllm_dir / MANIFEST_FILE)
+        print("\n".join(format_calibration_report(designs)))
+        if broken:
+            logger.warning(f"{len(broken)} designs have a broken testbench or reference")
+        return
+    
+    if shard:
+        costs = historical_costs(load_results(args.balance_by_cost)) if args.balance_by_cost else None
+        designs = shard_designs(designs, shard[0], shard[1], costs)
+        print(f"Shard {args.shard}: {len(designs)} designs")
         
-        # Setup for this category
-        model_config, agent_config = setup_agent(
-            working_dir=category_dir,
-            model_provider=args.model,
-            temperature=args.temperature,
-            max_loops=args.agentic_flow if args.agentic_flow > 0 else 3,
-            logger=logger
+    retrieval = RetrievalConfig(
+        top_k=args.rag_top_k,
+        min_relevance=args.rag_min_score,
+        context_token_budget=args.rag_token_budget,
+        index=args.rag_index
+    )
+    runs = matrix or [MatrixRun(args.model, args.temperature)]
+    hedging = HedgeConfig(percentile=args.hedge, secondary=args.hedge_model or "") if args.hedge else None
+    if args.batch_prepare:
+        requests = build_requests(
+            designs, rtllm_dir, method_name(args), runs, args.samples, logger, retrieval
         )
-        print(f"Setup complete for {category_dir.name}")
-        
-        # Process all test cases in this category
-        process_rtllm_directory(category_dir, logger, args, model_config, agent_config)
-        print(f"Finished processing {category_dir.name}")
+        write_jsonl(args.batch_prepare, requests)
+        print(f"Wrote {len(requests)} batch requests to {args.batch_prepare}")
+        return
+    
+    store = ResultStore(args.results or default_results_path(shard))
+    print(f"Recording results to {store.path}")
+    sim_config = SimulationConfig(
+        backend=args.sim_backend,
+        endpoint=args.mcp_endpoint,
+        simulator=args.simulator,
+        max_workers=args.sim_workers,
+        references=reference_index(manifest),
+        trace=args.trace_failures,
+        fail_fast=args.fail_fast,
+        on_output=print_output if args.stream else None
+    )
+    
+    if args.batch_ingest:
+        results = ingest(
+            *args.batch_ingest, manifest, rtllm_dir, store, logger,
+            sim_config=sim_config, shard=args.shard or ""
+        )
+        if args.grow_rag:
+            grow_rag(results, rtllm_dir, logger)
+        return
+    
+    # Every sample of every combination shares one longest-first worker pool
+    if matrix:
+        print(f"Running matrix: {[run.label for run in matrix]}")
+    history = load_results(args.balance_by_cost) if args.balance_by_cost else []
+    if store.path.exists():
+        history += load_results([store.path])
+    duration_model = DurationModel(history, sim_runtimes(designs))
+    
+    if args.pipeline:
+        results = run_pipeline(
+            runs, designs, rtllm_dir, method_name(args), store, logger,
+            samples=args.samples,
+            retrieval=retrieval,
+            sim_config=sim_config,
+            config=pipeline_config,
+            duration_model=duration_model,
+            shard=args.shard or "",
+            hedging=hedging,
+            budget=budget,
+            run_budget=run_budget
+        )
+        report_hedging(runs, retrieval, hedging, logger)
+        if args.grow_rag:
+            grow_rag(results, rtllm_dir, logger)
+        return
+    
+    if args.rag:
+        # Retrieve references for the whole selection in one batch
+        model_config, _ = setup_agent(
+            working_dir=rtllm_dir,
+            model_provider=runs[0].provider,
+            temperature=runs[0].temperature,
+            max_loops=1,
+            logger=logger,
+            retrieval=retrieval,
+            hedging=hedging
+        )
+        prefetch_similar_designs(
+            [(d.directory(rtllm_dir) / "design_description.txt").read_text() for d in designs],
+            model_config, logger
+        )
+    
+    workers = args.workers or len(runs)
+    results = run_matrix(
+        runs, designs, rtllm_dir,
+        lambda test_dir, model_config, agent_config, output_dir, sim_config, artifacts: process_test_case(
+            test_dir, test_dir / "design_description.txt", logger, args,
+            model_config, agent_config, output_dir, sim_config, artifacts
+        ),
+        method=method_name(args),
+        store=store,
+        logger=logger,
+        samples=args.samples,
+        max_loops=args.agentic_flow if args.agentic_flow > 0 else 3,
+        retrieval=retrieval,
+        sim_config=sim_config,
+        workers=workers,
+        duration_model=duration_model,
+        shard=args.shard or "",
+        interactive=workers == 1 and not matrix,
+        budget=budget,
+        run_budget=run_budget,
+        hedging=hedging
+    )
+    report_hedging(runs, retrieval, hedging, logger)
+    if args.grow_rag:
+        grow_rag([r for run in results.values() for r in run], rtllm_dir, logger)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
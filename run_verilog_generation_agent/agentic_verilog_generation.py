@@ -6,22 +6,38 @@ This module implements an agentic flow that:
 1. Generates initial Verilog design
 2. Tests the design using Icarus
 3. If tests fail, reflects on errors and iteratively improves the design
+
+With AgentConfig.branches > 1, each failed iteration instead produces several
+candidate repairs concurrently. The candidates are simulated in parallel;
+the first passing one wins and the others are cancelled (killing their
+simulations), otherwise the next iteration continues from the candidate
+with the fewest testbench failures. Candidates are simulated in a temporary
+directory that is removed once the iteration's branch is chosen.
+
+With AgentConfig.budget set, the budget is checked between steps. When it
+is exhausted the flow stops, restores the best design tested so far and
+records the abort reason in the budget.
 """
 
+from dataclasses import dataclass
 from pathlib import Path
 from typing import TypedDict, Annotated, Optional, List, Tuple, Any
-import operator
 import asyncio
-from fastmcp import Client
-from mcp import types
+import operator
+import tempfile
+import time
 
 from langchain_core.messages import (
     AnyMessage, SystemMessage, HumanMessage, ChatMessage
 )
 from langgraph.graph import StateGraph, START, END
-import subprocess
 
-from .setup_verilog_generation_agent import ModelConfig, AgentConfig
+from .setup_verilog_generation_agent import ModelConfig, AgentConfig, release_async_connections
+from .results import is_passing_output
+from .diagnostics import Diagnostics, parse_output
+from .simulation import SimulationConfig, arun_verilog_tests, run_verilog_tests, stage_design
+from .artifacts import SampleArtifacts
+from .budget import message_tokens
 
 class AgentState(TypedDict):
     """State maintained throughout the agent's execution."""
@@ -50,6 +66,20 @@ def extract_module_content(message: str) -> str:
     
     return "\n".join(lines[start_idx:end_idx+1])
 
+@dataclass
+class RepairCandidate:
+    """One speculative repair of the current design."""
+    branch: int
+    temperature: Optional[float]
+    directory: Path
+    response: str = ""
+    output: str = ""
+    diagnostics: Optional[Diagnostics] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.diagnostics is not None and self.diagnostics.passed
+
 class VerilogGenerationAgent:
     """Agent that manages the iterative Verilog design generation process."""
     
@@ -57,12 +87,27 @@ class VerilogGenerationAgent:
         self, 
         logger: Any,
         model_config: ModelConfig,
-        agent_config: AgentConfig
+        agent_config: AgentConfig,
+        sim_config: Optional[SimulationConfig] = None,
+        artifacts: Optional[SampleArtifacts] = None
     ):
         self.logger = logger
         self.model_config = model_config
         self.config = agent_config
+        self.sim_config = sim_config
+        self.artifacts = artifacts
+        self._iteration: dict = {}  # content of the current iteration for the artifact store
+        self.output_dir = stage_design(
+            agent_config.working_dir,
+            agent_config.output_dir or agent_config.working_dir
+        )
         self.curr_loop = 1
+        self.final_output = ""
+        self.budget = agent_config.budget
+        self.best: Optional[Tuple[tuple, str, str]] = None  # (diagnostics rank, design, test output) of the best tested design
+        # Calibrated output of the verified design, for diffing failing runs
+        reference = sim_config.reference_for(self.output_dir) if sim_config else None
+        self.reference_output = reference.get("output") if reference else None
         self.conversation: List[AnyMessage] = []
         
         # Initialize conversation
@@ -101,16 +146,54 @@ class VerilogGenerationAgent:
         return graph.compile()
 
 
+    def _invoke(self, client: Any, messages: List[AnyMessage]) -> str:
+        """Call a chat client, charging its tokens to the budget."""
+        start = time.perf_counter()
+        response = client.invoke(messages)
+        if self.budget:
+            self.budget.charge_tokens(message_tokens(messages, response), time.perf_counter() - start)
+        return response.content
+
+    async def _ainvoke(self, client: Any, messages: List[AnyMessage]) -> str:
+        start = time.perf_counter()
+        response = await client.ainvoke(messages)
+        if self.budget:
+            self.budget.charge_tokens(message_tokens(messages, response), time.perf_counter() - start)
+        return response.content
+
+    def _out_of_budget(self) -> bool:
+        """Stop cleanly if the budget is exhausted, restoring the best design so far."""
+        reason = self.budget.exhausted() if self.budget else ""
+        if not reason:
+            return False
+        self.budget.abort(reason)
+        print(f"\nStopping after iteration {self.curr_loop}: {reason}")
+        self.logger.warning(f"Stopping after iteration {self.curr_loop}: {reason}")
+        if self.best is not None:
+            (self.output_dir / "design.v").write_text(self.best[1])
+        return True
+
+    def _track_best(self, test_output: str, directory: Path) -> None:
+        """Remember the tested design with the fewest failures."""
+        rank = parse_output(test_output, directory, self.reference_output).rank()
+        if self.best is None or rank < self.best[0]:
+            self.best = (rank, (directory / "design.v").read_text(), test_output)
+
     def design_generation(self, state: AgentState) -> dict:
         """Generate Verilog design based on prompt and context."""
         print("\nSending prompt to LLM...")
         self.logger.info(f"Generation Prompt:\n{self.config.design_prompt}\n")
         
-        message = self.model_config.generation_client.invoke(self.conversation).content
+        message = self._invoke(self.model_config.generation_client, self.conversation)
         print("Received response from LLM")
         module = extract_module_content(message)
         
         self.logger.info(f"Generated Design:\n{module}\n")
+        self._iteration = {
+            "prompt": self.config.design_prompt,
+            "response": message,
+            "design": module
+        }
         
         # Update conversation history
         if len(self.conversation) >= 4:
@@ -121,80 +204,73 @@ class VerilogGenerationAgent:
             
         # Save design
         print("Writing generated Verilog to file...")
-        design_file = self.config.working_dir / "design.v"
+        design_file = self.output_dir / "design.v"
         design_file.write_text(module)
         print(f"Wrote Verilog to {design_file}")
         
         return {'messages': [message]}
 
-    async def _verilog_test_mcp(self) -> tuple[str, bool]:
-        """Test the generated Verilog design using MCP client."""
-        try:
-            async with Client("http://localhost:8000/sse") as client:
-                result = await client.call_tool(
-                    "run_verilog_tests",
-                    {"working_dir": str(self.config.working_dir)}
-                )
-                
-                # Convert TextContent to string for output
-                if isinstance(result[0], types.TextContent):
-                    output = str(result[0])
-                else:
-                    output = str(result[0])
-                    
-                return output, True
-                
-        except Exception as e:
-            error_msg = f"Error running tests: {str(e)}"
-            self.logger.error(error_msg)
-            return error_msg, False
-
     def verilog_test(self, state: AgentState) -> int:
         """Test the generated Verilog design and handle failures."""
         self.logger.info("Testing Verilog Design")
         print("\nVerilog Test:")
         
-        # Run tests using MCP client
-        msg, success = asyncio.run(self._verilog_test_mcp())
+        # Run tests
+        success, msg = run_verilog_tests(self.output_dir, self.logger, self.sim_config, self.budget)
         print(f"Test Output:\n{msg}\n")
+        if self.budget:
+            self._track_best(msg, self.output_dir)
         
-        # Write results
-        self._write_results(msg)
-        
+        iteration = self.curr_loop
+        try:
+            return self._next_step(msg)
+        finally:
+            self._record(iteration, is_passing_output(msg), test_output=msg, **self._iteration)
+
+    def _next_step(self, msg: str) -> int:
+        """Decide whether to stop or repair after a test."""
         # Check if tests passed
-        if "passed" in msg.lower():
+        if is_passing_output(msg):
             return 2
             
-        # Check if we've exceeded max loops
+        # Check if we've exceeded max loops or the budget
         if self.curr_loop >= self.config.max_loops:
             return 2
+        if self._out_of_budget():
+            return 2
             
         # Increment loop counter
         self.curr_loop += 1
             
         # Handle test failure with reflection
+        if self.config.branches > 1:
+            return self._speculative_repair(msg)
         return self._handle_test_failure(msg)
 
     def _handle_test_failure(self, error_msg: str) -> int:
         """Handle test failure by getting LLM reflection and updating prompt."""
-        reflection_prompt = f"{self.config.verilog_reflection_prompt}\nError: {error_msg}"
+        diagnostics = parse_output(error_msg, self.output_dir, self.reference_output)
+        self.logger.info(f"Test Diagnostics:\n{diagnostics.to_prompt()}\n")
+        reflection_prompt = f"{self.config.verilog_reflection_prompt}\nError:\n{diagnostics.to_prompt()}"
         print(f"\nReflection Prompt:\n{reflection_prompt}\n")
         
-        user_input = input("\nContinue with reflection? (Y/N): ").upper()
-        if user_input != 'Y':
+        if not self._confirm("\nContinue with reflection? (Y/N): "):
             return 2
             
         self.conversation.append(HumanMessage(content=reflection_prompt))
-        reflection = self.model_config.reflection_client.invoke(self.conversation).content
+        reflection = self._invoke(self.model_config.reflection_client, self.conversation)
+        self._iteration["reflection"] = reflection
         
         print(f"\nLLM Reflection:\n{reflection}\n")
         
-        user_input = input("\nContinue with design modification? (Y/N): ").upper()
-        if user_input != 'Y':
+        if not self._confirm("\nContinue with design modification? (Y/N): "):
+            return 2
+        if self._out_of_budget():
             return 2
             
         new_prompt = (
             f'Modify the verilog design using these suggestions: """{reflection}"""\n'
+            f'Test result of the previous design: {diagnostics.summary()}\n'
             f'Generate verilog code only. Do not explain changes.'
         )
         
@@ -203,76 +279,174 @@ class VerilogGenerationAgent:
         
         return 1  # Return 1 to continue the loop
 
+    def _speculative_repair(self, test_output: str) -> int:
+        """Repair the design with concurrent candidates until one passes or loops run out."""
+        while True:
+            if not self._confirm(f"\nContinue with {self.config.branches} speculative repairs? (Y/N): "):
+                return 2
+            
+            with tempfile.TemporaryDirectory(prefix=f"branches_{self.curr_loop}_") as branches_dir:
+                best = asyncio.run(self._run_branches(test_output, Path(branches_dir)))
+                if best is None:
+                    self.logger.error("No repair candidate completed")
+                    return 2
+                
+                # Continue from the best candidate
+                print(f"\nIteration {self.curr_loop}: continuing from branch {best.branch} ({best.diagnostics.summary()})")
+                self.logger.info(f"Iteration {self.curr_loop}: selected branch {best.branch}: {best.diagnostics.summary()}")
+                (self.output_dir / "design.v").write_text((best.directory / "design.v").read_text())
+            self.conversation = self.conversation[:2] + [ChatMessage(role='assistant', content=best.response)]
+            test_output = best.output
+            if self.budget:
+                self._track_best(test_output, self.output_dir)
+            
+            if best.passed or self.curr_loop >= self.config.max_loops:
+                return 2
+            if self._out_of_budget():
+                return 2
+            self.curr_loop += 1
+
+    async def _run_branches(self, test_output: str, branches_dir: Path) -> Optional[RepairCandidate]:
+        """
+        Generate and simulate all repair candidates of one iteration concurrently, each in
+        its own directory under branches_dir.
+        
+        Returns the first passing candidate, cancelling the rest (and killing
+        their simulations), or the candidate with the fewest failures if none
+        passes. The LLM calls share the pooled connections of this iteration's
+        event loop, which are closed before it ends.
+        """
+        diagnostics = parse_output(test_output, self.output_dir, self.reference_output)
+        temperatures = self.config.branch_temperatures or [None]
+        candidates = [
+            RepairCandidate(
+                branch=b,
+                temperature=temperatures[b % len(temperatures)],
+                directory=stage_design(self.config.working_dir, branches_dir / f"branch_{b}")
+            )
+            for b in range(self.config.branches)
+        ]
+        
+        tasks = [asyncio.create_task(self._repair(c, diagnostics)) for c in candidates]
+        finished: List[RepairCandidate] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    candidate = await next_done
+                except Exception as e:
+                    self.logger.error(f"Repair branch failed: {str(e)}")
+                    continue
+                finished.append(candidate)
+                print(f"Branch {candidate.branch}: {candidate.diagnostics.summary()}")
+                if candidate.passed:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled branches kill their simulations before the loop closes
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await release_async_connections()
+        
+        if not finished:
+            return None
+        return min(finished, key=lambda c: c.diagnostics.rank())
+
+    async def _repair(self, candidate: RepairCandidate, diagnostics: Diagnostics) -> RepairCandidate:
+        """Reflect on the failure, regenerate and simulate one candidate."""
+        reflection_client = self._with_temperature(self.model_config.reflection_client, candidate.temperature)
+        generation_client = self._with_temperature(self.model_config.generation_client, candidate.temperature)
+        
+        reflection_prompt = f"{self.config.verilog_reflection_prompt}\nError:\n{diagnostics.to_prompt()}"
+        reflection = await self._ainvoke(
+            reflection_client, self.conversation[:3] + [HumanMessage(content=reflection_prompt)]
+        )
+        self.logger.info(f"Branch {candidate.branch} Reflection:\n{reflection}\n")
+        
+        new_prompt = (
+            f'Modify the verilog design using these suggestions: """{reflection}"""\n'
+            f'Test result of the previous design: {diagnostics.summary()}\n'
+            f'Generate verilog code only. Do not explain changes.'
+        )
+        candidate.response = await self._ainvoke(
+            generation_client, self.conversation[:3] + [HumanMessage(content=new_prompt)]
+        )
+        (candidate.directory / "design.v").write_text(extract_module_content(candidate.response))
+        
+        _, candidate.output = await arun_verilog_tests(
+            candidate.directory, self.logger, self.sim_config, self.budget
+        )
+        candidate.diagnostics = parse_output(candidate.output, candidate.directory, self.reference_output)
+        self._record(
+            self.curr_loop, candidate.passed, branch=candidate.branch,
+            test_output=candidate.output, source_dir=candidate.directory,
+            prompt=new_prompt, reflection=reflection, response=candidate.response,
+            design=(candidate.directory / "design.v").read_text()
+        )
+        return candidate
+
+    def _record(self, iteration: int, passed: bool, **kwargs: Any) -> None:
+        """Record an iteration in the artifact store, if one is configured."""
+        if self.artifacts is None:
+            return
+        kwargs.setdefault("source_dir", self.output_dir)
+        try:
+            self.artifacts.record_iteration(iteration, passed, **kwargs)
+        except OSError as e:
+            self.logger.error(f"Error recording artifacts: {str(e)}")
+
+    @staticmethod
+    def _with_temperature(client: Any, temperature: Optional[float]) -> Any:
+        """Copy of a chat client sampling at another temperature (sharing its HTTP client)."""
+        if temperature is None or "temperature" not in type(client).model_fields:
+            return client
+        return client.model_copy(update={"temperature": temperature})
+
+    def _confirm(self, question: str) -> bool:
+        """Ask the user to continue; always continue in non-interactive runs."""
+        if not self.config.interactive:
+            return True
+        return input(question).upper() == 'Y'
+
     def _write_results(self, test_output: str) -> None:
-        """Write test results and current state to output file."""
-        passed = "passed" in test_output.lower()
+        """Write the final test result to output.txt (iterations live in the artifact store)."""
+        passed = is_passing_output(test_output)
         status = "Passed" if passed else "Failed"
+        record = (
+            f"Artifacts: run {self.artifacts.run_id}, design {self.artifacts.design}, "
+            f"sample {self.artifacts.sample}\n"
+            if self.artifacts else ""
+        )
+        if self.budget:
+            record += f"Budget: {self.budget.summary()}\n"
+            if self.budget.aborted:
+                record += f"Aborted: {self.budget.aborted}\n"
         
         output_content = f"""Test Results:
 Status: Design {status}
 
-Current Iteration: {self.curr_loop} of {self.config.max_loops}
-
+Iterations: {self.curr_loop} of {self.config.max_loops}
+{record}
 Test Output:
 {test_output}
-
-Current Conversation History:
-{self._format_conversation()}
 """
-        
-        output_file = self.config.working_dir / "output.txt"
-        if self.curr_loop == 1:
-            # First iteration - create new file
-            output_file.write_text(output_content)
-        else:
-            # Subsequent iterations - append to file
-            with output_file.open('a') as f:
-                f.write("\n" + "="*80 + "\n")  # Add separator between iterations
-                f.write(output_content)
-
-    def _format_conversation(self) -> str:
-        """Format conversation history for output file."""
-        return "\n\n".join(
-            f"{msg.__class__.__name__}:\n{msg.content}"
-            for msg in self.conversation
-        )
+        (self.output_dir / "output.txt").write_text(output_content)
 
     def end_graph(self, state: AgentState) -> dict:
         """Handle end of execution."""
         # Run final test to show results
         self.logger.info("Running final test")
         
-        # Run tests
-        compile_cmd = ["iverilog", "-o", "netlist.vvp", "design.v", "testbench.v"]
-        run_cmd = ["vvp", "netlist.vvp"]
-        
-        # Compile design
-        result = subprocess.run(
-            compile_cmd, 
-            capture_output=True, 
-            text=True,
-            cwd=self.config.working_dir
-        )
-        
-        if result.returncode != 0:
-            self.logger.error(f"Final Compilation Error:\n{result.stderr}\n")
-            msg = result.stderr
+        if self.budget and self.budget.aborted and self.best is not None:
+            # The restored design was tested before the budget ran out
+            msg = self.best[2]
         else:
-            # Run tests
-            result = subprocess.run(
-                run_cmd, 
-                capture_output=True, 
-                text=True,
-                cwd=self.config.working_dir
-            )
-            
-            if result.returncode != 0:
-                self.logger.error(f"Final Runtime Error:\n{result.stderr}\n")
-                msg = result.stderr
-            else:
-                msg = result.stdout
+            # Run tests (a design already tested in the loop is served from the cache)
+            success, msg = run_verilog_tests(self.output_dir, self.logger, self.sim_config, self.budget)
+            if not success:
+                self.logger.error(f"Final Test Error:\n{msg}\n")
         
         # Write final results
+        self.final_output = msg
         self._write_results(msg)
         print(f"\nFinal Test Results:\n{msg}\n")
         
@@ -282,8 +456,10 @@ Current Conversation History:
 def run_agentic_generation(
     logger: Any,
     model_config: ModelConfig,
-    agent_config: AgentConfig
-) -> None:
+    agent_config: AgentConfig,
+    sim_config: Optional[SimulationConfig] = None,
+    artifacts: Optional[SampleArtifacts] = None
+) -> tuple[bool, str, int]:
     """
     Run the agentic Verilog generation process.
     
@@ -291,6 +467,13 @@ def run_agentic_generation(
         logger: Logger instance for recording the process
         model_config: Configuration for the LLM models
         agent_config: Configuration for the agent's behavior
+        sim_config: Simulation configuration
+        artifacts: Records every iteration's prompt, response, design,
+            reflection and test output
+        
+    Returns:
+        Tuple of (final design passed, final test output, iterations used)
     """
-    agent = VerilogGenerationAgent(logger, model_config, agent_config)
-    agent.graph.invoke({"messages": []})
\ No newline at end of file
+    agent = VerilogGenerationAgent(logger, model_config, agent_config, sim_config, artifacts)
+    agent.graph.invoke({"messages": []})
+    return is_passing_output(agent.final_output), agent.final_output, agent.curr_loop
\ No newline at end of file
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Content-addressed artifact store for generation runs.
+
+Every prompt, LLM response, generated design, reflection and compile or
+simulation log is stored once, zlib-compressed, under its SHA-256 digest:
+    artifacts/blobs/ab/abcdef....z
+
+Runs only reference blobs. Each generation iteration appends one record
+to artifacts/records/<run id>.jsonl, so storage and write I/O grow with
+unique content instead of iterations x runs.
+
+Usage:
+    # List runs, then the iterations of one run
+    poetry run python -m run_verilog_generation_agent.artifacts runs
+    poetry run python -m run_verilog_generation_agent.artifacts show 2025-05-01_12-00-00
+
+    # Print a blob by digest (a unique prefix is enough)
+    poetry run python -m run_verilog_generation_agent.artifacts cat 3fa2c1
+
+    # Restore a past sample next to its testbench and re-score it (--model
+    # picks the combination of a matrix run, e.g. openai@0.7)
+    poetry run python -m run_verilog_generation_agent.artifacts checkout \
+        2025-05-01_12-00-00 Arithmetic/Adder/adder_8bit 0 /tmp/adder_8bit --model openai@0.7 --test
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+from .diagnostics import parse_output
+
+ARTIFACTS_DIR = Path(__file__).parent.parent / "artifacts"
+BLOBS_DIR = "blobs"
+RECORDS_DIR = "records"
+COMPRESSION_LEVEL = 6
+
+def new_run_id() -> str:
+    """Timestamp identifier for a new run."""
+    return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+class ArtifactStore:
+    """Deduplicating, compressed blob store with per-run iteration records."""
+
+    def __init__(self, root: Path = ARTIFACTS_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / BLOBS_DIR / digest[:2] / f"{digest}.z"
+
+    def put(self, content: Union[str, bytes]) -> str:
+        """
+        Store content unless it is already present.
+
+        Blobs are written to a temporary file and renamed into place, so
+        concurrent writers of the same content are safe.
+
+        Returns:
+            SHA-256 hex digest of the content
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if path.exists():
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(data, COMPRESSION_LEVEL))
+        os.replace(tmp, path)
+        return digest
+
+    def resolve(self, prefix: str) -> str:
+        """
+        Expand a digest prefix to the full digest.
+
+        Raises:
+            KeyError: If no blob or more than one blob matches
+        """
+        matches = [p.stem for p in (self.root / BLOBS_DIR / prefix[:2]).glob(f"{prefix}*.z")]
+        if len(matches) != 1:
+            raise KeyError(f"{'Ambiguous' if matches else 'Unknown'} artifact digest: {prefix}")
+        return matches[0]
+
+    def get(self, digest: str) -> bytes:
+        """Content of a blob."""
+        return zlib.decompress(self._blob_path(digest).read_bytes())
+
+    def get_text(self, digest: str) -> str:
+        return self.get(digest).decode("utf-8")
+
+    def record(self, run_id: str, record: dict) -> None:
+        """Append an iteration record to a run; safe to call from several worker threads."""
+        path = self.root / RECORDS_DIR / f"{run_id}.jsonl"
+        line = json.dumps(record)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def runs(self) -> List[str]:
+        """Run ids with records, oldest first."""
+        return sorted(p.stem for p in (self.root / RECORDS_DIR).glob("*.jsonl"))
+
+    def records(self, run_id: str) -> Iterator[dict]:
+        """Iteration records of a run in write order."""
+        path = self.root / RECORDS_DIR / f"{run_id}.jsonl"
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def stats(self) -> Dict[str, int]:
+        """Blob count, stored bytes, and references made by all run records."""
+        blobs = list((self.root / BLOBS_DIR).glob("*/*.z"))
+        references = sum(
+            len(record["refs"]) for run_id in self.runs() for record in self.records(run_id)
+        )
+        return {
+            "runs": len(self.runs()),
+            "blobs": len(blobs),
+            "stored_bytes": sum(p.stat().st_size for p in blobs),
+            "references": references,
+        }
+
+@dataclass
+class SampleArtifacts:
+    """Records the iterations of one generation sample into an artifact store."""
+    store: ArtifactStore
+    run_id: str
+    design: str
+    sample: int = 0
+    method: str = ""
+    model: str = ""
+
+    def record_iteration(
+        self,
+        iteration: int,
+        passed: bool,
+        branch: Optional[int] = None,
+        test_output: str = "",
+        source_dir: Optional[Path] = None,
+        **content: str
+    ) -> dict:
+        """
+        Store the content of one iteration and append its record.
+
+        The test output is filed as a compile log when compilation failed
+        and as a simulation log otherwise.
+
+        Args:
+            iteration: Iteration number (1-based)
+            passed: Whether the iteration's design passed the testbench
+            branch: Repair branch of a speculative iteration
+            test_output: Compile and simulation output
+            source_dir: Directory with the simulated sources, for diagnostics
+            **content: Other texts by kind, e.g. prompt, response, design, reflection
+
+        Returns:
+            The appended record
+        """
+        if test_output:
+            stage = parse_output(test_output, source_dir).stage
+            content["compile_log" if stage == "compile" else "sim_log"] = test_output
+        record = {
+            "design": self.design,
+            "sample": self.sample,
+            "method": self.method,
+            "model": self.model,
+            "iteration": iteration,
+            "branch": branch,
+            "passed": passed,
+            "refs": {kind: self.store.put(text) for kind, text in content.items() if text},
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.store.record(self.run_id, record)
+        return record
+
+def sample_key(record: dict) -> tuple:
+    """(design, model label, sample) identifying the sample of a record within its run."""
+    return record["design"], record.get("model", ""), record["sample"]
+
+def _final_record(
+    records: List[dict],
+    design: str,
+    sample: int,
+    iteration: Optional[int],
+    model: Optional[str] = None
+) -> dict:
+    """
+    Latest matching record with a design (a passing branch wins within an iteration).
+
+    The combinations of a matrix run share its run id, so records are also
+    matched on their model label (e.g. openai@0.7).
+
+    Raises:
+        KeyError: If nothing matches, or model is not given and several
+            models recorded the sample
+    """
+    matching = [
+        r for r in records
+        if r["design"] == design and r["sample"] == sample and "design" in r["refs"]
+        and (iteration is None or r["iteration"] == iteration)
+        and (model is None or r.get("model", "") == model)
+    ]
+    if not matching:
+        raise KeyError(f"No design recorded for {design} sample {sample}" + (f" of {model}" if model else ""))
+    models = sorted({r.get("model", "") for r in matching})
+    if len(models) > 1:
+        raise KeyError(f"{design} sample {sample} was recorded by several models, choose one of: {', '.join(models)}")
+    return max(matching, key=lambda r: (r["iteration"], r["passed"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Artifact store tools")
+    parser.add_argument("--root", type=Path, default=ARTIFACTS_DIR, help="Artifact store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("runs", help="List runs")
+    commands.add_parser("stats", help="Show store size and deduplication")
+    show = commands.add_parser("show", help="List the iterations of a run")
+    show.add_argument("run_id")
+    show.add_argument("--design", default="*", help="Glob over design paths")
+    show.add_argument("--model", "--label", default="*", help="Glob over model labels, e.g. openai@*")
+    cat = commands.add_parser("cat", help="Print a blob")
+    cat.add_argument("digest", help="Digest or unique prefix")
+    checkout = commands.add_parser("checkout", help="Restore a sample's design next to its testbench")
+    checkout.add_argument("run_id")
+    checkout.add_argument("design", help="Design path, e.g. Arithmetic/Adder/adder_8bit")
+    checkout.add_argument("sample", type=int)
+    checkout.add_argument("output_dir", type=Path)
+    checkout.add_argument("--iteration", type=int, help="Iteration to restore (default: last)")
+    checkout.add_argument("--model", "--label", help="Model label of a matrix run, e.g. openai@0.7")
+    checkout.add_argument("--rtllm-dir", type=Path, default=Path(__file__).parent.parent / "RTLLM")
+    checkout.add_argument("--test", action="store_true", help="Re-run the testbench on the restored design")
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.root)
+    if args.command == "runs":
+        for run_id in store.runs():
+            records = list(store.records(run_id))
+            samples = {sample_key(r) for r in records}
+            print(f"{run_id}  {len(samples)} samples, {len(records)} records")
+    elif args.command == "stats":
+        for name, value in store.stats().items():
+            print(f"{name}: {value}")
+    elif args.command == "show":
+        for r in store.records(args.run_id):
+            if not (fnmatch.fnmatch(r["design"], args.design) and fnmatch.fnmatch(r.get("model", ""), args.model)):
+                continue
+            branch = f"/b{r['branch']}" if r.get("branch") is not None else ""
+            refs = " ".join(f"{kind}={digest[:10]}" for kind, digest in r["refs"].items())
+            status = "PASS" if r["passed"] else "FAIL"
+            print(f"{r['design']} [{r.get('model', '')}] s{r['sample']} i{r['iteration']}{branch} {status}  {refs}")
+    elif args.command == "cat":
+        print(store.get_text(store.resolve(args.digest)))
+    elif args.command == "checkout":
+        import logging
+        from .simulation import run_verilog_tests, stage_design
+
+        try:
+            record = _final_record(
+                list(store.records(args.run_id)), args.design, args.sample, args.iteration, args.model
+            )
+        except KeyError as e:
+            parser.error(e.args[0])
+        output_dir = stage_design(args.rtllm_dir / args.design, args.output_dir)
+        (output_dir / "design.v").write_text(store.get_text(record["refs"]["design"]))
+        label = f" [{record.get('model', '')}]" if record.get("model") else ""
+        print(f"Restored iteration {record['iteration']} of {args.design}{label} sample {args.sample} to {output_dir}")
+        if args.test:
+            _, output = run_verilog_tests(output_dir, logging.getLogger(__name__))
+            print(output)
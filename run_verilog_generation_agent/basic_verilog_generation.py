@@ -7,15 +7,16 @@ to generate Verilog scripts based on the given prompts.
 """
 
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from langchain_core.messages import SystemMessage, HumanMessage
 import os
-import subprocess
-import asyncio
-from fastmcp import Client
-from mcp import types
+import time
 
 from .setup_verilog_generation_agent import ModelConfig
+from .results import is_passing_output
+from .simulation import SimulationConfig, run_verilog_tests, stage_design
+from .artifacts import SampleArtifacts
+from .budget import Budget, message_tokens
 
 def extract_module_content(message: str) -> str:
     """Extract the Verilog module content from the LLM response.
@@ -46,38 +47,15 @@ def extract_module_content(message: str) -> str:
     
     return '\n'.join(lines[start_idx:len(lines)-end_idx])
 
-async def run_verilog_tests_mcp(working_dir: Path, logger) -> tuple[bool, str]:
-    """Compile and run Verilog tests using MCP client in the specified directory."""
-    logger.info("Testing Verilog Design")
-    print("\n\nVerilog Test:")
-    
-    try:
-        async with Client("http://localhost:8000/sse") as client:
-            result = await client.call_tool(
-                "run_verilog_tests",
-                {"working_dir": str(working_dir)}
-            )
-            
-            # Convert TextContent to string for output
-            if isinstance(result[0], types.TextContent):
-                output = str(result[0])
-            else:
-                output = str(result[0])
-                
-            print(f"Test Output:\n{output}\n\n")
-            return True, output
-            
-    except Exception as e:
-        error_msg = f"Error running tests: {str(e)}"
-        print(f"{error_msg}\n\n")
-        logger.error(error_msg)
-        return False, error_msg
-
-def run_verilog_tests(working_dir: Path, logger) -> tuple[bool, str]:
-    """Compile and run Verilog tests using MCP client in the specified directory."""
-    return asyncio.run(run_verilog_tests_mcp(working_dir, logger))
-
-def basic_generation(logger, model_config: ModelConfig, working_dir: Path = None) -> None:
+def basic_generation(
+    logger,
+    model_config: ModelConfig,
+    working_dir: Path = None,
+    output_dir: Optional[Path] = None,
+    sim_config: Optional[SimulationConfig] = None,
+    artifacts: Optional[SampleArtifacts] = None,
+    budget: Optional[Budget] = None
+) -> tuple[bool, str]:
     """
     Generate Verilog design using basic LLM generation.
     
@@ -85,6 +63,14 @@ def basic_generation(logger, model_config: ModelConfig, working_dir: Path = None
         logger: Logger instance
         model_config: Model configuration
         working_dir: Directory containing design files
+        output_dir: Directory to write and simulate design.v in (defaults to working_dir)
+        sim_config: Simulation configuration
+        artifacts: Records the prompt, response, design and test output
+        budget: Charged with the LLM call and the simulation; the design is
+            not simulated once its wall or simulation budget is exhausted
+        
+    Returns:
+        Tuple of (design passed testbench, test output or error message)
     """
     if working_dir is None:
         working_dir = Path.cwd()
@@ -92,7 +78,7 @@ def basic_generation(logger, model_config: ModelConfig, working_dir: Path = None
     design_file = working_dir / "design_description.txt"
     if not design_file.exists():
         logger.error(f"design_description.txt not found in {working_dir}")
-        return
+        return False, f"design_description.txt not found in {working_dir}"
         
     design_prompt = design_file.read_text()
     
@@ -104,28 +90,52 @@ def basic_generation(logger, model_config: ModelConfig, working_dir: Path = None
     
     try:
         print("Sending prompt to LLM...")
+        start = time.perf_counter()
         response = model_config.generation_client.invoke(messages)
+        if budget:
+            budget.charge_tokens(message_tokens(messages, response), time.perf_counter() - start)
         print("Received response from LLM")
         verilog_code = extract_module_content(response.content)
         
         if not verilog_code:
             logger.error("No Verilog module found in LLM response")
             print("No Verilog module found in response")
-            return
+            if artifacts:
+                artifacts.record_iteration(1, False, prompt=design_prompt, response=response.content)
+            return False, "No Verilog module found in LLM response"
             
         print("Writing generated Verilog to file...")
         # Write generated Verilog to file
-        output_file = working_dir / "design.v"
+        output_dir = stage_design(working_dir, output_dir or working_dir)
+        output_file = output_dir / "design.v"
         output_file.write_text(verilog_code)
         logger.info(f"Generated Verilog written to {output_file}")
         print(f"Wrote Verilog to {output_file}")
         
         # Run tests
-        success, error_msg = run_verilog_tests(working_dir, logger)
-        if success:
+        logger.info("Testing Verilog Design")
+        print("\n\nVerilog Test:")
+        # The tokens are spent, so only the time and simulation limits still apply
+        reason = budget.exhausted(tokens=False) if budget else ""
+        if reason:
+            budget.abort(reason)
+            logger.warning(f"Not simulating the design: {reason}")
+            success, error_msg = False, f"Not simulated: {reason}"
+        else:
+            success, error_msg = run_verilog_tests(output_dir, logger, sim_config, budget)
+        print(f"Test Output:\n{error_msg}\n\n")
+        passed = success and is_passing_output(error_msg)
+        if artifacts:
+            artifacts.record_iteration(
+                1, passed, test_output=error_msg, source_dir=output_dir,
+                prompt=design_prompt, response=response.content, design=verilog_code
+            )
+        if passed:
             logger.info("Verilog design passed all tests")
         else:
             logger.error(f"Verilog design failed tests: {error_msg}")
+        return passed, error_msg
             
     except Exception as e:
-        logger.error(f"Error during generation: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error during generation: {str(e)}")
+        return False, f"Error during generation: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Offline batch submission for basic and RAG sweeps.
+
+A sweep runs in two phases instead of one blocking LLM call per sample:
+1. Prepare: every prompt of the design selection (with RAG context for -r)
+   is written to a request file in the OpenAI batch JSONL format
+2. Ingest: a results file in the batch output format is read back, the
+   modules are extracted and all samples are simulated in parallel
+
+The request file can be submitted to OpenAI's discounted asynchronous
+batch endpoint; other providers' batch APIs take other formats, so only
+OpenAI combinations can be prepared. For testing, the local stand-in
+answers it with the configured chat model, or with each design's verified
+reference (no API key needed). Requests for designs that are no longer in
+the manifest are skipped on ingest.
+
+Usage:
+    # Phase 1: write the prompts of a 5-sample RAG sweep
+    poetry run python main.py -r --samples 5 --batch-prepare batches/rag.jsonl
+
+    # Answer the requests locally instead of via the batch endpoint
+    poetry run python -m run_verilog_generation_agent.batch local \
+        batches/rag.jsonl batches/rag_results.jsonl --workers 8
+
+    # Phase 2: simulate the responses and record them in a result store
+    poetry run python main.py -r --batch-ingest batches/rag.jsonl batches/rag_results.jsonl
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import argparse
+import json
+import time
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from .artifacts import ArtifactStore, SampleArtifacts, new_run_id
+from .basic_verilog_generation import extract_module_content
+from .manifest import DesignEntry
+from .matrix import RUNS_DIR, MatrixRun, sample_dir
+from .rag_verilog_generation import build_rag_prompt, prefetch_similar_designs
+from .results import ResultStore, SampleResult, is_passing_output, summarize
+from .setup_verilog_generation_agent import RetrievalConfig, create_chat_client, create_model_config
+from .simulation import SimulationConfig, run_verilog_tests, stage_design
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_PROVIDERS = ("openai",)  # providers whose batch API accepts BATCH_ENDPOINT lines
+ID_SEPARATOR = "|"
+
+@dataclass(frozen=True)
+class BatchKey:
+    """Identity of one sample in a batch, carried in the request's custom_id."""
+    method: str
+    run: MatrixRun
+    design: str
+    sample: int
+
+    @property
+    def custom_id(self) -> str:
+        return ID_SEPARATOR.join([self.method, self.run.label, self.design, str(self.sample)])
+
+    @classmethod
+    def parse(cls, custom_id: str) -> "BatchKey":
+        method, label, design, sample = custom_id.split(ID_SEPARATOR)
+        provider, _, temperature = label.partition("@")
+        return cls(method, MatrixRun(provider, float(temperature)), design, int(sample))
+
+def model_name(client: Any) -> str:
+    """Model identifier of a chat client."""
+    return getattr(client, "model_name", None) or getattr(client, "model", "")
+
+def read_jsonl(path: Path) -> List[dict]:
+    with Path(path).open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_jsonl(path: Path, lines: Iterable[dict]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+
+def build_requests(
+    designs: List[DesignEntry],
+    rtllm_dir: Path,
+    method: str,
+    runs: List[MatrixRun],
+    samples: int,
+    logger: Any,
+    retrieval: Optional[RetrievalConfig] = None
+) -> List[dict]:
+    """
+    Build one batch request per (combination, design, sample).
+
+    Args:
+        designs: Designs to generate
+        rtllm_dir: Root RTLLM directory
+        method: 'basic' or 'rag'
+        runs: Provider/temperature combinations
+        samples: Samples per design
+        logger: Logger instance
+        retrieval: RAG reference selection settings
+
+    Returns:
+        Request lines in the OpenAI batch input format
+
+    Raises:
+        ValueError: If a combination's provider has no compatible batch API
+    """
+    unsupported = sorted({run.provider for run in runs} - set(BATCH_PROVIDERS))
+    if unsupported:
+        raise ValueError(
+            f"Batch requests are written in the OpenAI format, which {', '.join(unsupported)} "
+            f"does not accept (supported: {', '.join(BATCH_PROVIDERS)})"
+        )
+    requests = []
+    descriptions = [(d.directory(rtllm_dir) / "design_description.txt").read_text() for d in designs]
+    for run in runs:
+        model_config = create_model_config(run.provider, run.temperature, retrieval=retrieval)
+        if method == "rag":
+            prefetch_similar_designs(descriptions, model_config, logger)
+        for design, description in zip(designs, descriptions):
+            prompt = build_rag_prompt(description, model_config, logger) if method == "rag" else description
+            for sample in range(samples):
+                requests.append({
+                    "custom_id": BatchKey(method, run, design.path, sample).custom_id,
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {
+                        "model": model_name(model_config.generation_client),
+                        "temperature": run.temperature,
+                        "messages": [
+                            {"role": "system", "content": model_config.system_prompt},
+                            {"role": "user", "content": prompt},
+                        ],
+                    },
+                })
+    logger.info(f"Built {len(requests)} batch requests for {len(designs)} designs")
+    return requests
+
+def batch_response(custom_id: str, content: str = "", error: str = "") -> dict:
+    """A result line in the OpenAI batch output format."""
+    if error:
+        return {"custom_id": custom_id, "response": None, "error": {"message": error}}
+    return {
+        "custom_id": custom_id,
+        "response": {
+            "status_code": 200,
+            "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]},
+        },
+        "error": None,
+    }
+
+def response_content(line: dict) -> Tuple[str, str]:
+    """
+    Extract the generated text of a result line.
+
+    Returns:
+        Tuple of (content, error message or empty string)
+    """
+    if line.get("error"):
+        return "", str(line["error"].get("message", line["error"]))
+    response = line.get("response") or {}
+    if response.get("status_code") != 200:
+        return "", f"Batch request failed with status {response.get('status_code')}"
+    try:
+        return response["body"]["choices"][0]["message"]["content"], ""
+    except (KeyError, IndexError, TypeError):
+        return "", "Malformed batch response"
+
+def answer_locally(
+    requests: List[dict],
+    rtllm_dir: Path,
+    workers: int = 4,
+    verified: bool = False
+) -> List[dict]:
+    """
+    Local stand-in for the batch endpoint.
+
+    Args:
+        requests: Request lines
+        rtllm_dir: Root RTLLM directory (for verified answers)
+        workers: Concurrent chat requests
+        verified: Answer with each design's verified reference instead of the LLM
+
+    Returns:
+        Result lines in request order
+    """
+    def answer(request: dict) -> dict:
+        key = BatchKey.parse(request["custom_id"])
+        try:
+            if verified:
+                design_dir = rtllm_dir / key.design
+                reference = next(design_dir.glob("verified_*.v"))
+                return batch_response(request["custom_id"], f"```verilog\n{reference.read_text()}\n```")
+            client = create_chat_client(key.run.provider, key.run.temperature)
+            messages = [
+                SystemMessage(content=m["content"]) if m["role"] == "system" else HumanMessage(content=m["content"])
+                for m in request["body"]["messages"]
+            ]
+            return batch_response(request["custom_id"], client.invoke(messages).content)
+        except Exception as e:
+            return batch_response(request["custom_id"], error=str(e))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(answer, requests))
+
+def ingest(
+    requests_path: Path,
+    results_path: Path,
+    manifest: List[DesignEntry],
+    rtllm_dir: Path,
+    store: ResultStore,
+    logger: Any,
+    sim_config: Optional[SimulationConfig] = None,
+    artifact_store: Optional[ArtifactStore] = None,
+    shard: str = ""
+) -> List[SampleResult]:
+    """
+    Simulate the responses of a finished batch and record their results.
+
+    Requests without a result line are recorded as failed samples;
+    requests for designs missing from the manifest are skipped.
+
+    Args:
+        requests_path: Request file written by the prepare phase
+        results_path: Result file in the batch output format
+        manifest: Manifest entries (looked up by design path)
+        rtllm_dir: Root RTLLM directory
+        store: Result store to append to
+        logger: Logger instance
+        sim_config: Simulation settings (max_workers bounds the thread pool)
+        artifact_store: Store recording prompts, responses and test output
+        shard: Shard label for result records
+
+    Returns:
+        Results in request order
+    """
+    sim_config = sim_config or SimulationConfig()
+    artifact_store = artifact_store or ArtifactStore()
+    entries = {e.path: e for e in manifest}
+    requests = []
+    for request in read_jsonl(requests_path):
+        try:
+            design = BatchKey.parse(request["custom_id"]).design
+        except (KeyError, ValueError):
+            logger.warning(f"Skipping batch request with invalid custom_id: {request.get('custom_id')}")
+            continue
+        if design not in entries:
+            logger.warning(f"Skipping batch request {request['custom_id']}: {design} is not in the manifest")
+            continue
+        requests.append(request)
+    responses = {line["custom_id"]: line for line in read_jsonl(results_path)}
+    run_id = new_run_id()
+    print(f"Ingesting {len(responses)} of {len(requests)} batch results "
+          f"(run {run_id}: designs in {RUNS_DIR / run_id})")
+
+    def score(request: dict) -> SampleResult:
+        key = BatchKey.parse(request["custom_id"])
+        design = entries[key.design]
+        prompt = request["body"]["messages"][-1]["content"]
+        artifacts = SampleArtifacts(artifact_store, run_id, design.path, key.sample, key.method, key.run.label)
+        start = time.perf_counter()
+        content, error = response_content(responses.get(request["custom_id"], {"error": {"message": "No batch result"}}))
+        verilog_code = extract_module_content(content)
+        if error or not verilog_code:
+            output = error or "No Verilog module found in LLM response"
+            logger.error(f"{key.custom_id}: {output}")
+            artifacts.record_iteration(1, False, prompt=prompt, response=content)
+            passed = False
+        else:
+            output_dir = stage_design(design.directory(rtllm_dir), sample_dir(run_id, key.run.label, design, key.sample))
+            (output_dir / "design.v").write_text(verilog_code)
+            success, output = run_verilog_tests(output_dir, logger, sim_config)
+            passed = success and is_passing_output(output)
+            artifacts.record_iteration(
+                1, passed, test_output=output, source_dir=output_dir,
+                prompt=prompt, response=content, design=verilog_code
+            )
+        result = SampleResult(
+            design=design.path,
+            category=design.category,
+            method=key.method,
+            model=key.run.provider,
+            temperature=key.run.temperature,
+            sample=key.sample,
+            passed=passed,
+            output=output,
+            duration_s=time.perf_counter() - start,
+            shard=shard,
+            run_id=run_id
+        )
+        store.append(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=sim_config.max_workers or 4) as executor:
+        results = list(executor.map(score, requests))
+    print("\n".join(summarize(results)))
+    return results
+
+def main() -> None:
+    """Command-line entry point for the local batch stand-in."""
+    parser = argparse.ArgumentParser(description="Batch generation tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    local = subparsers.add_parser("local", help="Answer a request file locally")
+    local.add_argument("requests", type=Path, help="Request file from main.py --batch-prepare")
+    local.add_argument("results", type=Path, help="Result file to write")
+    local.add_argument("--workers", type=int, default=4, help="Concurrent chat requests")
+    local.add_argument("--verified", action="store_true",
+                       help="Answer with the verified reference designs instead of the LLM")
+    local.add_argument("--rtllm-dir", type=Path, default=Path(__file__).parent.parent / "RTLLM")
+    args = parser.parse_args()
+
+    requests = read_jsonl(args.requests)
+    results = answer_locally(requests, args.rtllm_dir, args.workers, args.verified)
+    write_jsonl(args.results, results)
+    errors = sum(1 for line in results if line["error"])
+    print(f"Wrote {len(results)} results to {args.results} ({errors} errors)")
+
+if __name__ == "__main__":
+    main()
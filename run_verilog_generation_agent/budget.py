@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Resource budgets for generation runs.
+
+A budget bounds three resources:
+1. LLM tokens (prompt and completion, from the provider's usage metadata
+   or estimated from the message text)
+2. Wall time
+3. Simulation CPU seconds (user and system time of the compiler and
+   simulator processes, so concurrent simulations are not charged for
+   waiting on each other; cached results cost nothing)
+
+Each sample gets a per-design budget whose spending also counts against
+the budget of its run. The agentic flow checks its budget between steps
+and stops cleanly when it is exhausted, keeping the best design so far;
+basic and RAG generation (also in the pipeline) make a single LLM call
+and do not simulate its design once the wall or simulation budget is
+exhausted. Once the run budget is exhausted the remaining samples are
+skipped. The abort reason is recorded with the
+sample's result. Batch mode does not support budgets.
+
+Usage:
+    # At most 50k tokens and 10 minutes per design, 4 hours for the sweep
+    poetry run python main.py -a 5 --budget tokens=50000,wall=600 --run-budget wall=14400
+"""
+
+from dataclasses import dataclass
+from typing import Any, List, Optional
+import threading
+import time
+
+from .retrieval import estimate_tokens
+
+BUDGET_FIELDS = {"tokens": "tokens", "wall": "wall_s", "sim": "sim_cpu_s"}
+
+@dataclass(frozen=True)
+class BudgetLimits:
+    """Resource limits; 0 means unlimited."""
+    tokens: int = 0
+    wall_s: float = 0.0
+    sim_cpu_s: float = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self.tokens or self.wall_s or self.sim_cpu_s)
+
+def parse_budget(spec: str) -> BudgetLimits:
+    """
+    Parse a budget specification such as 'tokens=50000,wall=600,sim=120'.
+
+    Wall and simulation limits are in seconds.
+
+    Raises:
+        ValueError: If a resource or limit is invalid
+    """
+    limits = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if name not in BUDGET_FIELDS:
+            raise ValueError(f"Invalid budget resource: {name} (resources: {', '.join(BUDGET_FIELDS)})")
+        try:
+            limit = int(value) if name == "tokens" else float(value)
+        except ValueError:
+            raise ValueError(f"Invalid budget limit: {item}") from None
+        if limit < 0:
+            raise ValueError(f"Invalid budget limit: {item}")
+        limits[BUDGET_FIELDS[name]] = limit
+    return BudgetLimits(**limits)
+
+def message_tokens(messages: List[Any], response: Any) -> int:
+    """Tokens of one chat call, from its usage metadata or estimated from the text."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return int(usage["total_tokens"])
+    text = "".join(str(m.content) for m in messages) + str(response.content)
+    return estimate_tokens(text)
+
+class Budget:
+    """Resources spent against limits, optionally counting against a parent budget."""
+
+    def __init__(self, limits: BudgetLimits, name: str = "design", parent: Optional["Budget"] = None):
+        """
+        Args:
+            limits: Resource limits
+            name: Scope used in abort reasons, e.g. 'design' or 'run'
+            parent: Budget that is charged with everything charged here
+        """
+        self.limits = limits
+        self.name = name
+        self.parent = parent
+        self.started = time.monotonic()
+        self.tokens = 0
+        self.llm_s = 0.0
+        self.sim_s = 0.0  # simulation wall time, for reporting
+        self.sim_cpu_s = 0.0
+        self.aborted = ""  # reason the work stopped early
+        self._lock = threading.Lock()
+
+    @property
+    def wall_s(self) -> float:
+        return time.monotonic() - self.started
+
+    def child(self, limits: BudgetLimits, name: str = "design") -> "Budget":
+        """Budget of a part of this budget's work."""
+        return Budget(limits, name, parent=self)
+
+    def charge_tokens(self, tokens: int, seconds: float = 0.0) -> None:
+        """Charge the tokens of an LLM call (and its latency, for reporting)."""
+        with self._lock:
+            self.tokens += tokens
+            self.llm_s += seconds
+        if self.parent:
+            self.parent.charge_tokens(tokens, seconds)
+
+    def charge_sim(self, cpu_seconds: float, seconds: float = 0.0) -> None:
+        """Charge the CPU time of a simulation (and its wall time, for reporting)."""
+        with self._lock:
+            self.sim_cpu_s += cpu_seconds
+            self.sim_s += seconds
+        if self.parent:
+            self.parent.charge_sim(cpu_seconds, seconds)
+
+    def exhausted(self, tokens: bool = True) -> str:
+        """
+        Reason this budget or a parent is exhausted, or an empty string.
+
+        Args:
+            tokens: Whether token limits count (not once the remaining work
+                makes no LLM calls)
+        """
+        limits = self.limits
+        if tokens and limits.tokens and self.tokens >= limits.tokens:
+            return f"{self.name} token budget exhausted ({self.tokens} of {limits.tokens} tokens)"
+        if limits.wall_s and self.wall_s >= limits.wall_s:
+            return f"{self.name} time budget exhausted ({self.wall_s:.0f}s of {limits.wall_s:g}s)"
+        if limits.sim_cpu_s and self.sim_cpu_s >= limits.sim_cpu_s:
+            return (
+                f"{self.name} simulation budget exhausted "
+                f"({self.sim_cpu_s:.1f}s of {limits.sim_cpu_s:g}s CPU)"
+            )
+        return self.parent.exhausted(tokens) if self.parent else ""
+
+    def remaining_wall_s(self) -> Optional[float]:
+        """Wall time left before this budget or a parent runs out (None if unlimited)."""
+        remaining = self.limits.wall_s - self.wall_s if self.limits.wall_s else None
+        if self.parent:
+            parent = self.parent.remaining_wall_s()
+            if parent is not None:
+                remaining = parent if remaining is None else min(remaining, parent)
+        return None if remaining is None else max(remaining, 0.0)
+
+    def abort(self, reason: str) -> None:
+        """Record why the work stopped early."""
+        self.aborted = reason
+
+    def summary(self) -> str:
+        return f"{self.tokens} tokens, {self.wall_s:.0f}s wall, {self.sim_cpu_s:.1f}s simulation CPU"
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Golden calibration of the RTLLM testbenches.
+
+Each design's verified_*.v is compiled and simulated under its own
+testbench. The reference run is stored in the manifest entry:
+1. Status: ok, failing (no pass banner), compile_error, timeout or
+   no_verified
+2. Reference output, pass banner and compile/simulation runtimes
+3. A time budget for simulating generated designs
+
+Designs whose status is not ok have a broken testbench or reference and
+are reported. Generated designs are bounded by the calibrated time
+budget, and their failing output is diffed line by line against the
+reference output.
+
+Usage:
+    # Calibrate every design (or a selection) and store the results in the manifest
+    poetry run python main.py --calibrate
+    poetry run python main.py --calibrate -d Miscellaneous/RISC-V
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import os
+import shutil
+import tempfile
+
+from MCP.simulators import TIMEOUT_MESSAGE, simulate
+
+from .manifest import DesignEntry, TESTBENCH_FILE
+from .results import is_passing_output
+from .simulation import stage_design
+
+TIMEOUT_FACTOR = 10.0  # budget = factor x reference runtime
+MIN_TIMEOUT_S = 10.0
+CALIBRATION_TIMEOUT_S = 600.0  # bound for the reference run itself
+
+def timeout_budget(runtime_s: float) -> float:
+    """Time budget for a design whose reference run took runtime_s."""
+    return round(max(MIN_TIMEOUT_S, TIMEOUT_FACTOR * runtime_s), 1)
+
+def pass_banner(output: str) -> str:
+    """The line of a simulation output that announces the pass."""
+    return next(
+        (line.strip() for line in output.splitlines() if is_passing_output(line)),
+        ""
+    )
+
+async def calibrate_design(
+    entry: DesignEntry,
+    rtllm_dir: Path,
+    work_dir: Path,
+    simulator: str = "auto",
+    timeout: float = CALIBRATION_TIMEOUT_S
+) -> Dict[str, object]:
+    """
+    Simulate the verified design of one manifest entry.
+
+    Args:
+        entry: Manifest entry
+        rtllm_dir: Root RTLLM directory
+        work_dir: Scratch directory for the run
+        simulator: Simulator backend name
+        timeout: Bound for compilation and simulation
+
+    Returns:
+        Reference record for the manifest
+    """
+    reference: Dict[str, object] = {
+        "calibrated": datetime.now().isoformat(timespec="seconds"),
+        "simulator": simulator,
+    }
+    design_dir = entry.directory(rtllm_dir)
+    if not entry.verified_file or not (design_dir / TESTBENCH_FILE).exists():
+        reference["status"] = "no_verified"
+        return reference
+
+    stage_design(design_dir, work_dir)
+    (work_dir / "design.v").write_bytes((design_dir / entry.verified_file).read_bytes())
+    result = await simulate(work_dir, simulator, timeout=timeout)
+
+    output = result["output"]
+    if TIMEOUT_MESSAGE in output:
+        status = "timeout"
+    elif not result["success"] and not result["sim_output"] and not result["sim_s"]:
+        status = "compile_error"
+    elif result["success"] and is_passing_output(output):
+        status = "ok"
+    else:
+        status = "failing"
+
+    runtime = result["compile_s"] + result["sim_s"]
+    reference.update({
+        "status": status,
+        "simulator": result["backend"],
+        "banner": pass_banner(output),
+        "output": result["sim_output"],
+        "compile_s": result["compile_s"],
+        "sim_s": result["sim_s"],
+        "runtime_s": round(runtime, 3),
+        "timeout_s": timeout_budget(runtime) if status == "ok" else None,
+    })
+    return reference
+
+async def _calibrate_all(
+    entries: List[DesignEntry],
+    rtllm_dir: Path,
+    simulator: str,
+    max_workers: int
+) -> None:
+    semaphore = asyncio.Semaphore(max_workers)
+    scratch = Path(tempfile.mkdtemp(prefix="rtllm_calibration_"))
+
+    async def run(entry: DesignEntry) -> None:
+        async with semaphore:
+            entry.reference = await calibrate_design(
+                entry, rtllm_dir, scratch / entry.path, simulator
+            )
+            print(f"{entry.path}: {entry.reference['status']} "
+                  f"({entry.reference.get('runtime_s', 0.0)}s)")
+
+    try:
+        await asyncio.gather(*(run(entry) for entry in entries))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def calibrate(
+    entries: List[DesignEntry],
+    rtllm_dir: Path,
+    simulator: str = "auto",
+    max_workers: Optional[int] = None
+) -> List[DesignEntry]:
+    """
+    Calibrate manifest entries in place, several designs at a time.
+
+    Args:
+        entries: Manifest entries to calibrate
+        rtllm_dir: Root RTLLM directory
+        simulator: Simulator backend name
+        max_workers: Concurrent simulations (defaults to the CPU count)
+
+    Returns:
+        Entries whose testbench or reference design is broken
+    """
+    asyncio.run(_calibrate_all(entries, Path(rtllm_dir), simulator, max_workers or os.cpu_count() or 4))
+    return [e for e in entries if e.reference.get("status") != "ok"]
+
+def reference_index(entries: List[DesignEntry]) -> Dict[str, dict]:
+    """Calibrated references of healthy designs keyed by testbench SHA-256."""
+    return {
+        e.hashes[TESTBENCH_FILE]: e.reference
+        for e in entries
+        if e.reference.get("status") == "ok" and TESTBENCH_FILE in e.hashes
+    }
+
+def format_calibration_report(entries: List[DesignEntry]) -> List[str]:
+    """Summary lines of a calibration pass."""
+    counts: Dict[str, int] = {}
+    for entry in entries:
+        status = str(entry.reference.get("status", "uncalibrated"))
+        counts[status] = counts.get(status, 0) + 1
+    lines = ["Calibration: " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items()))]
+
+    broken = [e for e in entries if e.reference.get("status") != "ok"]
+    if broken:
+        lines.append("Designs with a broken testbench or reference:")
+        lines.extend(f"  {e.path}: {e.reference.get('status')}" for e in broken)
+
+    slowest = sorted(
+        (e for e in entries if e.reference.get("status") == "ok"),
+        key=lambda e: -e.reference["runtime_s"]
+    )[:5]
+    if slowest:
+        lines.append("Slowest reference runs:")
+        lines.extend(
+            f"  {e.path}: {e.reference['runtime_s']}s (budget {e.reference['timeout_s']}s)"
+            for e in slowest
+        )
+    return lines
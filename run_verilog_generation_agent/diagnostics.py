@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Structured diagnostics for Icarus Verilog compile and simulation output.
+
+This module turns raw `iverilog` and `vvp` output into compact diagnostics:
+1. Compile errors with file, line, error class and the offending source lines
+2. Testbench results: pass banner, failure counts (e.g. "Test completed
+   with N /100 failures") and the first failing checks
+3. Simulation timeouts, and a line diff against the calibrated output of
+   the verified design when one is available
+4. The port trace around the first mismatch, when failure tracing is on
+   (see SimulationConfig.trace)
+
+The reflection and regeneration prompts of the agentic flow use the
+bounded text form of these diagnostics instead of the raw tool output.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+import difflib
+from pathlib import Path
+from typing import List, Optional
+import re
+
+from MCP.simulators import TIMEOUT_MESSAGE, TRACE_HEADER
+
+from .results import is_passing_output
+
+MAX_FAILURE_LINES = 5
+MAX_DIFF_LINES = 10
+MAX_PROMPT_CHARS = 2000
+MAX_TRACE_WIDTH = 160
+
+COMPILE_LINE_RE = re.compile(r"^(?P<file>[^\s:]+\.s?v):(?P<line>\d+):\s*(?P<message>.*)$")
+FAILURE_COUNT_RE = re.compile(
+    r"completed with\s+(?P<count>\d+)\s*(?:/\s*(?P<total>\d+)\s*)?(?:failures|errors)",
+    re.IGNORECASE
+)
+FAILURE_LINE_RE = re.compile(r"fail|error|mismatch|expected|incorrect", re.IGNORECASE)
+BANNER_RE = re.compile(r"^=+.*=+$")
+
+# Icarus message fragments mapped to error classes, checked in order
+ERROR_CLASSES = [
+    ("syntax error", "syntax"),
+    ("unknown module type", "unknown_module"),
+    ("is not a port", "port_mismatch"),
+    ("port", "port_mismatch"),
+    ("unable to bind", "undeclared_identifier"),
+    ("not declared", "undeclared_identifier"),
+    ("already been declared", "redeclaration"),
+    ("already declared", "redeclaration"),
+    ("not a valid l-value", "invalid_lvalue"),
+    ("sorry:", "unsupported_construct"),
+    ("width", "width_mismatch"),
+]
+
+@dataclass
+class CompileError:
+    """A single compiler message tied to a source location."""
+    file: str
+    line: int
+    error_class: str
+    message: str
+    snippet: str = ""
+
+@dataclass
+class Diagnostics:
+    """Compact summary of one compile-and-simulate run."""
+    stage: str
+    passed: bool
+    compile_errors: List[CompileError] = field(default_factory=list)
+    failures: Optional[int] = None
+    total_checks: Optional[int] = None
+    failure_lines: List[str] = field(default_factory=list)
+    omitted_failure_lines: int = 0
+    reference_diff: List[str] = field(default_factory=list)
+    trace: str = ""
+    other: str = ""
+
+    @property
+    def error_classes(self) -> Counter:
+        return Counter(e.error_class for e in self.compile_errors)
+
+    def rank(self) -> tuple:
+        """Sort key from best (passed) to worst (test could not be run)."""
+        if self.passed:
+            return (0, 0)
+        if self.stage == "simulation":
+            # Unknown failure counts rank behind every counted failure
+            return (1, self.failures if self.failures is not None else float("inf"))
+        if self.stage == "compile":
+            return (2, len(self.compile_errors))
+        if self.stage == "timeout":
+            return (3, 0)
+        return (4, 0)
+
+    def summary(self) -> str:
+        """One-line description of the outcome."""
+        if self.passed:
+            return "Design passed the testbench."
+        if self.stage == "compile":
+            classes = ", ".join(f"{c} x{n}" for c, n in self.error_classes.most_common())
+            return f"Compilation failed with {len(self.compile_errors)} errors ({classes})."
+        if self.stage == "transport":
+            return "The test could not be run."
+        if self.stage == "timeout":
+            return "Simulation exceeded its time budget (the design may never reach the end of the testbench)."
+        if self.failures is not None:
+            total = f" of {self.total_checks}" if self.total_checks else ""
+            return f"Simulation completed with {self.failures}{total} checks failing."
+        return "Simulation ran but the design did not pass the testbench."
+
+    def to_prompt(self, max_chars: int = MAX_PROMPT_CHARS) -> str:
+        """Bounded text form for reflection and regeneration prompts; the trace gets at most half of max_chars."""
+        lines = [self.summary()]
+        for error in self.compile_errors:
+            lines.append(f"- {error.file}:{error.line} [{error.error_class}] {error.message}")
+            if error.snippet:
+                lines.extend(f"    {s}" for s in error.snippet.splitlines())
+        if self.failure_lines:
+            lines.append("First failing checks:")
+            lines.extend(f"- {line}" for line in self.failure_lines)
+            if self.omitted_failure_lines:
+                lines.append(f"- ... {self.omitted_failure_lines} more failing checks")
+        if self.reference_diff:
+            lines.append("Differences from the reference output (- reference, + this design):")
+            lines.extend(self.reference_diff)
+        if self.other:
+            lines.append(self.other)
+
+        trace = clip_trace(self.trace, max_chars // 2)
+        if trace:
+            max_chars -= len(trace) + 1
+        text = "\n".join(lines)
+        if len(text) > max_chars:
+            text = text[:max_chars - 16].rstrip() + "\n... (truncated)"
+        return f"{text}\n{trace}" if trace else text
+
+def clip_trace(trace: str, max_chars: int) -> str:
+    """Port trace cut to whole rows within max_chars, each row at most MAX_TRACE_WIDTH wide."""
+    if not trace:
+        return ""
+    rows = [r if len(r) <= MAX_TRACE_WIDTH else r[:MAX_TRACE_WIDTH - 3] + "..." for r in trace.splitlines()]
+    note = "... (trace truncated)"
+    kept, size = [], 0
+    for i, row in enumerate(rows):
+        last = i == len(rows) - 1
+        if size + len(row) + (0 if last else len(note) + 1) > max_chars:
+            if len(kept) < 2:  # not even the header and column names fit
+                return ""
+            return "\n".join(kept + [note])
+        kept.append(row)
+        size += len(row) + 1
+    return "\n".join(kept)
+
+def classify_error(message: str) -> str:
+    """Map an Icarus error message to an error class."""
+    lowered = message.lower()
+    for fragment, error_class in ERROR_CLASSES:
+        if fragment in lowered:
+            return error_class
+    return "elaboration"
+
+def _snippet(source_dir: Optional[Path], file: str, line: int, context: int = 1) -> str:
+    """Numbered source lines around a compile error."""
+    if source_dir is None:
+        return ""
+    path = Path(source_dir) / file
+    if not path.exists():
+        return ""
+    source = path.read_text(errors="replace").splitlines()
+    start, end = max(line - 1 - context, 0), min(line + context, len(source))
+    return "\n".join(f"{n + 1:>4}| {source[n]}" for n in range(start, end))
+
+def parse_compile_output(output: str, source_dir: Optional[Path] = None) -> List[CompileError]:
+    """
+    Parse iverilog messages into compile errors.
+
+    Warnings are skipped and repeated messages for the same line are merged.
+
+    Args:
+        output: Compiler output
+        source_dir: Directory with the compiled sources, for snippets
+
+    Returns:
+        Compile errors in output order
+    """
+    errors = []
+    seen = set()
+    for raw in output.splitlines():
+        match = COMPILE_LINE_RE.match(raw.strip())
+        if not match:
+            continue
+        message = match.group("message").strip()
+        if message.lower().startswith("warning"):
+            continue
+        message = re.sub(r"^error:\s*", "", message, flags=re.IGNORECASE)
+        file, line = Path(match.group("file")).name, int(match.group("line"))
+        if (file, line) in seen:
+            continue
+        seen.add((file, line))
+        errors.append(CompileError(
+            file=file,
+            line=line,
+            error_class=classify_error(message),
+            message=message,
+            snippet=_snippet(source_dir, file, line)
+        ))
+    return errors
+
+def diff_output(output: str, reference: str, max_lines: int = MAX_DIFF_LINES) -> List[str]:
+    """
+    Line-by-line differences between a simulation output and the reference output.
+
+    Args:
+        output: Output of the candidate design
+        reference: Output of the verified design
+        max_lines: Maximum number of diff lines to return
+
+    Returns:
+        Diff lines prefixed with '-' (reference) or '+' (candidate) and the
+        1-based reference line number
+    """
+    ref_lines = [" ".join(l.split()) for l in reference.splitlines()]
+    out_lines = [" ".join(l.split()) for l in output.splitlines()]
+    diff = []
+    matcher = difflib.SequenceMatcher(a=ref_lines, b=out_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        diff.extend(f"- {i + 1}: {ref_lines[i]}" for i in range(i1, i2))
+        diff.extend(f"+ {i1 + 1}: {out_lines[j]}" for j in range(j1, j2))
+        if len(diff) >= max_lines:
+            return diff[:max_lines] + ["  ..."]
+    return diff
+
+def split_trace(output: str) -> tuple:
+    """Split tool output into (simulator output, port trace or empty string)."""
+    index = output.find(TRACE_HEADER)
+    if index < 0:
+        return output, ""
+    return output[:index], output[index:].strip()
+
+def parse_output(
+    output: str,
+    source_dir: Optional[Path] = None,
+    reference_output: Optional[str] = None
+) -> Diagnostics:
+    """
+    Parse the output of a compile-and-simulate run.
+
+    Args:
+        output: Tool output (compiler and simulator text)
+        source_dir: Directory with design.v and testbench.v, for snippets
+        reference_output: Calibrated output of the verified design, for a diff
+
+    Returns:
+        Structured diagnostics
+    """
+    if output.startswith("Error running tests"):
+        return Diagnostics(stage="transport", passed=False, other=output.strip()[:500])
+    if TIMEOUT_MESSAGE in output:
+        return Diagnostics(stage="timeout", passed=False, other=output.strip()[-500:])
+
+    output, trace = split_trace(output)
+    compile_errors = parse_compile_output(output, source_dir)
+    if compile_errors:
+        return Diagnostics(stage="compile", passed=False, compile_errors=compile_errors)
+
+    diagnostics = Diagnostics(stage="simulation", passed=is_passing_output(output), trace=trace)
+    count = FAILURE_COUNT_RE.search(output)
+    if count:
+        diagnostics.failures = int(count.group("count"))
+        diagnostics.total_checks = int(count.group("total")) if count.group("total") else None
+
+    failing = []
+    for raw in output.splitlines():
+        line = " ".join(raw.split())
+        if not line or FAILURE_COUNT_RE.search(line) or BANNER_RE.match(line):
+            continue
+        if FAILURE_LINE_RE.search(line) and line not in failing:
+            failing.append(line)
+    diagnostics.failure_lines = failing[:MAX_FAILURE_LINES]
+    diagnostics.omitted_failure_lines = max(len(failing) - MAX_FAILURE_LINES, 0)
+
+    if not diagnostics.passed and reference_output:
+        diagnostics.reference_diff = diff_output(output, reference_output)
+
+    if not diagnostics.passed and not failing and diagnostics.failures is None:
+        # Unrecognised output, e.g. a banner-only "Error" or a runtime crash
+        diagnostics.other = "\n".join(output.strip().splitlines()[-MAX_FAILURE_LINES:])
+    return diagnostics
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped flat vector index for the RAG corpus.
+
+The MG-Verilog corpus is small enough to search exactly with one matrix
+multiply, so this module exports the Chroma store into flat files:
+1. embeddings.npy - float32 [N, D] unit-length embeddings
+2. documents.bin  - UTF-8 document texts, concatenated
+3. offsets.npy    - int64 [N + 1] byte offsets into documents.bin
+4. metadata.jsonl - one JSON object per document (id and metadata)
+
+All arrays are opened with mmap, so loading is effectively free and
+several worker processes share one page-cached copy of the index.
+
+Usage:
+    # Export rag_dataset/chroma/ into rag_dataset/flat/
+    poetry run python -m run_verilog_generation_agent.flat_index build
+"""
+
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+import argparse
+import json
+import mmap
+
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.bin"
+OFFSETS_FILE = "offsets.npy"
+METADATA_FILE = "metadata.jsonl"
+
+EXPORT_BATCH_SIZE = 1000
+
+def default_index_dir(persist_directory: str) -> Path:
+    """Flat index location next to a Chroma persist directory."""
+    return Path(persist_directory).parent / "flat"
+
+def export_flat_index(persist_directory: str, index_dir: Path) -> int:
+    """
+    Export a Chroma store into a flat memory-mappable index.
+
+    Embeddings are copied from the store, not recomputed.
+
+    Args:
+        persist_directory: Chroma persist directory
+        index_dir: Output directory for the flat index
+
+    Returns:
+        Number of exported documents
+    """
+    from langchain_community.vectorstores import Chroma
+    from .rag_index import recover_compaction
+
+    recover_compaction(persist_directory)
+    collection = Chroma(persist_directory=str(persist_directory))._collection
+    count = collection.count()
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    embeddings = None
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    position = 0
+    row = 0
+    with (index_dir / DOCUMENTS_FILE).open("wb") as documents, \
+            (index_dir / METADATA_FILE).open("w", encoding="utf-8") as metadata:
+        for start in range(0, count, EXPORT_BATCH_SIZE):
+            batch = collection.get(
+                offset=start,
+                limit=EXPORT_BATCH_SIZE,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.lib.format.open_memmap(
+                    index_dir / EMBEDDINGS_FILE, mode="w+",
+                    dtype=np.float32, shape=(count, vectors.shape[1])
+                )
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+            embeddings[row:row + len(vectors)] = vectors
+
+            for doc_id, text, meta in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                data = (text or "").encode("utf-8")
+                documents.write(data)
+                position += len(data)
+                row += 1
+                offsets[row] = position
+                metadata.write(json.dumps({"id": doc_id, **(meta or {})}) + "\n")
+            print(f"Exported {row} of {count} documents")
+
+    if embeddings is not None:
+        embeddings.flush()
+        del embeddings
+    np.save(index_dir / OFFSETS_FILE, offsets[:row + 1])
+    return row
+
+class FlatVectorIndex:
+    """Exact cosine-similarity search over a memory-mapped embedding matrix."""
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.embeddings = np.load(self.index_dir / EMBEDDINGS_FILE, mmap_mode="r")
+        self.offsets = np.load(self.index_dir / OFFSETS_FILE, mmap_mode="r")
+        with (self.index_dir / DOCUMENTS_FILE).open("rb") as f:
+            self._documents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+        self._metadata: Optional[List[dict]] = None
+
+    @classmethod
+    def exists(cls, index_dir: Path) -> bool:
+        """Check that all index files are present."""
+        return all(
+            (Path(index_dir) / name).exists()
+            for name in (EMBEDDINGS_FILE, DOCUMENTS_FILE, OFFSETS_FILE, METADATA_FILE)
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def document(self, i: int) -> str:
+        """Text of document i."""
+        return bytes(self._documents[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def _all_metadata(self) -> List[dict]:
+        if self._metadata is None:
+            with (self.index_dir / METADATA_FILE).open(encoding="utf-8") as f:
+                self._metadata = [json.loads(line) for line in f]
+        return self._metadata
+
+    def metadata(self, i: int) -> dict:
+        """Metadata of document i (loaded on first use)."""
+        return self._all_metadata()[i]
+
+    def rows_where(self, field: str, value: str) -> Set[int]:
+        """Documents whose metadata field equals a value."""
+        return {i for i, meta in enumerate(self._all_metadata()) if meta.get(field) == value}
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar documents for a batch of query vectors.
+
+        All queries are answered with a single matrix multiply.
+
+        Args:
+            queries: Query embeddings, shape [Q, D] (or [D] for one query)
+            k: Number of results per query
+
+        Returns:
+            Tuple of (indices [Q, k], cosine similarities [Q, k]), best first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+        k = min(k, len(self))
+        scores = queries @ self.embeddings.T
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flat RAG index tools")
+    parser.add_argument("command", choices=["build"], help="Export the Chroma store to a flat index")
+    parser.add_argument(
+        "--persist-dir",
+        default=str(Path(__file__).parent / "rag_dataset" / "chroma"),
+        help="Chroma persist directory"
+    )
+    parser.add_argument("--index-dir", type=Path, help="Output directory (default: rag_dataset/flat)")
+    args = parser.parse_args()
+
+    index_dir = args.index_dir or default_index_dir(args.persist_dir)
+    total = export_flat_index(args.persist_dir, index_dir)
+    print(f"Flat index with {total} documents written to {index_dir}")
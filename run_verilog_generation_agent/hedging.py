@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Hedged LLM requests.
+
+A sweep finishes with its slowest samples, and those are often slowed
+down by a few slow provider responses. With hedging, a call that is still
+running once it passes a latency percentile learned from recent calls is
+sent a second time (to the same model or to a secondary one):
+1. The first acceptable (non-empty) response is used
+2. The other request is cancelled (async calls) or abandoned and its
+   response discarded (sync calls)
+3. Hedges sent, hedges that won, and the tokens of discarded responses are
+   recorded as the extra cost of the policy
+
+A call that fails or returns an empty response before the hedge delay is
+hedged right away.
+
+Usage:
+    # RAG sweep hedging calls slower than the 90th percentile with a second provider
+    poetry run python main.py -r --samples 5 --hedge 0.9 --hedge-model anthropic
+
+    # Compare tail latency with and without hedging on a fake provider
+    poetry run python -m run_verilog_generation_agent.hedging demo --calls 400 --percentile 0.9
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Deque, List, Optional, Tuple
+import argparse
+import asyncio
+import random
+import statistics
+import threading
+import time
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from .budget import message_tokens
+
+HEDGE_THREADS = 64  # threads for concurrent sync attempts, shared by all hedged clients
+_executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="hedge")
+
+@dataclass(frozen=True)
+class HedgeConfig:
+    """Hedging policy settings."""
+    percentile: float = 0.9  # hedge calls slower than this quantile of recent latencies
+    window: int = 100  # recent latencies the percentile is learned from
+    min_samples: int = 10  # calls observed before hedging starts
+    min_delay_s: float = 1.0  # never hedge sooner than this
+    secondary: str = ""  # provider of the hedge request (default: same model)
+
+class HedgePolicy:
+    """Learned hedge delay and the extra cost of hedging; shared by copies of a hedged client."""
+
+    def __init__(self, config: HedgeConfig):
+        self.config = config
+        self._latencies: Deque[float] = deque(maxlen=config.window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.discarded = 0  # requests whose response was not used
+        self.discarded_tokens = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while still learning."""
+        with self._lock:
+            if len(self._latencies) < self.config.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(int(self.config.percentile * len(latencies)), len(latencies) - 1)
+        return max(latencies[index], self.config.min_delay_s)
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a primary request (a lower bound if it was cancelled)."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def record(self, hedged: bool, hedge_won: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+
+    def record_discarded(self, tokens: int = 0) -> None:
+        with self._lock:
+            self.discarded += 1
+            self.discarded_tokens += tokens
+
+    def summary(self) -> str:
+        with self._lock:
+            rate = self.hedged / self.calls if self.calls else 0.0
+            return (
+                f"{self.calls} calls, {self.hedged} hedged ({rate:.0%}), {self.hedge_wins} won by the hedge, "
+                f"{self.discarded} responses discarded (~{self.discarded_tokens} tokens)"
+            )
+
+def _acceptable(message: BaseMessage) -> bool:
+    return bool(str(message.content).strip())
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that hedges slow calls of a primary model."""
+    primary: BaseChatModel
+    secondary: Optional[BaseChatModel] = None
+    policy: HedgePolicy
+    temperature: Optional[float] = None  # overrides the models' temperature when set
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    def _client(self, client: BaseChatModel) -> BaseChatModel:
+        if self.temperature is None or "temperature" not in type(client).model_fields:
+            return client
+        return client.model_copy(update={"temperature": self.temperature})
+
+    def _attempts(self) -> Tuple[BaseChatModel, BaseChatModel]:
+        primary = self._client(self.primary)
+        return primary, self._client(self.secondary) if self.secondary else primary
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        primary, hedge = self._attempts()
+        start = time.monotonic()
+        delay = self.policy.delay()
+        first = _executor.submit(primary.invoke, messages, stop=stop, **kwargs)
+        first.add_done_callback(lambda _: self.policy.observe(time.monotonic() - start))
+        pending = {first}
+        second: Optional[Future] = None
+        fallback: Optional[BaseMessage] = None
+        error: Optional[BaseException] = None
+        winner: Optional[Future] = None
+        while pending and winner is None:
+            timeout = None
+            if second is None and delay is not None:
+                timeout = max(delay - (time.monotonic() - start), 0.0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                elif _acceptable(future.result()):
+                    winner = future
+                    break
+                else:
+                    fallback = future.result()
+            if winner is None and second is None and (not done or not pending):
+                # Past the hedge delay, or the primary failed early
+                second = _executor.submit(hedge.invoke, messages, stop=stop, **kwargs)
+                pending.add(second)
+
+        for future in pending:
+            # Sync requests cannot be interrupted: discard whatever they return
+            future.cancel()
+            future.add_done_callback(lambda f: self.policy.record_discarded(
+                0 if f.cancelled() or f.exception() else message_tokens(messages, f.result())
+            ))
+        self.policy.record(second is not None, winner is not None and winner is second)
+        if winner is not None:
+            return ChatResult(generations=[ChatGeneration(message=winner.result())])
+        if fallback is not None:
+            return ChatResult(generations=[ChatGeneration(message=fallback)])
+        raise error
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        primary, hedge = self._attempts()
+        start = time.monotonic()
+        delay = self.policy.delay()
+        first = asyncio.create_task(primary.ainvoke(messages, stop=stop, **kwargs))
+        first.add_done_callback(
+            lambda t: None if t.cancelled() else self.policy.observe(time.monotonic() - start)
+        )
+        pending = {first}
+        second: Optional[asyncio.Task] = None
+        fallback: Optional[BaseMessage] = None
+        error: Optional[BaseException] = None
+        winner: Optional[asyncio.Task] = None
+        try:
+            while pending and winner is None:
+                timeout = None
+                if second is None and delay is not None:
+                    timeout = max(delay - (time.monotonic() - start), 0.0)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif _acceptable(task.result()):
+                        winner = task
+                        break
+                    else:
+                        fallback = task.result()
+                if winner is None and second is None and (not done or not pending):
+                    second = asyncio.create_task(hedge.ainvoke(messages, stop=stop, **kwargs))
+                    pending.add(second)
+        finally:
+            for task in pending:
+                if task is first:
+                    # Keep the cancelled primary's tail in the latency window
+                    self.policy.observe(time.monotonic() - start)
+                task.cancel()
+                self.policy.record_discarded()
+        self.policy.record(second is not None, winner is not None and winner is second)
+        if winner is not None:
+            return ChatResult(generations=[ChatGeneration(message=winner.result())])
+        if fallback is not None:
+            return ChatResult(generations=[ChatGeneration(message=fallback)])
+        raise error
+
+def hedged_client(primary: BaseChatModel, config: HedgeConfig, secondary: Optional[BaseChatModel] = None) -> HedgedChatModel:
+    """Wrap a chat client in a hedging policy of its own."""
+    return HedgedChatModel(primary=primary, secondary=secondary, policy=HedgePolicy(config))
+
+class FakeLatencyChatModel(BaseChatModel):
+    """
+    Local fake provider with an injected latency distribution.
+
+    Latencies are log-normal around median_s; with probability tail_p a
+    call is slowed down by tail_factor, modelling a provider's slow tail.
+    """
+    response: str = "module fake(); endmodule"
+    median_s: float = 0.05
+    sigma: float = 0.3
+    tail_p: float = 0.05
+    tail_factor: float = 20.0
+    seed: Optional[int] = None
+    _rng: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def latency(self) -> float:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        seconds = self._rng.lognormvariate(0.0, self.sigma) * self.median_s
+        if self._rng.random() < self.tail_p:
+            seconds *= self.tail_factor
+        return seconds
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        tokens = sum(len(str(m.content)) for m in messages) // 4
+        message = AIMessage(
+            content=self.response,
+            usage_metadata={"input_tokens": tokens, "output_tokens": 10, "total_tokens": tokens + 10}
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency())
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency())
+        return self._result(messages)
+
+def latency_report(latencies: List[float]) -> str:
+    """p50/p95/p99/max of call latencies."""
+    ordered = sorted(latencies)
+    quantile = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return (
+        f"p50 {quantile(0.5) * 1000:.0f}ms  p95 {quantile(0.95) * 1000:.0f}ms  "
+        f"p99 {quantile(0.99) * 1000:.0f}ms  max {ordered[-1] * 1000:.0f}ms  "
+        f"mean {statistics.fmean(ordered) * 1000:.0f}ms"
+    )
+
+def _timed_calls(client: BaseChatModel, calls: int, concurrency: int) -> List[float]:
+    def call(_: int) -> float:
+        start = time.monotonic()
+        client.invoke("ping")
+        return time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, range(calls)))
+
+def main() -> None:
+    """Command-line entry point for the fake-provider comparison."""
+    parser = argparse.ArgumentParser(description="Hedged request tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    demo = commands.add_parser("demo", help="Compare tail latency with and without hedging on a fake provider")
+    demo.add_argument("--calls", type=int, default=400)
+    demo.add_argument("--concurrency", type=int, default=8)
+    demo.add_argument("--percentile", type=float, default=HedgeConfig.percentile)
+    demo.add_argument("--median-ms", type=float, default=50.0)
+    demo.add_argument("--tail-p", type=float, default=0.05, help="Probability of a slow call")
+    demo.add_argument("--tail-factor", type=float, default=20.0, help="Slowdown of a slow call")
+    demo.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def fake(seed: int) -> FakeLatencyChatModel:
+        return FakeLatencyChatModel(
+            median_s=args.median_ms / 1000, tail_p=args.tail_p, tail_factor=args.tail_factor, seed=seed
+        )
+
+    config = HedgeConfig(percentile=args.percentile, min_delay_s=0.0)
+    baseline = _timed_calls(fake(args.seed), args.calls, args.concurrency)
+    client = hedged_client(fake(args.seed), config, secondary=fake(args.seed + 1))
+    hedged = _timed_calls(client, args.calls, args.concurrency)
+    print(f"unhedged: {latency_report(baseline)}")
+    print(f"hedged:   {latency_report(hedged)}")
+    print(f"hedging:  {client.policy.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Benchmark manifest for the RTLLM design tree.
+
+This module builds and caches an index of every RTLLM design directory
+(any directory containing design_description.txt). Each entry records:
+1. Path, category and tags of the design
+2. Top module name and the port list parsed from the testbench
+3. Content hashes of the testbench, description and data files
+4. The calibrated reference run of the verified design (see calibration.py)
+
+The manifest is stored as JSON next to the RTLLM tree and is rebuilt
+incrementally: only directories whose files changed (size or mtime) are
+re-hashed and re-parsed.
+"""
+
+from dataclasses import dataclass, field, asdict
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+import re
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+DESCRIPTION_FILE = "design_description.txt"
+TESTBENCH_FILE = "testbench.v"
+FAIL_PATTERNS_FILE = "fail_patterns.txt"  # optional failure patterns for fail-fast simulation
+
+# Files written by generation runs; never part of a design's inputs
+GENERATED_FILES = {"design.v", "netlist.vvp", "output.txt", "makefile", "trace.v", "trace.vvp", "trace.vcd"}
+DATA_SUFFIXES = {".dat", ".txt", ".hex", ".mem"}
+
+MODULE_NAME_RE = re.compile(r"Module name:\s*(\w+)")
+TB_MODULE_RE = re.compile(r"^\s*module\s+(\w+)", re.MULTILINE)
+DATA_REF_RE = re.compile(r'(?:\$readmem[hb]|\$fopen|`define\s+\w+)\s*\(?\s*"([^"]+)"')
+DECL_RE = re.compile(
+    r"^\s*(reg|wire)\b\s*(?:signed\s+)?(\[[^\]]+\])?\s*([^;]+);",
+    re.MULTILINE
+)
+NAMED_PORT_RE = re.compile(r"\.(\w+)\s*\(\s*([^()]*?)\s*\)")
+
+@dataclass
+class DesignEntry:
+    """A single RTLLM design in the manifest."""
+    path: str
+    name: str
+    category: str
+    subcategory: str
+    top_module: str
+    testbench_top: str
+    instance: str
+    ports: List[Dict[str, str]]
+    data_files: List[str]
+    verified_file: str
+    hashes: Dict[str, str]
+    tags: List[str]
+    stats: Dict[str, List[int]] = field(default_factory=dict)
+    reference: Dict[str, object] = field(default_factory=dict)
+
+    def directory(self, rtllm_dir: Path) -> Path:
+        """Absolute directory of the design under the given RTLLM root."""
+        return rtllm_dir / self.path
+
+def _strip_comments(source: str) -> str:
+    """Remove Verilog line and block comments."""
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.DOTALL)
+    return re.sub(r"//[^\n]*", "", source)
+
+def _file_hash(path: Path) -> str:
+    """SHA-256 of a file's contents."""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def _parse_declarations(testbench: str) -> Dict[str, Dict[str, str]]:
+    """
+    Parse reg/wire declarations of a testbench.
+
+    Returns:
+        Mapping of signal name to {"kind", "width"}
+    """
+    signals = {}
+    for kind, width, names in DECL_RE.findall(testbench):
+        for name in names.split(","):
+            name = name.split("=")[0].strip()
+            name = re.sub(r"\[.*", "", name).strip()
+            if re.fullmatch(r"\w+", name):
+                signals[name] = {"kind": kind, "width": (width or "").strip("[]")}
+    return signals
+
+def parse_testbench(testbench: str, top_module: str) -> Dict[str, object]:
+    """
+    Extract the testbench top, DUT instance and port list from a testbench.
+
+    Ports connected to a testbench `reg` are inputs of the DUT and ports
+    connected to a `wire` are outputs. Positionally connected instances
+    report the testbench signal names.
+
+    Args:
+        testbench: Testbench source
+        top_module: Name of the module under test
+
+    Returns:
+        Dictionary with testbench_top, instance and ports
+    """
+    source = _strip_comments(testbench)
+    tb_match = TB_MODULE_RE.search(source)
+    testbench_top = tb_match.group(1) if tb_match else ""
+
+    instance_re = re.compile(
+        rf"\b{re.escape(top_module)}\s*(?:#\s*\((?:[^()]|\([^()]*\))*\))?\s*(\w+)\s*\((.*?)\)\s*;",
+        re.DOTALL
+    )
+    match = instance_re.search(source)
+    if not match:
+        return {"testbench_top": testbench_top, "instance": "", "ports": []}
+
+    instance, connections = match.group(1), match.group(2)
+    signals = _parse_declarations(source)
+
+    named = NAMED_PORT_RE.findall(connections)
+    if named:
+        pairs = named
+    else:
+        pairs = [(c.strip(), c.strip()) for c in connections.split(",") if c.strip()]
+
+    ports = []
+    for port, expr in pairs:
+        base = re.match(r"\w+", expr)
+        signal = signals.get(base.group(0), {}) if base else {}
+        direction = {"reg": "input", "wire": "output"}.get(signal.get("kind", ""), "unknown")
+        ports.append({
+            "name": port,
+            "direction": direction,
+            "width": signal.get("width", "")
+        })
+
+    return {"testbench_top": testbench_top, "instance": instance, "ports": ports}
+
+def _input_files(design_dir: Path, testbench: str) -> Dict[str, List[str]]:
+    """Classify the input files of a design directory."""
+    referenced = set(DATA_REF_RE.findall(_strip_comments(testbench)))
+    data_files, verified = [], []
+    for entry in os.scandir(design_dir):
+        if not entry.is_file():
+            continue
+        name = entry.name
+        if name.startswith("verified_") and name.endswith(".v"):
+            verified.append(name)
+        elif name in referenced or (
+            Path(name).suffix in DATA_SUFFIXES
+            and name not in (DESCRIPTION_FILE, FAIL_PATTERNS_FILE)
+            and name not in GENERATED_FILES
+        ):
+            data_files.append(name)
+    return {"data_files": sorted(data_files), "verified": sorted(verified)}
+
+def _stat_signature(design_dir: Path) -> Dict[str, List[int]]:
+    """Size and mtime of every non-generated file in a design directory."""
+    signature = {}
+    for entry in os.scandir(design_dir):
+        if entry.is_file() and entry.name not in GENERATED_FILES:
+            st = entry.stat()
+            signature[entry.name] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+def _derive_tags(entry: DesignEntry, parameterized: bool) -> List[str]:
+    """Derive filter tags from a design's location and interface."""
+    tags = {entry.category.lower(), entry.subcategory.lower(), entry.name.lower()}
+    clocked = any(
+        re.search(r"clk|clock", p["name"], re.IGNORECASE) for p in entry.ports
+    )
+    tags.add("sequential" if clocked else "combinational")
+    if entry.data_files:
+        tags.add("data")
+    if parameterized:
+        tags.add("parameterized")
+    if "pipe" in entry.name.lower():
+        tags.add("pipelined")
+    return sorted(t.replace(" ", "_") for t in tags if t)
+
+def scan_design(rtllm_dir: Path, design_dir: Path, stats: Dict[str, List[int]]) -> DesignEntry:
+    """
+    Parse and hash a single design directory.
+
+    Args:
+        rtllm_dir: Root RTLLM directory
+        design_dir: Design directory containing design_description.txt
+        stats: Stat signature of the directory
+
+    Returns:
+        Manifest entry for the design
+    """
+    rel = design_dir.relative_to(rtllm_dir)
+    parts = rel.parts
+    description = (design_dir / DESCRIPTION_FILE).read_text(errors="replace")
+    testbench_file = design_dir / TESTBENCH_FILE
+    testbench = testbench_file.read_text(errors="replace") if testbench_file.exists() else ""
+
+    # The testbench is authoritative when the description names another module
+    name_match = MODULE_NAME_RE.search(description)
+    top_module = name_match.group(1) if name_match else design_dir.name
+    parsed = parse_testbench(testbench, top_module)
+    if not parsed["instance"] and top_module != design_dir.name:
+        fallback = parse_testbench(testbench, design_dir.name)
+        if fallback["instance"]:
+            top_module, parsed = design_dir.name, fallback
+
+    files = _input_files(design_dir, testbench)
+
+    hashes = {DESCRIPTION_FILE: _file_hash(design_dir / DESCRIPTION_FILE)}
+    if testbench_file.exists():
+        hashes[TESTBENCH_FILE] = _file_hash(testbench_file)
+    for name in files["data_files"] + files["verified"]:
+        hashes[name] = _file_hash(design_dir / name)
+
+    entry = DesignEntry(
+        path=rel.as_posix(),
+        name=design_dir.name,
+        category=parts[0] if len(parts) > 1 else "",
+        subcategory=parts[1] if len(parts) > 2 else "",
+        top_module=top_module,
+        testbench_top=parsed["testbench_top"],
+        instance=parsed["instance"],
+        ports=parsed["ports"],
+        data_files=files["data_files"],
+        verified_file=files["verified"][0] if files["verified"] else "",
+        hashes=hashes,
+        tags=[],
+        stats=stats
+    )
+    parameterized = bool(re.search(
+        rf"\b{re.escape(top_module)}\s*#", _strip_comments(testbench)
+    ))
+    entry.tags = _derive_tags(entry, parameterized)
+    return entry
+
+def _find_design_dirs(root: Path) -> List[Path]:
+    """Find design directories (those with design_description.txt) below root."""
+    found = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        if (current / DESCRIPTION_FILE).exists():
+            found.append(current)
+            continue
+        for entry in os.scandir(current):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                stack.append(Path(entry.path))
+    return sorted(found)
+
+def load_manifest(
+    rtllm_dir: Path,
+    manifest_file: Optional[Path] = None,
+    rebuild: bool = False
+) -> List[DesignEntry]:
+    """
+    Load the design manifest, refreshing entries whose files changed.
+
+    Args:
+        rtllm_dir: Root RTLLM directory
+        manifest_file: Manifest location (defaults to RTLLM/manifest.json)
+        rebuild: Ignore cached entries and re-parse every design
+
+    Returns:
+        List of manifest entries sorted by path
+    """
+    rtllm_dir = Path(rtllm_dir)
+    manifest_file = Path(manifest_file or rtllm_dir / MANIFEST_FILE)
+
+    cached: Dict[str, DesignEntry] = {}
+    if manifest_file.exists() and not rebuild:
+        try:
+            data = json.loads(manifest_file.read_text())
+            if data.get("version") == MANIFEST_VERSION:
+                cached = {d["path"]: DesignEntry(**d) for d in data["designs"]}
+        except (json.JSONDecodeError, KeyError, TypeError):
+            cached = {}
+
+    entries = []
+    changed = False
+    for design_dir in _find_design_dirs(rtllm_dir):
+        rel = design_dir.relative_to(rtllm_dir).as_posix()
+        stats = _stat_signature(design_dir)
+        entry = cached.pop(rel, None)
+        if entry is None or entry.stats != stats:
+            previous = entry
+            entry = scan_design(rtllm_dir, design_dir, stats)
+            # A calibration stays valid while the inputs are unchanged
+            if previous is not None and previous.hashes == entry.hashes:
+                entry.reference = previous.reference
+            changed = True
+        entries.append(entry)
+
+    # Anything left in the cache was removed from the tree
+    if changed or cached or not manifest_file.exists():
+        save_manifest(entries, manifest_file)
+
+    return entries
+
+def save_manifest(entries: Iterable[DesignEntry], manifest_file: Path) -> None:
+    """Write manifest entries to disk."""
+    data = {
+        "version": MANIFEST_VERSION,
+        "designs": [asdict(e) for e in sorted(entries, key=lambda e: e.path)]
+    }
+    tmp_file = manifest_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(data, indent=1))
+    tmp_file.replace(manifest_file)
+
+def filter_designs(
+    entries: Iterable[DesignEntry],
+    prefix: Optional[str] = None,
+    globs: Optional[List[str]] = None,
+    tags: Optional[List[str]] = None,
+    regex: Optional[str] = None
+) -> List[DesignEntry]:
+    """
+    Select manifest entries.
+
+    Args:
+        entries: Manifest entries
+        prefix: Path prefix relative to RTLLM (e.g. 'Arithmetic/Adder')
+        globs: Glob patterns matched against the design path or name (any)
+        tags: Tags that must all be present
+        regex: Regular expression searched in the design path
+
+    Returns:
+        Matching entries in manifest order
+    """
+    prefix = prefix.strip("/").replace("\\", "/") if prefix else None
+    pattern = re.compile(regex) if regex else None
+    wanted_tags = {t.lower() for t in tags or []}
+
+    selected = []
+    for entry in entries:
+        if prefix and not (entry.path == prefix or entry.path.startswith(prefix + "/")):
+            continue
+        if globs and not any(
+            fnmatch(entry.path, g) or fnmatch(entry.name, g) for g in globs
+        ):
+            continue
+        if wanted_tags and not wanted_tags.issubset(entry.tags):
+            continue
+        if pattern and not pattern.search(entry.path):
+            continue
+        selected.append(entry)
+    return selected
+
+if __name__ == "__main__":
+    rtllm_root = Path(__file__).parent.parent / "RTLLM"
+    designs = load_manifest(rtllm_root, rebuild=True)
+    print(f"Indexed {len(designs)} designs into {rtllm_root / MANIFEST_FILE}")
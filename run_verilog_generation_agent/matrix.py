@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Multi-model matrix runs.
+
+This module runs several (provider, temperature) combinations against the
+same design set in one process. All samples of all combinations share a
+worker pool and are scheduled longest-first (see scheduler.py), so calls
+to different providers proceed in parallel under their own rate limits,
+while the RAG lookups, the manifest and the simulation cache are shared.
+Generated designs are written below runs/<run id>/ so combinations never
+overwrite each other's files, and every iteration is recorded in the
+artifact store under the same run id.
+
+Resource budgets (see budget.py) apply per sample and per run: once the
+run budget is exhausted, the remaining samples are recorded as skipped.
+"""
+
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import time
+
+from .artifacts import ArtifactStore, SampleArtifacts, new_run_id
+from .budget import Budget, BudgetLimits
+from .hedging import HedgeConfig
+from .manifest import DesignEntry
+from .results import ResultStore, SampleResult
+from .scheduler import DurationModel, ScheduledTask, run_scheduled
+from .setup_verilog_generation_agent import RetrievalConfig, setup_agent
+from .simulation import SimulationConfig
+
+RUNS_DIR = Path(__file__).parent.parent / "runs"
+PROVIDERS = ("openai", "anthropic", "gemini")
+
+@dataclass(frozen=True)
+class MatrixRun:
+    """One (provider, temperature) combination of a matrix run."""
+    provider: str
+    temperature: float
+
+    @property
+    def label(self) -> str:
+        return f"{self.provider}@{self.temperature:g}"
+
+def parse_matrix(spec: str, default_temperature: float) -> List[MatrixRun]:
+    """
+    Parse a matrix specification such as 'openai:0.2,openai:0.7,anthropic'.
+
+    Args:
+        spec: Comma-separated provider[:temperature] entries
+        default_temperature: Temperature for entries without one
+
+    Returns:
+        List of matrix runs in specification order
+
+    Raises:
+        ValueError: If a provider or temperature is invalid
+    """
+    runs = []
+    for item in spec.split(","):
+        provider, _, temperature = item.strip().partition(":")
+        if provider not in PROVIDERS:
+            raise ValueError(f"Invalid model provider in matrix: {provider}")
+        run = MatrixRun(provider, float(temperature) if temperature else default_temperature)
+        if run not in runs:
+            runs.append(run)
+    return runs
+
+def sample_dir(run_id: str, label: str, design: DesignEntry, sample: int) -> Path:
+    """Working directory of one sample of a run."""
+    return RUNS_DIR / run_id / label / design.path / f"sample_{sample}"
+
+def run_matrix(
+    runs: List[MatrixRun],
+    designs: List[DesignEntry],
+    rtllm_dir: Path,
+    process: Callable[..., Tuple[bool, str, int]],
+    method: str,
+    store: ResultStore,
+    logger: Any,
+    samples: int = 1,
+    max_loops: int = 3,
+    retrieval: Optional[RetrievalConfig] = None,
+    sim_config: Optional[SimulationConfig] = None,
+    artifact_store: Optional[ArtifactStore] = None,
+    workers: Optional[int] = None,
+    duration_model: Optional[DurationModel] = None,
+    shard: str = "",
+    interactive: bool = False,
+    budget: BudgetLimits = BudgetLimits(),
+    run_budget: BudgetLimits = BudgetLimits(),
+    hedging: Optional[HedgeConfig] = None
+) -> Dict[MatrixRun, List[SampleResult]]:
+    """
+    Run every matrix combination over the design set concurrently.
+
+    All (combination, design, sample) triples share one worker pool and are
+    scheduled longest-first by the duration model.
+
+    Args:
+        runs: Provider/temperature combinations
+        designs: Designs to evaluate
+        rtllm_dir: Root RTLLM directory
+        process: Callable (test_dir, model_config, agent_config, output_dir,
+            sim_config, artifacts) -> (passed, output, iterations)
+        method: Generation method name for result records
+        store: Result store shared by all combinations
+        logger: Logger instance
+        samples: Samples per design
+        max_loops: Maximum iterations for agentic flow
+        retrieval: RAG reference selection settings
+        sim_config: Simulation settings shared by all combinations
+        artifact_store: Store recording every iteration (default: artifacts/)
+        workers: Worker threads (default: one per combination)
+        duration_model: Sample duration estimates (default: no history)
+        shard: Shard label for result records
+        interactive: Ask before each reflection (only sensible with one worker)
+        budget: Resource limits per sample
+        run_budget: Resource limits of the whole run
+        hedging: Hedging policy for slow LLM calls
+
+    Returns:
+        Results per matrix run
+    """
+    run_id = new_run_id()
+    sim_config = sim_config or SimulationConfig()
+    artifact_store = artifact_store or ArtifactStore()
+    duration_model = duration_model or DurationModel()
+    total_budget = Budget(run_budget, "run")
+    budgeted = bool(budget or run_budget)
+    print(f"Run {run_id}: designs in {RUNS_DIR / run_id}, artifacts in {artifact_store.root}")
+
+    configs = {}
+    for run in runs:
+        model_config, agent_config = setup_agent(
+            working_dir=rtllm_dir,
+            model_provider=run.provider,
+            temperature=run.temperature,
+            max_loops=max_loops,
+            logger=logger,
+            retrieval=retrieval,
+            hedging=hedging
+        )
+        agent_config.interactive = interactive
+        configs[run] = (model_config, agent_config)
+
+    def execute(task: ScheduledTask) -> SampleResult:
+        run, design, sample = task.payload, task.design, task.sample
+        model_config, agent_config = configs[run]
+        print(f"\n[{run.label}] Processing test case: {design.name} (sample {sample})")
+        artifacts = SampleArtifacts(
+            artifact_store, run_id, design.path, sample, method, run.label
+        )
+        skipped = total_budget.exhausted()
+        if skipped:
+            # Zero duration keeps skipped samples out of the duration model
+            logger.warning(f"[{run.label}] Skipping {design.path} (sample {sample}): {skipped}")
+            result = SampleResult(
+                design=design.path, category=design.category, method=method,
+                model=run.provider, temperature=run.temperature, sample=sample,
+                passed=False, output=f"Skipped: {skipped}", iterations=0,
+                shard=shard, run_id=run_id, aborted=skipped
+            )
+            store.append(result)
+            return result
+        # Unlimited budgets still account the sample's tokens and stage times
+        sample_budget = total_budget.child(budget)
+        start = time.perf_counter()
+        try:
+            # Each task gets its own agent config; process fills in the design
+            passed, output, iterations = process(
+                design.directory(rtllm_dir), model_config, replace(agent_config, budget=sample_budget),
+                sample_dir(run_id, run.label, design, sample), sim_config, artifacts
+            )
+        except Exception as e:
+            logger.error(f"[{run.label}] Error processing {design.path}: {str(e)}")
+            passed, output, iterations = False, f"Error during generation: {str(e)}", 0
+        result = SampleResult(
+            design=design.path,
+            category=design.category,
+            method=method,
+            model=run.provider,
+            temperature=run.temperature,
+            sample=sample,
+            passed=passed,
+            output=output,
+            iterations=iterations,
+            duration_s=time.perf_counter() - start,
+            shard=shard,
+            run_id=run_id,
+            aborted=sample_budget.aborted,
+            tokens=sample_budget.tokens,
+            stage_s={"llm": round(sample_budget.llm_s, 3), "simulate": round(sample_budget.sim_s, 3)}
+        )
+        store.append(result)
+        return result
+
+    tasks = [
+        ScheduledTask(design, sample, method, run.provider, payload=run)
+        for run in runs for design in designs for sample in range(samples)
+    ]
+    start = time.perf_counter()
+    completed = run_scheduled(tasks, execute, duration_model, workers or len(runs), logger)
+    total = time.perf_counter() - start
+
+    results: Dict[MatrixRun, List[SampleResult]] = {run: [] for run in runs}
+    for result in sorted(completed, key=lambda r: (r.design, r.sample)):
+        results[MatrixRun(result.model, result.temperature)].append(result)
+    busy = {run: sum(r.duration_s for r in results[run]) for run in runs}
+
+    print("\n" + "\n".join(format_comparison(results, designs, busy, total)))
+    print(
+        f"Simulation cache: {sim_config.cache.hits} hits, "
+        f"{sim_config.cache.misses} misses"
+    )
+    if budgeted:
+        aborted = [r for r in completed if r.aborted]
+        print(f"Budget: {total_budget.summary()}; {len(aborted)} samples stopped early or skipped")
+        logger.info(f"Budget: {total_budget.summary()}; {len(aborted)} samples stopped early or skipped")
+        # Group by reason without the amounts, e.g. 'design token budget exhausted'
+        reasons = [r.aborted.split(" (")[0] for r in aborted]
+        for reason in sorted(set(reasons)):
+            print(f"  {reasons.count(reason)} x {reason}")
+    return results
+
+def format_comparison(
+    results: Dict[MatrixRun, List[SampleResult]],
+    designs: List[DesignEntry],
+    elapsed: Dict[MatrixRun, float],
+    total: float
+) -> List[str]:
+    """
+    Format a design-by-combination pass table.
+
+    Returns:
+        Report lines
+    """
+    runs = list(results)
+    width = max([len(r.label) for r in runs] + [8]) + 2
+    name_width = max([len(d.path) for d in designs] + [6]) + 2
+
+    lines = ["Matrix comparison (passed/samples):"]
+    lines.append(f"{'design':<{name_width}}" + "".join(f"{r.label:>{width}}" for r in runs))
+    for design in designs:
+        row = f"{design.path:<{name_width}}"
+        for run in runs:
+            samples = [r for r in results[run] if r.design == design.path]
+            row += f"{f'{sum(r.passed for r in samples)}/{len(samples)}':>{width}}"
+        lines.append(row)
+
+    rates = ""
+    times = ""
+    for run in runs:
+        samples = results[run]
+        rate = sum(r.passed for r in samples) / len(samples) if samples else 0.0
+        rates += f"{rate:>{width}.1%}"
+        times += f"{f'{elapsed.get(run, 0.0):.0f}s':>{width}}"
+    lines.append(f"{'pass rate':<{name_width}}" + rates)
+    lines.append(f"{'busy time':<{name_width}}" + times)
+    lines.append(f"Total wall time: {total:.0f}s")
+    return lines
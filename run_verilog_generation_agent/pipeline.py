@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Staged pipeline for basic and RAG sweeps.
+
+Instead of running retrieval, generation and simulation strictly in
+sequence per sample, every stage has its own worker threads:
+
+    retrieve -> generate -> lint -> simulate -> score
+
+Stages are joined by bounded queues. A full queue blocks the stage in
+front of it (backpressure), so the network-bound LLM calls and the
+CPU-bound simulations overlap without piling up unbounded work. Queue
+occupancy is reported periodically and summarized per stage at the end.
+
+Budgets work as in matrix runs (see budget.py): once the run budget is
+exhausted the remaining samples are skipped, and a design is not
+simulated once its wall or simulation budget is exhausted.
+
+The agentic flow alternates generation and simulation within a sample
+and keeps using the scheduler (see scheduler.py).
+
+Usage:
+    # RAG sweep with 8 concurrent LLM calls and 4 simulations
+    poetry run python main.py -r --samples 5 --pipeline --stage-workers generate=8,simulate=4
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import os
+import queue
+import re
+import threading
+import time
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from .artifacts import ArtifactStore, SampleArtifacts, new_run_id
+from .basic_verilog_generation import extract_module_content
+from .budget import Budget, BudgetLimits, message_tokens
+from .hedging import HedgeConfig
+from .manifest import DesignEntry
+from .matrix import RUNS_DIR, MatrixRun, sample_dir
+from .rag_verilog_generation import build_rag_prompt, prefetch_similar_designs
+from .results import ResultStore, SampleResult, is_passing_output
+from .scheduler import DurationModel, ScheduledTask, TaskQueue
+from .setup_verilog_generation_agent import RetrievalConfig, create_model_config
+from .simulation import SimulationConfig, run_verilog_tests, stage_design
+
+STAGES = ("retrieve", "generate", "lint", "simulate", "score")
+MODULE_NAME_RE = re.compile(r"Module name:\s*(\w+)")
+_DONE = object()  # end-of-stream marker passed between stages
+
+@dataclass
+class PipelineConfig:
+    """Concurrency and queue settings of the pipeline."""
+    retrieve_workers: int = 2
+    generate_workers: int = 8  # concurrent LLM calls
+    lint_workers: int = 1
+    simulate_workers: int = os.cpu_count() or 4
+    score_workers: int = 1  # result and artifact writes
+    queue_size: int = 16  # items buffered in front of each stage
+    report_interval: float = 10.0  # seconds between queue occupancy reports
+
+    def workers(self, stage: str) -> int:
+        return max(1, getattr(self, f"{stage}_workers"))
+
+def parse_stage_workers(spec: str, config: PipelineConfig) -> PipelineConfig:
+    """
+    Apply a specification such as 'generate=8,simulate=4' to a config.
+
+    Raises:
+        ValueError: If a stage or worker count is invalid
+    """
+    for item in spec.split(","):
+        stage, _, count = item.strip().partition("=")
+        if stage not in STAGES or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid stage worker setting: {item} (stages: {', '.join(STAGES)})")
+        setattr(config, f"{stage}_workers", int(count))
+    return config
+
+@dataclass
+class PipelineItem:
+    """One sample travelling through the pipeline."""
+    run: MatrixRun
+    design: DesignEntry
+    sample: int
+    prompt: str = ""
+    response: str = ""
+    verilog_code: str = ""
+    output_dir: Optional[Path] = None
+    test_passed: bool = False
+    output: str = ""
+    error: str = ""
+    tokens: int = 0
+    budget: Optional[Budget] = None  # created when the sample enters the pipeline
+    skipped: bool = False  # the run budget was exhausted before the sample started
+    stage_s: Dict[str, float] = field(default_factory=dict)
+
+@dataclass
+class StageStats:
+    """Throughput and queue occupancy of one stage."""
+    processed: int = 0
+    busy_s: float = 0.0
+    max_queued: int = 0
+
+def expected_module_name(description: str) -> str:
+    """Top module name required by a design description."""
+    match = MODULE_NAME_RE.search(description)
+    return match.group(1) if match else ""
+
+class Pipeline:
+    """
+    Bounded-queue pipeline of stage worker threads.
+
+    An item whose error is set skips every later stage except the last,
+    which records the outcome.
+    """
+
+    def __init__(
+        self,
+        stages: Dict[str, Callable[[PipelineItem], None]],
+        config: PipelineConfig,
+        logger: Any
+    ):
+        """
+        Args:
+            stages: Work function per stage name, in pipeline order
+            config: Concurrency and queue settings
+            logger: Logger instance
+        """
+        self.stages = stages
+        self.names = list(stages)
+        self.config = config
+        self.logger = logger
+        self.queues = {name: queue.Queue(maxsize=config.queue_size) for name in self.names}
+        self.stats = {name: StageStats() for name in self.names}
+        self._remaining = {name: config.workers(name) for name in self.names}
+        self._lock = threading.Lock()
+
+    def _worker(self, index: int) -> None:
+        name = self.names[index]
+        inbox = self.queues[name]
+        outbox = self.queues[self.names[index + 1]] if index + 1 < len(self.names) else None
+        while (item := inbox.get()) is not _DONE:
+            start = time.perf_counter()
+            # Failed items skip the remaining work but still reach the last stage
+            if not item.error or outbox is None:
+                try:
+                    self.stages[name](item)
+                except Exception as e:
+                    item.error = f"Error during {name}: {str(e)}"
+                    self.logger.error(f"{item.design.path} (sample {item.sample}): {item.error}")
+            elapsed = time.perf_counter() - start
+            item.stage_s[name] = elapsed
+            with self._lock:
+                self.stats[name].processed += 1
+                self.stats[name].busy_s += elapsed
+            if outbox is not None:
+                outbox.put(item)  # blocks while the next stage is saturated
+        # The last worker of a stage closes the next one
+        with self._lock:
+            self._remaining[name] -= 1
+            last = self._remaining[name] == 0
+        if last and outbox is not None:
+            for _ in range(self.config.workers(self.names[index + 1])):
+                outbox.put(_DONE)
+
+    def occupancy(self) -> str:
+        return " ".join(
+            f"{name} {self.queues[name].qsize()}/{self.config.queue_size}" for name in self.names
+        )
+
+    def _monitor(self, stop: threading.Event) -> None:
+        """Track peak queue occupancy and report it every report_interval seconds."""
+        next_report = time.monotonic() + self.config.report_interval
+        while not stop.wait(0.1):
+            for name in self.names:
+                stats = self.stats[name]
+                stats.max_queued = max(stats.max_queued, self.queues[name].qsize())
+            if time.monotonic() >= next_report:
+                next_report += self.config.report_interval
+                print(f"Pipeline queues: {self.occupancy()}")
+                self.logger.info(f"Pipeline queues: {self.occupancy()}")
+
+    def run(self, items: List[PipelineItem]) -> float:
+        """
+        Push items through every stage and wait for the last one.
+
+        Returns:
+            Wall time in seconds
+        """
+        start = time.perf_counter()
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f"{name}-{n}", daemon=True)
+            for i, name in enumerate(self.names) for n in range(self.config.workers(name))
+        ]
+        monitor = threading.Thread(target=self._monitor, args=(stop,), daemon=True)
+        for thread in threads + [monitor]:
+            thread.start()
+
+        first = self.queues[self.names[0]]
+        for item in items:
+            first.put(item)
+        for _ in range(self.config.workers(self.names[0])):
+            first.put(_DONE)
+        for thread in threads:
+            thread.join()
+        stop.set()
+        return time.perf_counter() - start
+
+    def report(self, wall_s: float) -> List[str]:
+        """Per-stage throughput, utilization and peak queue occupancy."""
+        lines = [f"{'stage':<10}{'workers':>8}{'items':>7}{'busy':>9}{'util':>7}{'max queued':>12}"]
+        for name in self.names:
+            stats, workers = self.stats[name], self.config.workers(name)
+            util = stats.busy_s / (workers * wall_s) if wall_s else 0.0
+            lines.append(
+                f"{name:<10}{workers:>8}{stats.processed:>7}{stats.busy_s:>8.1f}s"
+                f"{util:>7.0%}{f'{stats.max_queued}/{self.config.queue_size}':>12}"
+            )
+        return lines
+
+def run_pipeline(
+    runs: List[MatrixRun],
+    designs: List[DesignEntry],
+    rtllm_dir: Path,
+    method: str,
+    store: ResultStore,
+    logger: Any,
+    samples: int = 1,
+    retrieval: Optional[RetrievalConfig] = None,
+    sim_config: Optional[SimulationConfig] = None,
+    artifact_store: Optional[ArtifactStore] = None,
+    config: Optional[PipelineConfig] = None,
+    duration_model: Optional[DurationModel] = None,
+    shard: str = "",
+    hedging: Optional[HedgeConfig] = None,
+    budget: BudgetLimits = BudgetLimits(),
+    run_budget: BudgetLimits = BudgetLimits()
+) -> List[SampleResult]:
+    """
+    Run a basic or RAG sweep through the staged pipeline.
+
+    Samples enter the pipeline longest-first by the duration model, with
+    equal estimates spread over the providers (see TaskQueue).
+
+    Args:
+        runs: Provider/temperature combinations
+        designs: Designs to evaluate
+        rtllm_dir: Root RTLLM directory
+        method: 'basic' or 'rag'
+        store: Result store to append to
+        logger: Logger instance
+        samples: Samples per design
+        retrieval: RAG reference selection settings
+        sim_config: Simulation settings
+        artifact_store: Store recording every sample
+        config: Stage concurrency and queue settings
+        duration_model: Sample duration estimates for the input order
+        shard: Shard label for result records
+        hedging: Hedging policy for slow LLM calls
+        budget: Resource limits per sample
+        run_budget: Resource limits of the whole run
+
+    Returns:
+        Results in completion order
+    """
+    run_id = new_run_id()
+    sim_config = sim_config or SimulationConfig()
+    artifact_store = artifact_store or ArtifactStore()
+    config = config or PipelineConfig()
+    duration_model = duration_model or DurationModel()
+    total_budget = Budget(run_budget, "run")
+    model_configs = {
+        run: create_model_config(run.provider, run.temperature, retrieval=retrieval, hedging=hedging)
+        for run in runs
+    }
+    descriptions = {
+        d.path: (d.directory(rtllm_dir) / "design_description.txt").read_text() for d in designs
+    }
+    if method == "rag":
+        for model_config in model_configs.values():
+            prefetch_similar_designs(list(descriptions.values()), model_config, logger)
+    print(f"Run {run_id}: designs in {RUNS_DIR / run_id}, artifacts in {artifact_store.root}")
+    results: List[SampleResult] = []
+
+    def skip(item: PipelineItem) -> bool:
+        """Skip a sample that has not called the LLM yet once the run budget is exhausted."""
+        skipped = total_budget.exhausted()
+        if skipped:
+            item.budget.abort(skipped)
+            item.error, item.skipped = f"Skipped: {skipped}", True
+        return item.skipped
+
+    def retrieve(item: PipelineItem) -> None:
+        item.budget = total_budget.child(budget)
+        if skip(item):
+            return
+        description = descriptions[item.design.path]
+        item.prompt = (
+            build_rag_prompt(description, model_configs[item.run], logger)
+            if method == "rag" else description
+        )
+
+    def generate(item: PipelineItem) -> None:
+        # Retrieval runs ahead of generation, so the run budget is checked again
+        if skip(item):
+            return
+        model_config = model_configs[item.run]
+        messages = [
+            SystemMessage(content=model_config.system_prompt),
+            HumanMessage(content=item.prompt)
+        ]
+        start = time.perf_counter()
+        response = model_config.generation_client.invoke(messages)
+        item.response = response.content
+        item.tokens = message_tokens(messages, response)
+        item.budget.charge_tokens(item.tokens, time.perf_counter() - start)
+
+    def lint(item: PipelineItem) -> None:
+        item.verilog_code = extract_module_content(item.response)
+        if not item.verilog_code:
+            item.error = "No Verilog module found in LLM response"
+            return
+        name = expected_module_name(descriptions[item.design.path])
+        if name and not re.search(rf"\bmodule\s+{name}\b", item.verilog_code):
+            logger.warning(f"{item.design.path} (sample {item.sample}): module {name} not found in response")
+        item.output_dir = stage_design(
+            item.design.directory(rtllm_dir), sample_dir(run_id, item.run.label, item.design, item.sample)
+        )
+        (item.output_dir / "design.v").write_text(item.verilog_code)
+
+    def simulate(item: PipelineItem) -> None:
+        reason = item.budget.exhausted(tokens=False)
+        if reason:
+            item.budget.abort(reason)
+            item.error = f"Not simulated: {reason}"
+            return
+        item.test_passed, item.output = run_verilog_tests(item.output_dir, logger, sim_config, item.budget)
+
+    def score(item: PipelineItem) -> None:
+        passed = not item.error and item.test_passed and is_passing_output(item.output)
+        try:
+            if not item.skipped:
+                artifacts = SampleArtifacts(artifact_store, run_id, item.design.path, item.sample, method, item.run.label)
+                artifacts.record_iteration(
+                    1, passed, test_output=item.output, source_dir=item.output_dir,
+                    prompt=item.prompt, response=item.response, design=item.verilog_code
+                )
+        except Exception as e:
+            # The last stage has nobody to hand the error to, so the sample is recorded as failed here
+            passed = False
+            item.error = item.error or f"Error during score: {str(e)}"
+            logger.error(f"{item.design.path} (sample {item.sample}): Error during score: {str(e)}")
+        result = SampleResult(
+            design=item.design.path,
+            category=item.design.category,
+            method=method,
+            model=item.run.provider,
+            temperature=item.run.temperature,
+            sample=item.sample,
+            passed=passed,
+            output=item.error or item.output,
+            iterations=0 if item.skipped else 1,
+            # Work time, excluding queue waits; zero keeps skipped samples out of the duration model
+            duration_s=0.0 if item.skipped else sum(item.stage_s.values()),
+            shard=shard,
+            run_id=run_id,
+            aborted=item.budget.aborted if item.budget else "",
+            tokens=item.tokens,
+            stage_s={name: round(s, 3) for name, s in item.stage_s.items()}
+        )
+        results.append(result)
+        store.append(result)
+        print(f"[{item.run.label}] {item.design.path} (sample {item.sample}): {'PASS' if passed else 'FAIL'}")
+
+    pending = TaskQueue(
+        [
+            ScheduledTask(design, sample, method, run.provider, payload=PipelineItem(run, design, sample))
+            for run in runs for design in designs for sample in range(samples)
+        ],
+        duration_model
+    )
+    items = [task.payload for task in iter(pending.pop, None)]
+
+    pipeline = Pipeline(
+        {"retrieve": retrieve, "generate": generate, "lint": lint, "simulate": simulate, "score": score},
+        config, logger
+    )
+    wall_s = pipeline.run(items)
+    print("\n" + "\n".join(pipeline.report(wall_s)))
+    print(f"Total wall time: {wall_s:.0f}s")
+    logger.info("Pipeline stages:\n" + "\n".join(pipeline.report(wall_s)))
+    return results
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Incremental maintenance of the RAG database.
+
+The Chroma store built by setup_rag.py from MG-Verilog can grow with
+generated designs that passed their testbench, without re-embedding the
+existing corpus:
+1. add     - upsert the passing designs of recorded runs (see artifacts.py),
+             each with its design description as summary and provenance
+             metadata (source, design, run, method, model, sample)
+2. delete  - remove generated documents by id, design or run
+3. compact - copy the stored embeddings into a fresh collection, dropping
+             the space left by deleted documents (an interrupted compaction
+             is finished or rolled back the next time the store is opened)
+4. stats   - document counts by source
+
+Document ids are derived from the design path and the code digest, so
+re-adding a run is a no-op and only new code is embedded. A flat index
+exported next to the store (see flat_index.py) is refreshed after every
+change.
+
+Generated documents carry the key of the description they were generated
+from; a design's retrieval skips documents with its own key, so evaluation
+designs never see their own earlier solutions.
+
+Usage:
+    # Add the passing designs of every recorded run
+    poetry run python -m run_verilog_generation_agent.rag_index add
+
+    # Add one run, then remove a design's generated documents again
+    poetry run python -m run_verilog_generation_agent.rag_index add --run 2025-05-01_12-00-00
+    poetry run python -m run_verilog_generation_agent.rag_index delete --design Arithmetic/Adder/adder_8bit
+
+    # Reclaim the space of deleted documents
+    poetry run python -m run_verilog_generation_agent.rag_index compact
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import argparse
+import logging
+import os
+import re
+import shutil
+
+from .artifacts import ArtifactStore
+from .flat_index import EXPORT_BATCH_SIZE, FlatVectorIndex, default_index_dir, export_flat_index
+from .retrieval import DESCRIPTION_KEY, description_key
+
+GENERATED_SOURCE = "generated"
+COMPACT_SUFFIX = "_compact"  # name suffix of the collection a compaction copies into
+DEFAULT_PERSIST_DIR = Path(__file__).parent / "rag_dataset" / "chroma"
+MODULE_RE = re.compile(r"\bmodule\s+(\w+)")
+
+def recover_compaction(persist_directory: str, logger: Any = None) -> None:
+    """
+    Finish or roll back compactions interrupted by a crash.
+
+    A compaction copies collection X into X_compact, deletes X and renames
+    the copy to X. A leftover copy next to a non-empty X is incomplete and
+    is dropped. A non-empty copy whose X is missing or empty (X is created
+    empty when the store is opened) holds the corpus and is renamed to X.
+    Must run before the store is opened through langchain.
+    """
+    if not Path(persist_directory).exists():
+        return
+    import chromadb
+
+    client = chromadb.PersistentClient(path=str(persist_directory))
+    names = {getattr(c, "name", c) for c in client.list_collections()}
+    for copy_name in [n for n in names if n.endswith(COMPACT_SUFFIX)]:
+        name = copy_name[:-len(COMPACT_SUFFIX)]
+        copy = client.get_collection(copy_name)
+        if name in names and (client.get_collection(name).count() or not copy.count()):
+            client.delete_collection(copy_name)
+            message = f"Dropped the incomplete compaction copy {copy_name} in {persist_directory}"
+        else:
+            if name in names:
+                client.delete_collection(name)
+            copy.modify(name=name)
+            message = f"Finished an interrupted compaction of {name} in {persist_directory}"
+        print(message)
+        if logger:
+            logger.warning(message)
+
+def _collection(persist_directory: str) -> Any:
+    from langchain_community.vectorstores import Chroma
+
+    recover_compaction(persist_directory)
+    return Chroma(persist_directory=str(persist_directory))._collection
+
+def document_id(design: str, design_digest: str) -> str:
+    """Stable id of a generated design document."""
+    return f"{GENERATED_SOURCE}/{design}/{design_digest[:16]}"
+
+def design_document(description: str, code: str) -> str:
+    """Document text in the layout of the MG-Verilog entries."""
+    return f"""Summary: {description.strip()}
+
+Verilog Implementation:
+{code}"""
+
+def passing_designs(
+    artifact_store: ArtifactStore,
+    rtllm_dir: Path,
+    run_ids: Optional[Iterable[str]] = None
+) -> Dict[str, dict]:
+    """
+    Collect the passing designs of recorded runs as documents.
+
+    Identical code of one design is collected once (first run wins).
+
+    Args:
+        artifact_store: Store with the run records
+        rtllm_dir: Root RTLLM directory (for the design descriptions)
+        run_ids: Runs to collect (default: all runs)
+
+    Returns:
+        Documents by id, each with 'document' text and 'metadata'
+    """
+    documents: Dict[str, dict] = {}
+    descriptions: Dict[str, str] = {}
+    for run_id in run_ids if run_ids is not None else artifact_store.runs():
+        for record in artifact_store.records(run_id):
+            if not record["passed"] or "design" not in record["refs"]:
+                continue
+            digest = record["refs"]["design"]
+            doc_id = document_id(record["design"], digest)
+            if doc_id in documents:
+                continue
+            if record["design"] not in descriptions:
+                description_file = rtllm_dir / record["design"] / "design_description.txt"
+                if not description_file.exists():
+                    continue
+                descriptions[record["design"]] = description_file.read_text()
+            description = descriptions[record["design"]]
+            code = artifact_store.get_text(digest)
+            module = MODULE_RE.search(code)
+            documents[doc_id] = {
+                "document": design_document(description, code),
+                "metadata": {
+                    "source": GENERATED_SOURCE,
+                    "summary": description.strip(),
+                    "module_name": module.group(1) if module else "unknown",
+                    "category": record["design"].split("/")[0],
+                    "design": record["design"],
+                    DESCRIPTION_KEY: description_key(description),
+                    "run_id": run_id,
+                    "method": record.get("method", ""),
+                    "model": record.get("model", ""),
+                    "sample": record["sample"],
+                    "iteration": record["iteration"],
+                    "added": datetime.now().isoformat(timespec="seconds"),
+                },
+            }
+    return documents
+
+def refresh_flat_index(persist_directory: str, logger: Any) -> None:
+    """
+    Re-export an existing flat index after the store changed.
+
+    The export is written next to the index and swapped in file by file,
+    so processes that have the old index mapped keep a consistent copy.
+    """
+    index_dir = default_index_dir(persist_directory)
+    if not FlatVectorIndex.exists(index_dir):
+        return
+    staging = index_dir.with_name(index_dir.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    total = export_flat_index(persist_directory, staging)
+    for path in staging.iterdir():
+        os.replace(path, index_dir / path.name)
+    staging.rmdir()
+    logger.info(f"Refreshed flat RAG index at {index_dir} ({total} documents)")
+
+def _changed(persist_directory: str, logger: Any) -> None:
+    refresh_flat_index(persist_directory, logger)
+    # Drop indexes and lookups of this process that predate the change
+    from .rag_verilog_generation import reset_retrieval
+    reset_retrieval()
+
+def add_designs(
+    documents: Dict[str, dict],
+    persist_directory: str,
+    embeddings: Any,
+    logger: Any
+) -> int:
+    """
+    Upsert documents into the store, embedding only ids it does not hold yet.
+
+    Args:
+        documents: Documents by id (see passing_designs)
+        persist_directory: Chroma persist directory
+        embeddings: Embedding model used for the store
+        logger: Logger instance
+
+    Returns:
+        Number of added documents
+    """
+    collection = _collection(persist_directory)
+    ids = list(documents)
+    existing = set()
+    for start in range(0, len(ids), EXPORT_BATCH_SIZE):
+        existing.update(collection.get(ids=ids[start:start + EXPORT_BATCH_SIZE], include=[])["ids"])
+    new = [doc_id for doc_id in ids if doc_id not in existing]
+    for start in range(0, len(new), EXPORT_BATCH_SIZE):
+        batch = new[start:start + EXPORT_BATCH_SIZE]
+        texts = [documents[doc_id]["document"] for doc_id in batch]
+        collection.upsert(
+            ids=batch,
+            documents=texts,
+            metadatas=[documents[doc_id]["metadata"] for doc_id in batch],
+            embeddings=embeddings.embed_documents(texts)
+        )
+    print(f"Added {len(new)} generated designs to {persist_directory} ({len(existing)} already present)")
+    logger.info(f"Added {len(new)} generated designs to the RAG database ({len(existing)} already present)")
+    if new:
+        _changed(persist_directory, logger)
+    return len(new)
+
+def grow_from_runs(
+    run_ids: Iterable[str],
+    rtllm_dir: Path,
+    persist_directory: str,
+    embeddings: Any,
+    logger: Any,
+    artifact_store: Optional[ArtifactStore] = None
+) -> int:
+    """
+    Add the passing designs of some runs to the RAG database.
+
+    Returns:
+        Number of added documents
+    """
+    artifact_store = artifact_store or ArtifactStore()
+    documents = passing_designs(artifact_store, rtllm_dir, run_ids)
+    return add_designs(documents, persist_directory, embeddings, logger)
+
+def delete_designs(
+    persist_directory: str,
+    logger: Any,
+    ids: Optional[List[str]] = None,
+    design: str = "",
+    run_id: str = ""
+) -> int:
+    """
+    Delete generated documents by id, design path or run.
+
+    Without any selector every generated document is deleted; the
+    MG-Verilog corpus is never touched.
+
+    Returns:
+        Number of deleted documents
+    """
+    collection = _collection(persist_directory)
+    conditions: List[dict] = [{"source": GENERATED_SOURCE}]
+    if design:
+        conditions.append({"design": design})
+    if run_id:
+        conditions.append({"run_id": run_id})
+    where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    matching = collection.get(ids=ids, where=where, include=[])["ids"]
+    if matching:
+        collection.delete(ids=matching)
+        _changed(persist_directory, logger)
+    print(f"Deleted {len(matching)} generated designs from {persist_directory}")
+    logger.info(f"Deleted {len(matching)} generated designs from the RAG database")
+    return len(matching)
+
+def compact(persist_directory: str, logger: Any) -> int:
+    """
+    Rewrite the collection without the space held by deleted documents.
+
+    Stored embeddings are copied, not recomputed.
+
+    Returns:
+        Number of documents in the compacted collection
+    """
+    from langchain_community.vectorstores import Chroma
+
+    recover_compaction(persist_directory, logger)
+    vectorstore = Chroma(persist_directory=str(persist_directory))
+    client, old = vectorstore._client, vectorstore._collection
+    name, count = old.name, old.count()
+    copy = client.create_collection(f"{name}{COMPACT_SUFFIX}", metadata=old.metadata)
+    for start in range(0, count, EXPORT_BATCH_SIZE):
+        batch = old.get(
+            offset=start, limit=EXPORT_BATCH_SIZE,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        copy.add(
+            ids=batch["ids"], documents=batch["documents"],
+            metadatas=batch["metadatas"], embeddings=batch["embeddings"]
+        )
+    client.delete_collection(name)
+    copy.modify(name=name)
+    print(f"Compacted {persist_directory}: {count} documents")
+    logger.info(f"Compacted the RAG database ({count} documents)")
+    _changed(persist_directory, logger)
+    return count
+
+def source_counts(persist_directory: str) -> Dict[str, int]:
+    """Document count per source (MG-Verilog documents have none)."""
+    collection = _collection(persist_directory)
+    counts: Dict[str, int] = {}
+    for start in range(0, collection.count(), EXPORT_BATCH_SIZE):
+        batch = collection.get(offset=start, limit=EXPORT_BATCH_SIZE, include=["metadatas"])
+        for metadata in batch["metadatas"]:
+            source = (metadata or {}).get("source", "mg-verilog")
+            counts[source] = counts.get(source, 0) + 1
+    return counts
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Incremental RAG database maintenance")
+    parser.add_argument("--persist-dir", default=str(DEFAULT_PERSIST_DIR), help="Chroma persist directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Add the passing designs of recorded runs")
+    add.add_argument("--run", action="append", help="Run id (repeatable; default: all runs)")
+    add.add_argument("--artifacts", type=Path, help="Artifact store directory")
+    add.add_argument("--rtllm-dir", type=Path, default=Path(__file__).parent.parent / "RTLLM")
+    delete = commands.add_parser("delete", help="Delete generated designs")
+    delete.add_argument("--id", action="append", help="Document id (repeatable)")
+    delete.add_argument("--design", default="", help="Design path")
+    delete.add_argument("--run", default="", help="Run id")
+    delete.add_argument("--all", action="store_true", help="Delete every generated design")
+    commands.add_parser("compact", help="Reclaim the space of deleted documents")
+    commands.add_parser("stats", help="Show document counts by source")
+    args = parser.parse_args()
+
+    logger = logging.getLogger(__name__)
+    if args.command == "add":
+        from .setup_verilog_generation_agent import get_embeddings
+
+        store = ArtifactStore(args.artifacts) if args.artifacts else ArtifactStore()
+        grow_from_runs(args.run, args.rtllm_dir, args.persist_dir, get_embeddings(), logger, store)
+    elif args.command == "delete":
+        if not (args.id or args.design or args.run or args.all):
+            parser.error("delete needs --id, --design, --run or --all")
+        delete_designs(args.persist_dir, logger, args.id, args.design, args.run)
+    elif args.command == "compact":
+        compact(args.persist_dir, logger)
+    elif args.command == "stats":
+        for source, count in sorted(source_counts(args.persist_dir).items()):
+            print(f"{source}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,47 @@ This module uses RAG (Retrieval Augmented Generation) methods to find similar ex
 designs and uses them to improve the generation of new Verilog designs.
 """
 
+from concurrent.futures import Future
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_community.vectorstores import Chroma
 import os
-import asyncio
-from fastmcp import Client
-from mcp import types
+import threading
+import time
+
+import numpy as np
 
 from .setup_verilog_generation_agent import ModelConfig
 from .setup_rag import setup_rag_database
+from .results import is_passing_output
+from .simulation import SimulationConfig, run_verilog_tests, stage_design
+from .artifacts import SampleArtifacts
+from .budget import Budget, message_tokens
+from .flat_index import FlatVectorIndex, default_index_dir, export_flat_index
+from .rag_index import recover_compaction
+from .retrieval import (
+    DESCRIPTION_KEY, RetrievedDesign, assemble_context, description_key,
+    estimate_tokens, mmr_rerank, split_document
+)
+
+# Retrieval is shared by every run in the process (e.g. all providers of a
+# matrix run): one vector store per database and one lookup per prompt.
+# Searches run outside the locks, so runs retrieve in parallel; a lookup
+# already in flight is awaited instead of repeated.
+_vectorstores: Dict[str, Chroma] = {}
+_flat_indexes: Dict[str, FlatVectorIndex] = {}
+_retrieval_cache: Dict[tuple, Tuple[str, str]] = {}
+_retrieval_inflight: Dict[tuple, Future] = {}
+_retrieval_lock = threading.Lock()  # guards the lookup cache
+_store_lock = threading.RLock()  # opens (and if needed sets up) each store once
+
+def reset_retrieval() -> None:
+    """Forget opened stores, flat indexes and cached lookups after the RAG database changed."""
+    with _store_lock, _retrieval_lock:
+        _vectorstores.clear()
+        _flat_indexes.clear()
+        _retrieval_cache.clear()
 
 def extract_module_content(message: str) -> str:
     """Extract the Verilog module content from the LLM response."""
@@ -41,35 +71,17 @@ def extract_module_content(message: str) -> str:
     
     return "\n".join(lines[start_idx:end_idx+1])
 
-async def run_verilog_tests_mcp(working_dir: Path, logger) -> tuple[bool, str]:
-    """Test the generated Verilog design using MCP client."""
-    try:
-        async with Client("http://localhost:8000/sse") as client:
-            result = await client.call_tool(
-                "run_verilog_tests",
-                {"working_dir": str(working_dir)}
-            )
-            
-            # Convert TextContent to string for output
-            if isinstance(result[0], types.TextContent):
-                output = str(result[0])
-            else:
-                output = str(result[0])
-                
-            return True, output
-            
-    except Exception as e:
-        error_msg = f"Error running tests: {str(e)}"
-        logger.error(error_msg)
-        return False, error_msg
-
-def run_verilog_tests(working_dir: Path, logger) -> tuple[bool, str]:
-    """Compile and run Verilog tests using MCP client."""
-    return asyncio.run(run_verilog_tests_mcp(working_dir, logger))
-
 def get_similar_design(prompt: str, model_config: ModelConfig, logger) -> Tuple[str, str]:
     """
-    Find similar designs using RAG and return the most relevant one.
+    Find similar designs using RAG and return a bounded reference context.
+    
+    The nearest neighbours are filtered by a relevance threshold, reranked
+    with MMR for diversity, trimmed to their key logic and packed into the
+    configured token budget (see RetrievalConfig). Generated designs added
+    from the prompt's own description (see rag_index.py) are never returned.
+    Lookups are cached per prompt, database and retrieval settings, so
+    repeated samples and other providers reuse the first result; concurrent
+    lookups of the same prompt wait for the first one.
     
     Args:
         prompt: Design prompt to find similar designs for
@@ -77,11 +89,42 @@ def get_similar_design(prompt: str, model_config: ModelConfig, logger) -> Tuple[
         logger: Logger instance
         
     Returns:
-        Tuple of (similar design content, similarity score)
+        Tuple of (reference context or empty string, best similarity score)
     """
+    cache_key = (prompt, model_config.rag_persist_directory, model_config.retrieval)
+    with _retrieval_lock:
+        if cache_key in _retrieval_cache:
+            logger.info("Reusing cached RAG lookup")
+            return _retrieval_cache[cache_key]
+        lookup = _retrieval_inflight.get(cache_key)
+        searching = lookup is None
+        if searching:
+            lookup = _retrieval_inflight[cache_key] = Future()
+    
+    if not searching:
+        logger.info("Waiting for the same RAG lookup of another run")
+        return lookup.result()
+    
+    result = ("", "0.0")
     try:
-        # Check if database exists
+        result = _search_similar_design(prompt, model_config, logger)
+    finally:
+        with _retrieval_lock:
+            if result[0]:
+                _retrieval_cache[cache_key] = result
+            del _retrieval_inflight[cache_key]
+        lookup.set_result(result)
+    return result
+
+def _get_vectorstore(model_config: ModelConfig, logger) -> Optional[Chroma]:
+    """Open the RAG database, creating it first if needed."""
+    with _store_lock:
         persist_dir = Path(model_config.rag_persist_directory)
+        vectorstore = _vectorstores.get(str(persist_dir))
+        if vectorstore is not None:
+            return vectorstore
+        
+        # Check if database exists
         print(f"\nChecking RAG database at: {persist_dir}")
         logger.info(f"Checking RAG database at: {persist_dir}")
         
@@ -98,7 +141,7 @@ def get_similar_design(prompt: str, model_config: ModelConfig, logger) -> Tuple[
             print(f"Found existing RAG database at {persist_dir}")
             logger.info(f"Found existing RAG database at {persist_dir}")
             needs_setup = False
-            
+        
         if needs_setup:
             print("\nRAG database not found. Setting up database...")
             logger.info("RAG database not found. Setting up database...")
@@ -110,39 +153,131 @@ def get_similar_design(prompt: str, model_config: ModelConfig, logger) -> Tuple[
                 error_msg = f"Failed to set up RAG database: {str(e)}"
                 print(f"\n{error_msg}")
                 logger.error(error_msg)
-                return "", "0.0"
+                return None
         
-        # Create vector store
+        # Create vector store (once per database)
         print("\nConnecting to RAG database...")
+        recover_compaction(str(persist_dir), logger)
         vectorstore = Chroma(
-            persist_directory=model_config.rag_persist_directory,
+            persist_directory=str(persist_dir),
             embedding_function=model_config.embeddings
         )
+        _vectorstores[str(persist_dir)] = vectorstore
+        return vectorstore
+
+def _get_flat_index(model_config: ModelConfig, logger) -> Optional[FlatVectorIndex]:
+    """Open the flat index, exporting it from the Chroma store if needed."""
+    with _store_lock:
+        index_dir = str(default_index_dir(model_config.rag_persist_directory))
+        index = _flat_indexes.get(index_dir)
+        if index is not None:
+            return index
         
-        # Find similar designs
+        if not FlatVectorIndex.exists(index_dir):
+            # Make sure the Chroma store exists before exporting from it
+            if _get_vectorstore(model_config, logger) is None:
+                return None
+            print(f"\nExporting flat RAG index to {index_dir}...")
+            logger.info(f"Exporting flat RAG index to {index_dir}")
+            export_flat_index(model_config.rag_persist_directory, Path(index_dir))
+        
+        index = FlatVectorIndex(Path(index_dir))
+        _flat_indexes[index_dir] = index
+        return index
+
+def _chroma_candidates(query: List[float], model_config: ModelConfig, logger, exclude: str = "") -> Optional[List[RetrievedDesign]]:
+    """Nearest neighbours of a query embedding from the Chroma store, skipping documents of one description key."""
+    vectorstore = _get_vectorstore(model_config, logger)
+    if vectorstore is None:
+        return None
+    
+    # Fetch nearest neighbours with their embeddings for MMR, and enough
+    # extra ones to make up for the excluded documents
+    collection = vectorstore._collection
+    own = set(collection.get(where={DESCRIPTION_KEY: exclude}, include=[])["ids"]) if exclude else set()
+    hits = collection.query(
+        query_embeddings=[query],
+        n_results=model_config.retrieval.fetch_k + len(own),
+        include=["documents", "metadatas", "distances", "embeddings"]
+    )
+    
+    candidates = []
+    for doc_id, content, metadata, distance, embedding in zip(
+        hits["ids"][0], hits["documents"][0], hits["metadatas"][0],
+        hits["distances"][0], hits["embeddings"][0]
+    ):
+        if doc_id in own:
+            continue
+        # Chroma returns squared L2 distances; for unit-length embeddings
+        # the cosine similarity is 1 - d/2
+        summary, code = split_document(content, metadata)
+        candidates.append(RetrievedDesign(
+            summary, code, 1.0 - float(distance) / 2.0, np.asarray(embedding)
+        ))
+    return candidates
+
+def _flat_candidates(queries: List[List[float]], model_config: ModelConfig, logger, excludes: List[str]) -> Optional[List[List[RetrievedDesign]]]:
+    """Nearest neighbours of a batch of query embeddings from the flat index, skipping each query's description key."""
+    index = _get_flat_index(model_config, logger)
+    if index is None:
+        return None
+    
+    fetch_k = model_config.retrieval.fetch_k
+    own = [index.rows_where(DESCRIPTION_KEY, key) for key in excludes]
+    indices, scores = index.search(np.asarray(queries), fetch_k + max(map(len, own), default=0))
+    batches = []
+    for row_indices, row_scores, skip in zip(indices, scores, own):
+        candidates = []
+        for i, score in zip(row_indices, row_scores):
+            if i in skip:
+                continue
+            if len(candidates) == fetch_k:
+                break
+            summary, code = split_document(index.document(i), index.metadata(i))
+            candidates.append(RetrievedDesign(summary, code, float(score), index.embeddings[i]))
+        batches.append(candidates)
+    return batches
+
+def _select_references(query: List[float], candidates: List[RetrievedDesign], model_config: ModelConfig, logger) -> Tuple[str, str]:
+    """Filter, rerank and pack candidates into the reference context."""
+    retrieval = model_config.retrieval
+    relevant = [c for c in candidates if c.relevance >= retrieval.min_relevance]
+    
+    if not relevant:
+        best = max((c.relevance for c in candidates), default=0.0)
+        print(f"\nNo similar designs above score {retrieval.min_relevance} (best: {best:.3f})")
+        logger.warning(f"No similar designs above score {retrieval.min_relevance} (best: {best:.3f})")
+        return "", f"{best:.3f}"
+    
+    selected = mmr_rerank(
+        np.asarray(query), relevant, retrieval.top_k, retrieval.mmr_lambda
+    )
+    context = assemble_context(
+        selected, retrieval.context_token_budget, retrieval.max_snippet_lines
+    )
+    scores = ", ".join(f"{d.relevance:.3f}" for d in selected)
+    print(f"\nSelected {len(selected)} of {len(relevant)} similar designs (scores: {scores})")
+    logger.info(
+        f"Selected {len(selected)} of {len(relevant)} similar designs (scores: {scores}), "
+        f"~{estimate_tokens(context)} context tokens"
+    )
+    
+    return context, f"{selected[0].relevance:.3f}"
+
+def _search_similar_design(prompt: str, model_config: ModelConfig, logger) -> Tuple[str, str]:
+    """Query the RAG database and assemble the reference context."""
+    try:
         print("Searching for similar designs...")
-        docs = vectorstore.similarity_search_with_score(prompt, k=1)
-        if not docs:
-            print("\nNo similar designs found in RAG dataset")
-            logger.warning("No similar designs found in RAG dataset")
-            return "", "0.0"
-            
-        similar_design, score = docs[0]
-        print(f"\nFound similar design with score: {score}")
-        logger.info(f"Found similar design with score: {score}")
-        
-        # Extract summary and code from the content
-        content = similar_design.page_content
-        if "Summary:" in content and "Verilog Implementation:" in content:
-            summary, code = content.split("Verilog Implementation:")
-            summary = summary.replace("Summary:", "").strip()
-            code = code.strip()
+        query = model_config.embeddings.embed_query(prompt)
+        if model_config.retrieval.index == "flat":
+            batches = _flat_candidates([query], model_config, logger, [description_key(prompt)])
+            candidates = batches[0] if batches else None
         else:
-            # Fallback for old format
-            summary = content
-            code = similar_design.metadata.get("code", "")
+            candidates = _chroma_candidates(query, model_config, logger, description_key(prompt))
+        if candidates is None:
+            return "", "0.0"
         
-        return f"Summary: {summary}\n\nCode:\n{code}", str(score)
+        return _select_references(query, candidates, model_config, logger)
         
     except Exception as e:
         error_msg = f"Error in RAG search: {str(e)}"
@@ -150,41 +285,107 @@ def get_similar_design(prompt: str, model_config: ModelConfig, logger) -> Tuple[
         logger.error(error_msg)
         return "", "0.0"
 
-def rag_generation(logger, model_config: ModelConfig, working_dir: Path = None) -> None:
+def prefetch_similar_designs(prompts: List[str], model_config: ModelConfig, logger) -> None:
     """
-    Generate Verilog design using RAG-enhanced generation.
+    Retrieve references for many prompts at once with the flat index.
+    
+    All prompts are embedded in one request and searched with one matrix
+    multiply; the results fill the retrieval cache used by get_similar_design.
     
     Args:
+        prompts: Design prompts
+        model_config: Model configuration with embeddings and RAG settings
         logger: Logger instance
-        model_config: Model configuration
-        working_dir: Directory containing design files
     """
-    if working_dir is None:
-        working_dir = Path.cwd()
-        
-    design_file = working_dir / "design_description.txt"
-    if not design_file.exists():
-        logger.error(f"design_description.txt not found in {working_dir}")
+    if model_config.retrieval.index != "flat":
+        return
+    pending = [
+        p for p in dict.fromkeys(prompts)
+        if (p, model_config.rag_persist_directory, model_config.retrieval) not in _retrieval_cache
+    ]
+    if not pending:
         return
-        
-    design_prompt = design_file.read_text()
     
-    # Get similar design using RAG
+    try:
+        print(f"\nPrefetching references for {len(pending)} prompts...")
+        queries = model_config.embeddings.embed_documents(pending)
+        batches = _flat_candidates(queries, model_config, logger, [description_key(p) for p in pending])
+        if batches is None:
+            return
+        with _retrieval_lock:
+            for prompt, query, candidates in zip(pending, queries, batches):
+                result = _select_references(query, candidates, model_config, logger)
+                if result[0]:
+                    _retrieval_cache[(prompt, model_config.rag_persist_directory, model_config.retrieval)] = result
+    except Exception as e:
+        logger.error(f"Error prefetching RAG references: {str(e)}")
+
+def build_rag_prompt(design_prompt: str, model_config: ModelConfig, logger) -> str:
+    """
+    Add the retrieved reference designs to a design prompt.
+    
+    Args:
+        design_prompt: Design description
+        model_config: Model configuration with embeddings and RAG settings
+        logger: Logger instance
+        
+    Returns:
+        Enhanced prompt, or the plain prompt when no reference is close enough
+    """
     print("\nSearching for similar designs...")
     similar_design, similarity_score = get_similar_design(
         design_prompt, model_config, logger
     )
+    if not similar_design:
+        return design_prompt
     
-    # Prepare enhanced prompt
-    enhanced_prompt = f"""Design Prompt:
+    return f"""Design Prompt:
 {design_prompt}
 
-Similar Existing Design (similarity score: {similarity_score}):
+Similar Existing Designs (best similarity score: {similarity_score}):
 {similar_design}
 
 Please generate a new Verilog design based on the design prompt above.
-Use the similar design as a reference but ensure your design meets the requirements
+Use the similar designs as a reference but ensure your design meets the requirements
 specified in the prompt."""
+
+def rag_generation(
+    logger,
+    model_config: ModelConfig,
+    working_dir: Path = None,
+    output_dir: Optional[Path] = None,
+    sim_config: Optional[SimulationConfig] = None,
+    artifacts: Optional[SampleArtifacts] = None,
+    budget: Optional[Budget] = None
+) -> tuple[bool, str]:
+    """
+    Generate Verilog design using RAG-enhanced generation.
+    
+    Args:
+        logger: Logger instance
+        model_config: Model configuration
+        working_dir: Directory containing design files
+        output_dir: Directory to write and simulate design.v in (defaults to working_dir)
+        sim_config: Simulation configuration
+        artifacts: Records the prompt, response, design and test output
+        budget: Charged with the LLM call and the simulation; the design is
+            not simulated once its wall or simulation budget is exhausted
+        
+    Returns:
+        Tuple of (design passed testbench, test output or error message)
+    """
+    if working_dir is None:
+        working_dir = Path.cwd()
+        
+    design_file = working_dir / "design_description.txt"
+    if not design_file.exists():
+        logger.error(f"design_description.txt not found in {working_dir}")
+        return False, f"design_description.txt not found in {working_dir}"
+        
+    design_prompt = design_file.read_text()
+    
+    # Get similar designs using RAG; falls back to the plain prompt when none is close enough
+    enhanced_prompt = build_rag_prompt(design_prompt, model_config, logger)
     
     # Generate Verilog using LLM
     messages = [
@@ -194,31 +395,52 @@ specified in the prompt."""
     
     try:
         print("\nSending prompt to LLM...")
+        start = time.perf_counter()
         response = model_config.generation_client.invoke(messages)
+        if budget:
+            budget.charge_tokens(message_tokens(messages, response), time.perf_counter() - start)
         print("Received response from LLM")
         verilog_code = extract_module_content(response.content)
         
         if not verilog_code:
             logger.error("No Verilog module found in LLM response")
             print("No Verilog module found in response")
-            return
+            if artifacts:
+                artifacts.record_iteration(1, False, prompt=enhanced_prompt, response=response.content)
+            return False, "No Verilog module found in LLM response"
             
         print("Writing generated Verilog to file...")
         # Write generated Verilog to file
-        output_file = working_dir / "design.v"
+        output_dir = stage_design(working_dir, output_dir or working_dir)
+        output_file = output_dir / "design.v"
         output_file.write_text(verilog_code)
         logger.info(f"Generated Verilog written to {output_file}")
         print(f"Wrote Verilog to {output_file}")
         
         # Run tests
         print("\n\nVerilog Test:")
-        success, error_msg = run_verilog_tests(working_dir, logger)
-        if success:
+        # The tokens are spent, so only the time and simulation limits still apply
+        reason = budget.exhausted(tokens=False) if budget else ""
+        if reason:
+            budget.abort(reason)
+            logger.warning(f"Not simulating the design: {reason}")
+            success, error_msg = False, f"Not simulated: {reason}"
+        else:
+            success, error_msg = run_verilog_tests(output_dir, logger, sim_config, budget)
+        passed = success and is_passing_output(error_msg)
+        if artifacts:
+            artifacts.record_iteration(
+                1, passed, test_output=error_msg, source_dir=output_dir,
+                prompt=enhanced_prompt, response=response.content, design=verilog_code
+            )
+        if passed:
             print(f"Test Output:\n{error_msg}\n\n")
             logger.info("Verilog design passed all tests")
         else:
             print(f"Test Output:\n{error_msg}\n\n")
             logger.error(f"Verilog design failed tests: {error_msg}")
+        return passed, error_msg
             
     except Exception as e:
-        logger.error(f"Error during generation: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error during generation: {str(e)}")
+        return False, f"Error during generation: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Aggregate reports over evaluation result stores.
+
+Result stores (see results.py) are loaded into column arrays once and
+every report is computed with grouped array operations, so sweeps of
+tens of thousands of samples report in well under a second:
+1. Pass rates and unbiased pass@k by any of category, design, method,
+   model and temperature
+2. Latency percentiles of the samples and of each stage (llm, simulate,
+   and the pipeline stages), and token percentiles
+3. Iterations-to-pass distributions of agentic samples
+4. Pass-rate differences between two runs or stores
+
+Reports print as terminal tables and can also be written as one CSV per
+table or as a single JSON document.
+
+Usage:
+    # Report every store under results/
+    poetry run python -m run_verilog_generation_agent.report summary
+
+    # pass@1 and pass@5 by model for one run, also as CSV files
+    poetry run python -m run_verilog_generation_agent.report summary \
+        results/*.jsonl --run 2025-05-01_12-00-00 --by model --k 1,5 --csv reports/
+
+    # Compare two runs (or two store files)
+    poetry run python -m run_verilog_generation_agent.report diff \
+        2025-05-01_12-00-00 2025-05-08_09-30-00 --json reports/diff.json
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import argparse
+import csv
+import json
+import math
+import time
+import zlib
+
+import numpy as np
+
+from .results import RESULTS_DIR
+
+STRING_COLUMNS = ("design", "category", "method", "model", "run_id", "aborted")
+NUMERIC_COLUMNS = {"temperature": float, "sample": np.int64, "iterations": np.int64,
+                   "duration_s": float, "tokens": np.int64}
+COLUMNS = STRING_COLUMNS + tuple(NUMERIC_COLUMNS) + ("passed",)
+GROUP_KEYS = ("category", "design", "method", "model", "temperature", "run_id")
+PERCENTILES = (50, 90, 99)
+
+@dataclass
+class ResultColumns:
+    """
+    Result rows as column arrays.
+
+    String columns are dictionary-encoded: the column holds int codes
+    into its categories. Missing stage times are NaN.
+    """
+    columns: Dict[str, np.ndarray]
+    categories: Dict[str, np.ndarray] = field(default_factory=dict)
+    stages: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.columns["passed"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Decoded values of a column."""
+        if name in self.categories:
+            return self.categories[name][self.columns[name]]
+        return self.columns[name]
+
+    def isin(self, name: str, values: Sequence[Any]) -> np.ndarray:
+        """Mask of the rows whose column value is one of some values."""
+        if name in self.categories:
+            codes = np.flatnonzero(np.isin(self.categories[name], list(values)))
+            return np.isin(self.columns[name], codes)
+        return np.isin(self.columns[name], list(values))
+
+    def select(self, mask: np.ndarray) -> "ResultColumns":
+        """Rows where mask is true."""
+        return ResultColumns(
+            {name: values[mask] for name, values in self.columns.items()},
+            self.categories,
+            {name: values[mask] for name, values in self.stages.items()}
+        )
+
+def _parse_rows(lines: List[bytes]) -> ResultColumns:
+    rows = [json.loads(line) for line in lines if line.strip()]
+    columns: Dict[str, np.ndarray] = {}
+    categories: Dict[str, np.ndarray] = {}
+    for name in STRING_COLUMNS:
+        values, codes = np.unique(
+            np.array([row.get(name, "") for row in rows], dtype=str), return_inverse=True
+        )
+        categories[name], columns[name] = values, codes.ravel().astype(np.int32)
+    for name, dtype in NUMERIC_COLUMNS.items():
+        columns[name] = np.array([row.get(name) or 0 for row in rows], dtype=dtype)
+    columns["passed"] = np.array([bool(row["passed"]) for row in rows], dtype=bool)
+    stage_names = sorted({name for row in rows for name in row.get("stage_s") or ()})
+    stages = {
+        name: np.array([(row.get("stage_s") or {}).get(name, np.nan) for row in rows], dtype=float)
+        for name in stage_names
+    }
+    return ResultColumns(columns, categories, stages)
+
+def concat_columns(parts: Sequence[ResultColumns]) -> ResultColumns:
+    """Rows of several column sets, with their categories merged."""
+    if len(parts) == 1:
+        return parts[0]
+    columns: Dict[str, np.ndarray] = {}
+    categories: Dict[str, np.ndarray] = {}
+    for name in STRING_COLUMNS:
+        categories[name] = np.unique(np.concatenate([part.categories[name] for part in parts]))
+        columns[name] = np.concatenate([
+            np.searchsorted(categories[name], part.categories[name]).astype(np.int32)[part.columns[name]]
+            for part in parts
+        ])
+    for name in COLUMNS[len(STRING_COLUMNS):]:
+        columns[name] = np.concatenate([part.columns[name] for part in parts])
+    stage_names = sorted({name for part in parts for name in part.stages})
+    stages = {
+        name: np.concatenate([part.stages.get(name, np.full(len(part), np.nan)) for part in parts])
+        for name in stage_names
+    }
+    return ResultColumns(columns, categories, stages)
+
+def _cache_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.columns.npz")
+
+def _load_store(path: Path) -> ResultColumns:
+    """
+    Columns of one result store, through a column cache next to it.
+
+    Stores are append-only, so the cache remembers how many bytes it
+    covers (and their checksum) and only lines appended since are parsed.
+    A rewritten store (e.g. by results.py merge) is parsed again in full.
+    """
+    data = path.read_bytes()
+    cache_path = _cache_path(path)
+    cached, offset = None, 0
+    if cache_path.exists():
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache:
+                covered = int(cache["offset"])
+                if covered <= len(data) and int(cache["checksum"]) == zlib.crc32(data[:covered]):
+                    cached = ResultColumns(
+                        {name: cache[f"column:{name}"] for name in COLUMNS},
+                        {name: cache[f"category:{name}"] for name in STRING_COLUMNS},
+                        {key.split(":", 1)[1]: cache[key] for key in cache.files if key.startswith("stage:")}
+                    )
+                    offset = covered
+        except (OSError, KeyError, ValueError):
+            cached = None
+    # Only complete lines; a line being appended right now is picked up next time
+    end = data.rfind(b"\n") + 1
+    if cached is not None and end <= offset:
+        return cached
+    tail = _parse_rows(data[offset:end].splitlines())
+    columns = concat_columns([cached, tail]) if cached is not None and len(cached) else tail
+    try:
+        np.savez(
+            cache_path,
+            offset=np.int64(end),
+            checksum=np.int64(zlib.crc32(data[:end])),
+            **{f"column:{name}": values for name, values in columns.columns.items()},
+            **{f"category:{name}": values for name, values in columns.categories.items()},
+            **{f"stage:{name}": values for name, values in columns.stages.items()}
+        )
+    except OSError:
+        pass  # read-only result directories are reported without a cache
+    return columns
+
+def load_columns(paths: Sequence[Path]) -> ResultColumns:
+    """
+    Load result stores into column arrays.
+
+    Args:
+        paths: Result store files (JSON lines of SampleResult)
+
+    Returns:
+        Columns of all rows of all stores
+    """
+    parts = [_load_store(Path(path)) for path in paths]
+    return concat_columns(parts) if parts else _parse_rows([])
+
+def group_ids(data: ResultColumns, keys: Sequence[str]) -> Tuple[np.ndarray, List[tuple]]:
+    """
+    Number the distinct combinations of some columns.
+
+    Returns:
+        Tuple of (group id per row, key values per group id)
+    """
+    if not keys:
+        return np.zeros(len(data), dtype=np.int64), [()]
+    uniques, codes = [], []
+    for key in keys:
+        if key in data.categories:
+            uniques.append(data.categories[key])
+            codes.append(data.columns[key].astype(np.int64))
+        else:
+            values, inverse = np.unique(data.columns[key], return_inverse=True)
+            uniques.append(values)
+            codes.append(inverse.ravel().astype(np.int64))
+    # Mixed-radix combination of the codes keeps grouping on int64 keys
+    combined = np.zeros(len(data), dtype=np.int64)
+    for values, code in zip(uniques, codes):
+        combined = combined * max(len(values), 1) + code
+    labels, ids = np.unique(combined, return_inverse=True)
+    label_codes = []
+    for values in reversed(uniques):
+        labels, code = np.divmod(labels, max(len(values), 1))
+        label_codes.append(code)
+    label_codes.reverse()
+    names = [
+        tuple(values[code].item() for values, code in zip(uniques, row))
+        for row in zip(*label_codes)
+    ]
+    return ids.ravel(), names
+
+def pass_at_k(n: np.ndarray, c: np.ndarray, k: int) -> np.ndarray:
+    """
+    Unbiased pass@k estimate per problem (Chen et al., 2021).
+
+    1 - C(n-c, k) / C(n, k), computed as a running product; NaN where
+    fewer than k samples exist.
+
+    Args:
+        n: Samples per problem
+        c: Passing samples per problem
+        k: Number of attempts
+    """
+    n = n.astype(float)
+    fails = n - c
+    ratio = np.ones_like(n)
+    for j in range(k):
+        ratio *= np.clip(fails - j, 0, None) / np.maximum(n - j, 1)
+    estimate = 1.0 - ratio
+    estimate[n < k] = np.nan
+    return estimate
+
+def group_percentiles(
+    ids: np.ndarray,
+    values: np.ndarray,
+    groups: int,
+    percentiles: Sequence[float] = PERCENTILES
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Percentiles of values per group, with linear interpolation.
+
+    Zero and NaN values (stages a sample did not record) are ignored.
+
+    Returns:
+        Tuple of (count per group, mean per group, percentiles per group
+        with one column per percentile)
+    """
+    valid = np.isfinite(values) & (values > 0)
+    ids, values = ids[valid], values[valid]
+    counts = np.bincount(ids, minlength=groups)
+    sums = np.bincount(ids, weights=values, minlength=groups)
+    means = np.divide(sums, counts, out=np.full(groups, np.nan), where=counts > 0)
+    ordered = values[np.lexsort((values, ids))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((groups, len(percentiles)), np.nan)
+    present = counts > 0
+    last = counts[present] - 1
+    for i, q in enumerate(percentiles):
+        position = last * q / 100
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, last)
+        fraction = position - low
+        base = starts[present]
+        result[present, i] = ordered[base + low] * (1 - fraction) + ordered[base + high] * fraction
+    return counts, means, result
+
+@dataclass
+class Table:
+    """One report table."""
+    name: str  # file stem of the CSV export
+    title: str
+    header: List[str]
+    rows: List[List[Any]]
+
+    def format(self) -> str:
+        cells = [self.header] + [["-" if v is None else str(v) for v in row] for row in self.rows]
+        widths = [max(len(row[i]) for row in cells) for i in range(len(self.header))]
+        lines = [self.title, ""]
+        for row in cells:
+            lines.append("  ".join(
+                v.ljust(w) if isinstance(self.rows[0][i] if self.rows else "", str) else v.rjust(w)
+                for i, (v, w) in enumerate(zip(row, widths))
+            ).rstrip())
+        if not self.rows:
+            lines.append("(no rows)")
+        return "\n".join(lines)
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.header, row)) for row in self.rows]
+
+def _num(value: float, digits: int = 3) -> Optional[float]:
+    """Rounded value for output; None for NaN."""
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return round(value, digits) if digits else int(round(value))
+
+def _pct(value: float) -> Optional[float]:
+    return _num(100 * value, 1)
+
+def pass_table(data: ResultColumns, by: Sequence[str], ks: Sequence[int]) -> Table:
+    """
+    Pass rate and pass@k per group.
+
+    pass@k is estimated per problem (design, method, model and temperature
+    within the group) and averaged over the problems with at least k
+    samples.
+    """
+    ids, names = group_ids(data, by)
+    groups = len(names)
+    passed = data["passed"]
+    samples = np.bincount(ids, minlength=groups)
+    passes = np.bincount(ids, weights=passed, minlength=groups)
+    aborted = np.bincount(ids, weights=data.isin("aborted", [""]) == 0, minlength=groups)
+    problem_keys = list(by) + [k for k in ("design", "method", "model", "temperature") if k not in by]
+    problems, _ = group_ids(data, problem_keys)
+    problem_group = np.zeros(problems.max() + 1 if len(problems) else 0, dtype=np.int64)
+    problem_group[problems] = ids
+    n = np.bincount(problems)
+    c = np.bincount(problems, weights=passed, minlength=len(n))
+    designs = np.bincount(problem_group, minlength=groups)
+    estimates = []
+    for k in ks:
+        estimate = pass_at_k(n, c, k)
+        valid = ~np.isnan(estimate)
+        counted = np.bincount(problem_group[valid], minlength=groups)
+        total = np.bincount(problem_group[valid], weights=estimate[valid], minlength=groups)
+        estimates.append(np.divide(total, counted, out=np.full(groups, np.nan), where=counted > 0))
+    rows = [
+        list(name) + [
+            int(designs[g]), int(samples[g]), int(passes[g]), int(aborted[g]),
+            _pct(passes[g] / samples[g])
+        ] + [_pct(estimate[g]) for estimate in estimates]
+        for g, name in enumerate(names)
+    ]
+    return Table(
+        "pass_rates", f"Pass rates by {', '.join(by) or 'run'}",
+        list(by) + ["problems", "samples", "passed", "aborted", "rate%"] + [f"pass@{k}%" for k in ks],
+        rows
+    )
+
+def latency_table(data: ResultColumns, by: Sequence[str]) -> Table:
+    """Percentiles of sample time, each stage's time and tokens per group."""
+    ids, names = group_ids(data, by)
+    metrics = [("total_s", data["duration_s"])]
+    metrics += [(f"{name}_s", values) for name, values in data.stages.items()]
+    metrics.append(("tokens", data["tokens"].astype(float)))
+    rows = []
+    for metric, values in metrics:
+        counts, means, percentiles = group_percentiles(ids, values, len(names))
+        digits = 0 if metric == "tokens" else 3
+        for g, name in enumerate(names):
+            if counts[g]:
+                rows.append(list(name) + [metric, int(counts[g]), _num(means[g], digits)]
+                            + [_num(p, digits) for p in percentiles[g]])
+    return Table(
+        "latency", f"Latency and token percentiles by {', '.join(list(by) + ['stage'])}",
+        list(by) + ["stage", "n", "mean"] + [f"p{q}" for q in PERCENTILES],
+        rows
+    )
+
+def iterations_table(data: ResultColumns, by: Sequence[str]) -> Optional[Table]:
+    """
+    Iterations-to-pass of agentic samples per group.
+
+    Columns le<i> give the share of samples that passed within i
+    iterations.
+    """
+    data = data.select(data.isin("method", ["agentic"]))
+    if not len(data):
+        return None
+    by = [key for key in by if key != "method"]
+    ids, names = group_ids(data, by)
+    groups = len(names)
+    iterations = np.maximum(data["iterations"], 1)
+    passed = data["passed"]
+    width = int(iterations.max()) + 1
+    histogram = np.bincount(
+        ids[passed] * width + iterations[passed], minlength=groups * width
+    ).reshape(groups, width)
+    within = np.cumsum(histogram, axis=1)[:, 1:]
+    samples = np.bincount(ids, minlength=groups)
+    passes = histogram.sum(axis=1)
+    mean_to_pass = np.divide(
+        (histogram * np.arange(width)).sum(axis=1), passes,
+        out=np.full(groups, np.nan), where=passes > 0
+    )
+    rows = [
+        list(name) + [int(samples[g]), int(passes[g]), _num(mean_to_pass[g], 2)]
+        + [_pct(within[g, i] / samples[g]) for i in range(width - 1)]
+        for g, name in enumerate(names)
+    ]
+    return Table(
+        "iterations", f"Agentic iterations to pass by {', '.join(by) or 'run'}",
+        by + ["samples", "passed", "mean_iter"] + [f"le{i}%" for i in range(1, width)],
+        rows
+    )
+
+def diff_tables(
+    base: ResultColumns,
+    other: ResultColumns,
+    base_label: str,
+    other_label: str,
+    by: Sequence[str] = ("method", "model")
+) -> List[Table]:
+    """
+    Pass-rate differences between two sets of results.
+
+    Returns:
+        A summary table per group over each side's samples, and a table of
+        the problems (design, method, model, temperature) present on both
+        sides whose pass rate changed, regressions first
+    """
+    combined = concat_columns([base, other])
+    side = np.concatenate([np.zeros(len(base), dtype=np.int64), np.ones(len(other), dtype=np.int64)])
+    passed = combined["passed"]
+    tables = []
+    for keys, name, title in (
+        (list(by), "diff_summary", f"Pass rates of {other_label} against {base_label}"),
+        (["design", "method", "model", "temperature"], "diff_designs", "Changed designs"),
+    ):
+        ids, names = group_ids(combined, keys)
+        cells = ids * 2 + side
+        samples = np.bincount(cells, minlength=2 * len(names)).reshape(-1, 2)
+        passes = np.bincount(cells, weights=passed, minlength=2 * len(names)).reshape(-1, 2)
+        rates = np.divide(passes, samples, out=np.full(samples.shape, np.nan), where=samples > 0)
+        delta = rates[:, 1] - rates[:, 0]
+        if name == "diff_designs":
+            order = [g for g in np.argsort(delta, kind="stable") if not np.isnan(delta[g]) and delta[g] != 0]
+        else:
+            order = range(len(names))
+        rows = [
+            list(names[g]) + [
+                int(samples[g, 0]), int(samples[g, 1]),
+                _pct(rates[g, 0]), _pct(rates[g, 1]), _pct(delta[g])
+            ]
+            for g in order
+        ]
+        tables.append(Table(
+            name, title,
+            keys + [f"n_{base_label}", f"n_{other_label}", f"{base_label}%", f"{other_label}%", "delta%"],
+            rows
+        ))
+    return tables
+
+def summary_tables(data: ResultColumns, by: Sequence[str], ks: Sequence[int]) -> List[Table]:
+    """All summary reports of one set of results."""
+    tables = [pass_table(data, by, ks), latency_table(data, [k for k in by if k != "design"])]
+    iterations = iterations_table(data, by)
+    if iterations:
+        tables.append(iterations)
+    return tables
+
+def write_tables(tables: List[Table], csv_dir: Optional[Path] = None, json_path: Optional[Path] = None) -> None:
+    """Export tables as one CSV per table and/or one JSON document."""
+    if csv_dir:
+        csv_dir.mkdir(parents=True, exist_ok=True)
+        for table in tables:
+            with open(csv_dir / f"{table.name}.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(table.header)
+                writer.writerows(table.rows)
+        print(f"Wrote {len(tables)} CSV tables to {csv_dir}")
+    if json_path:
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        json_path.write_text(json.dumps(
+            {table.name: {"title": table.title, "rows": table.records()} for table in tables},
+            indent=2
+        ), encoding="utf-8")
+        print(f"Wrote report to {json_path}")
+
+def _select(spec: str, pool: Optional[ResultColumns]) -> ResultColumns:
+    """Rows of a store file, or of a run id among the pool's rows."""
+    if Path(spec).is_file():
+        return load_columns([Path(spec)])
+    mask = pool.isin("run_id", [spec]) if pool is not None else None
+    if mask is None or not mask.any():
+        raise SystemExit(f"No result store or run named {spec}")
+    return pool.select(mask)
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Aggregate reports over evaluation results")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="Pass rates, latencies and iterations")
+    summary.add_argument("stores", nargs="*", type=Path, help=f"Result stores (default: {RESULTS_DIR}/*.jsonl)")
+    summary.add_argument("--run", action="append", help="Only these run ids (repeatable)")
+    summary.add_argument("--by", default="category,method,model",
+                         help=f"Comma-separated group keys from {', '.join(GROUP_KEYS)}")
+    summary.add_argument("--k", default="1,5", help="Comma-separated pass@k values")
+    diff = subparsers.add_parser("diff", help="Compare the pass rates of two runs or stores")
+    diff.add_argument("base", help="Baseline run id or result store")
+    diff.add_argument("other", help="Run id or result store to compare")
+    diff.add_argument("--results", nargs="*", type=Path,
+                      help=f"Stores holding the runs (default: {RESULTS_DIR}/*.jsonl)")
+    diff.add_argument("--by", default="method,model", help="Comma-separated summary group keys")
+    for command in (summary, diff):
+        command.add_argument("--csv", type=Path, help="Directory to write one CSV per table")
+        command.add_argument("--json", type=Path, help="File to write all tables as JSON")
+    args = parser.parse_args()
+
+    by = [key for key in args.by.split(",") if key]
+    unknown = [key for key in by if key not in GROUP_KEYS]
+    if unknown:
+        parser.error(f"Unknown group keys: {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    if args.command == "summary":
+        stores = args.stores or sorted(RESULTS_DIR.glob("*.jsonl"))
+        data = load_columns(stores)
+        if args.run:
+            data = data.select(data.isin("run_id", args.run))
+        if not len(data):
+            raise SystemExit("No results to report")
+        tables = summary_tables(data, by, [int(k) for k in args.k.split(",")])
+        rows = len(data)
+    else:
+        stores = args.results if args.results is not None else sorted(RESULTS_DIR.glob("*.jsonl"))
+        pool = load_columns(stores) if stores else None
+        base, other = _select(args.base, pool), _select(args.other, pool)
+        tables = diff_tables(base, other, Path(args.base).stem, Path(args.other).stem, by)
+        rows = len(base) + len(other)
+    elapsed = time.perf_counter() - start
+
+    for table in tables:
+        print(table.format() + "\n")
+    print(f"Reported {rows} samples in {elapsed * 1000:.0f} ms")
+    write_tables(tables, args.csv, args.json)
+
+if __name__ == "__main__":
+    main()
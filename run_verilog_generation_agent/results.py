@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Result storage, sharding and merging for evaluation sweeps.
+
+Every evaluated sample is appended as one JSON line to a result store.
+This module also:
+1. Partitions a design list deterministically into shards (optionally
+   balanced by historical per-design cost)
+2. Merges per-shard result stores into one report, checking that no
+   sample is missing or duplicated
+
+Usage:
+    # Merge the stores written by `main.py --shard i/N --results ...`
+    poetry run python -m run_verilog_generation_agent.results merge \
+        results/shard-*.jsonl -o results/merged.jsonl
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field, asdict, fields
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import json
+import statistics
+import sys
+import threading
+
+RESULTS_DIR = Path(__file__).parent.parent / "results"
+
+@dataclass
+class SampleResult:
+    """Outcome of one generation sample for one design."""
+    design: str
+    category: str
+    method: str
+    model: str
+    temperature: float
+    sample: int
+    passed: bool
+    output: str
+    iterations: int = 1
+    duration_s: float = 0.0
+    shard: str = ""
+    run_id: str = ""  # artifact store run holding the sample's iterations
+    aborted: str = ""  # why the sample stopped early or was skipped (resource budgets)
+    tokens: int = 0  # LLM tokens spent, where known
+    stage_s: Dict[str, float] = field(default_factory=dict)  # seconds per stage, e.g. llm, simulate
+    timestamp: str = field(
+        default_factory=lambda: datetime.now().isoformat(timespec="seconds")
+    )
+
+    @property
+    def key(self) -> Tuple[str, str, str, float, int]:
+        """Identity of the sample across shards."""
+        return (self.design, self.method, self.model, self.temperature, self.sample)
+
+def is_passing_output(output: str) -> bool:
+    """Check simulation output for the RTLLM pass banner."""
+    return "passed" in output.lower()
+
+class ResultStore:
+    """Append-only JSONL store of sample results."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(self, result: SampleResult) -> None:
+        """Append a result; safe to call from several worker threads."""
+        line = json.dumps(asdict(result))
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def load(self) -> List[SampleResult]:
+        """Load every result in the store."""
+        return load_results([self.path])
+
+def load_results(paths: Iterable[Path]) -> List[SampleResult]:
+    """
+    Load results from one or more JSONL stores.
+
+    Lines with unknown keys are tolerated so older stores stay readable.
+
+    Args:
+        paths: Result store files
+
+    Returns:
+        Results in file order
+    """
+    known = {f.name for f in fields(SampleResult)}
+    results = []
+    for path in paths:
+        with Path(path).open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                data = json.loads(line)
+                results.append(SampleResult(**{k: v for k, v in data.items() if k in known}))
+    return results
+
+def default_results_path(shard: Optional[Tuple[int, int]] = None) -> Path:
+    """Timestamped result store path, tagged with the shard if any."""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    suffix = f"_shard-{shard[0]}-of-{shard[1]}" if shard else ""
+    return RESULTS_DIR / f"{timestamp}{suffix}.jsonl"
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse a shard specification of the form 'i/N' (0 <= i < N).
+
+    Raises:
+        ValueError: If the specification is malformed
+    """
+    try:
+        index, count = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', need 0 <= i < N")
+    return index, count
+
+def historical_costs(results: Iterable[SampleResult]) -> Dict[str, float]:
+    """Mean wall time per design from previous runs."""
+    durations = defaultdict(list)
+    for result in results:
+        durations[result.design].append(result.duration_s)
+    return {design: statistics.fmean(d) for design, d in durations.items()}
+
+def shard_designs(
+    designs: List,
+    index: int,
+    count: int,
+    costs: Optional[Dict[str, float]] = None
+) -> List:
+    """
+    Select the designs belonging to one shard.
+
+    Without costs, designs are sorted by path and dealt round-robin. With
+    costs, designs are assigned longest-first to the least-loaded shard;
+    designs without history are charged the median known cost. Both
+    assignments depend only on the design list and costs, so every node
+    computes the same partition.
+
+    Args:
+        designs: Manifest entries (anything with a `path` attribute)
+        index: Shard index
+        count: Number of shards
+        costs: Optional historical cost per design path
+
+    Returns:
+        The designs of this shard, in path order
+    """
+    ordered = sorted(designs, key=lambda d: d.path)
+    if not costs:
+        return ordered[index::count]
+
+    default_cost = statistics.median(costs.values())
+    loads = [0.0] * count
+    assignment = {}
+    for design in sorted(ordered, key=lambda d: (-costs.get(d.path, default_cost), d.path)):
+        target = min(range(count), key=lambda i: (loads[i], i))
+        loads[target] += costs.get(design.path, default_cost)
+        assignment[design.path] = target
+    return [d for d in ordered if assignment[d.path] == index]
+
+def check_results(
+    results: List[SampleResult],
+    expected_designs: Optional[Iterable[str]] = None,
+    samples: Optional[int] = None
+) -> Dict[str, list]:
+    """
+    Find duplicated and missing samples.
+
+    A sample is expected for every design, every (method, model,
+    temperature) configuration seen in the results, and every sample
+    index up to `samples` (or the largest index seen).
+
+    Args:
+        results: Merged results
+        expected_designs: Design paths that should be covered
+        samples: Number of samples per design and configuration
+
+    Returns:
+        Dictionary with 'duplicates' and 'missing' sample keys
+    """
+    seen = defaultdict(int)
+    for result in results:
+        seen[result.key] += 1
+    duplicates = sorted(k for k, n in seen.items() if n > 1)
+
+    designs = set(expected_designs) if expected_designs is not None else {r.design for r in results}
+    configs = {(r.method, r.model, r.temperature) for r in results}
+    sample_count = samples or (max((r.sample for r in results), default=-1) + 1)
+
+    missing = sorted(
+        (design, method, model, temperature, sample)
+        for design in designs
+        for method, model, temperature in configs
+        for sample in range(sample_count)
+        if (design, method, model, temperature, sample) not in seen
+    )
+    return {"duplicates": duplicates, "missing": missing}
+
+def summarize(results: List[SampleResult]) -> List[str]:
+    """Pass-rate table per (method, model, temperature)."""
+    groups = defaultdict(list)
+    for result in results:
+        groups[(result.method, result.model, result.temperature)].append(result)
+    lines = [f"{'method':<10}{'model':<12}{'temp':>6}{'samples':>9}{'passed':>8}{'rate':>8}"]
+    for (method, model, temperature), group in sorted(groups.items()):
+        passed = sum(r.passed for r in group)
+        lines.append(
+            f"{method:<10}{model:<12}{temperature:>6.2f}{len(group):>9}"
+            f"{passed:>8}{passed / len(group):>8.1%}"
+        )
+    return lines
+
+def merge_results(
+    paths: List[Path],
+    output_path: Optional[Path] = None,
+    expected_designs: Optional[Iterable[str]] = None,
+    samples: Optional[int] = None
+) -> Tuple[List[SampleResult], Dict[str, list]]:
+    """
+    Combine per-shard result stores and validate coverage.
+
+    Args:
+        paths: Per-shard result stores
+        output_path: Where to write the merged store (optional)
+        expected_designs: Design paths that should be covered
+        samples: Number of samples per design and configuration
+
+    Returns:
+        Tuple of (merged results, problems from check_results)
+    """
+    results = sorted(load_results(paths), key=lambda r: r.key)
+    problems = check_results(results, expected_designs, samples)
+    if output_path:
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(
+            "".join(json.dumps(asdict(r)) + "\n" for r in results),
+            encoding="utf-8"
+        )
+    return results, problems
+
+def main() -> None:
+    """Command-line entry point for merging shard result stores."""
+    parser = argparse.ArgumentParser(description="Evaluation result tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    merge = subparsers.add_parser("merge", help="Merge per-shard result stores")
+    merge.add_argument("stores", nargs="+", type=Path, help="Result store files")
+    merge.add_argument("-o", "--output", type=Path, help="Merged result store to write")
+    merge.add_argument(
+        "-d", "--directory",
+        type=str,
+        help="Expect every manifest design under this RTLLM subdirectory"
+    )
+    merge.add_argument("--samples", type=int, help="Expected samples per design")
+    merge.add_argument(
+        "--allow-partial",
+        action="store_true",
+        help="Exit successfully even if samples are missing or duplicated"
+    )
+    args = parser.parse_args()
+
+    expected = None
+    if args.directory is not None:
+        from .manifest import load_manifest, filter_designs
+        rtllm_dir = Path(__file__).parent.parent / "RTLLM"
+        expected = [d.path for d in filter_designs(load_manifest(rtllm_dir), prefix=args.directory)]
+
+    results, problems = merge_results(args.stores, args.output, expected, args.samples)
+    print(f"Merged {len(results)} results from {len(args.stores)} stores")
+    print("\n".join(summarize(results)))
+
+    for kind in ("duplicates", "missing"):
+        if problems[kind]:
+            print(f"\n{len(problems[kind])} {kind} samples:")
+            for key in problems[kind][:20]:
+                print(f"  {key}")
+            if len(problems[kind]) > 20:
+                print(f"  ... and {len(problems[kind]) - 20} more")
+
+    if (problems["duplicates"] or problems["missing"]) and not args.allow_partial:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Reference selection for RAG-enhanced generation.
+
+This module turns the raw nearest neighbours of a design prompt into a
+bounded reference context:
+1. Candidates below a relevance threshold are dropped
+2. The remaining candidates are reranked with maximal marginal relevance
+   (MMR) so the top-k references are relevant but not near-duplicates
+3. Each reference is trimmed to its module header and key logic
+4. References are packed into a configurable token budget
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+import hashlib
+import re
+
+import numpy as np
+
+# Rough token estimate for code and English text
+CHARS_PER_TOKEN = 4
+MAX_SUMMARY_CHARS = 400
+# Metadata field tying a generated corpus document to its design description
+DESCRIPTION_KEY = "description_key"
+
+KEY_LOGIC_RE = re.compile(
+    r"^\s*(always|assign|case[xz]?|endcase|parameter|localparam|function|endfunction|generate|endgenerate)\b"
+    r"|<=|^\s*(if|else)\b"
+)
+
+@dataclass
+class RetrievedDesign:
+    """A candidate reference design from the RAG corpus."""
+    summary: str
+    code: str
+    relevance: float
+    embedding: Optional[np.ndarray] = None
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of a text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def description_key(description: str) -> str:
+    """Key of a design description, shared by its prompts and generated documents."""
+    return hashlib.sha256(description.strip().encode("utf-8")).hexdigest()[:16]
+
+def split_document(content: str, metadata: Optional[dict] = None) -> tuple[str, str]:
+    """
+    Split a corpus document into its summary and Verilog code.
+
+    Returns:
+        Tuple of (summary, code)
+    """
+    if "Summary:" in content and "Verilog Implementation:" in content:
+        summary, code = content.split("Verilog Implementation:", 1)
+        return summary.replace("Summary:", "").strip(), code.strip()
+    # Fallback for old format
+    return content, (metadata or {}).get("code", "")
+
+def mmr_rerank(
+    query: np.ndarray,
+    candidates: Sequence[RetrievedDesign],
+    k: int,
+    lambda_mult: float = 0.7
+) -> List[RetrievedDesign]:
+    """
+    Select k candidates by maximal marginal relevance.
+
+    Each step picks the candidate maximising
+    lambda * relevance - (1 - lambda) * max similarity to already selected
+    candidates. Candidates without embeddings are ranked by relevance only.
+
+    Args:
+        query: Query embedding (unused when candidates carry no embeddings)
+        candidates: Candidates sorted by relevance
+        k: Number of candidates to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        Selected candidates in selection order
+    """
+    if not candidates or any(c.embedding is None for c in candidates):
+        return sorted(candidates, key=lambda c: -c.relevance)[:k]
+
+    vectors = np.stack([c.embedding for c in candidates]).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    pairwise = vectors @ vectors.T
+    relevance = np.array([c.relevance for c in candidates], dtype=np.float32)
+
+    selected: List[int] = []
+    remaining = list(range(len(candidates)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return [candidates[i] for i in selected]
+
+def _strip_verilog_comments(code: str) -> List[str]:
+    """Code lines without comments, trailing whitespace and blank lines."""
+    code = re.sub(r"/\*.*?\*/", "", code, flags=re.DOTALL)
+    lines = (re.sub(r"//.*", "", line).rstrip() for line in code.splitlines())
+    return [line for line in lines if line.strip()]
+
+def trim_verilog(code: str, max_lines: int) -> str:
+    """
+    Trim Verilog code to its module header and key logic.
+
+    The header (everything up to the end of the port list) is always kept.
+    If the rest is too long, only lines with key logic (always/assign
+    blocks, case statements, parameters, non-blocking assignments and
+    conditions) are kept, with `// ...` marking omitted code.
+
+    Args:
+        code: Verilog source
+        max_lines: Maximum number of lines to return
+
+    Returns:
+        Trimmed source
+    """
+    lines = _strip_verilog_comments(code)
+    if len(lines) <= max_lines:
+        return "\n".join(lines)
+
+    header_end = next((i for i, line in enumerate(lines) if ");" in line), 0) + 1
+    header = lines[:header_end]
+    body = []
+    skipped = False
+    budget = max(max_lines - len(header) - 2, 0)
+    for line in lines[header_end:]:
+        if len(body) >= budget:
+            if not skipped:
+                body.append("    // ...")
+            break
+        if KEY_LOGIC_RE.search(line) or line.strip() in ("begin", "end"):
+            body.append(line)
+            skipped = False
+        elif not skipped:
+            body.append("    // ...")
+            skipped = True
+    if body and body[-1].strip() == "endmodule":
+        body.pop()
+    return "\n".join(header + body + ["endmodule"])
+
+def format_reference(design: RetrievedDesign, index: int, max_lines: int) -> str:
+    """Format one reference design for the generation prompt."""
+    summary = design.summary
+    if len(summary) > MAX_SUMMARY_CHARS:
+        summary = summary[:MAX_SUMMARY_CHARS].rsplit(" ", 1)[0] + " ..."
+    return (
+        f"Reference {index} (similarity score: {design.relevance:.3f})\n"
+        f"Summary: {summary}\n\nCode:\n{trim_verilog(design.code, max_lines)}"
+    )
+
+def assemble_context(
+    designs: Sequence[RetrievedDesign],
+    token_budget: int,
+    max_lines: int
+) -> str:
+    """
+    Pack reference designs into a token budget, most relevant first.
+
+    A reference that does not fit is re-trimmed to fewer lines before it is
+    dropped, so the first reference is included whenever possible.
+
+    Args:
+        designs: Selected references in priority order
+        token_budget: Maximum estimated tokens for the whole context
+        max_lines: Maximum code lines per reference
+
+    Returns:
+        Reference context, or an empty string if nothing fits
+    """
+    parts: List[str] = []
+    used = 0
+    for design in designs:
+        lines = max_lines
+        while lines >= 10:
+            text = format_reference(design, len(parts) + 1, lines)
+            if used + estimate_tokens(text) <= token_budget:
+                parts.append(text)
+                used += estimate_tokens(text)
+                break
+            lines //= 2
+    return "\n\n".join(parts)
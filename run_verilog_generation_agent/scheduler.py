@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Duration-aware scheduling of benchmark samples.
+
+A sweep finishes when its slowest worker does, so the samples are run
+longest-first (LPT) on a fixed worker pool. Durations are estimated from
+previous runs and refined online as samples complete:
+1. A sample of a (design, method, model) seen before is estimated by the
+   moving average of its past wall times
+2. Otherwise it is composed from the expected iteration count of the
+   design and method, the model's LLM time per iteration, and the
+   design's calibrated simulation runtime
+
+Pending samples are kept in one max-heap per model, so picking the next
+sample does not re-estimate the whole sweep; samples with equal estimates
+are spread over the models to keep every provider busy.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import heapq
+import itertools
+import statistics
+import threading
+
+from .results import SampleResult
+
+EWMA_ALPHA = 0.3  # weight of the newest observation
+DEFAULT_LLM_S = 20.0  # LLM seconds per iteration before anything is known
+DEFAULT_SIM_S = 1.0  # simulation seconds per iteration for uncalibrated designs
+
+@dataclass
+class ScheduledTask:
+    """One sample to run: a design under a method and model."""
+    design: Any  # manifest entry
+    sample: int
+    method: str
+    model: str
+    payload: Any = None  # caller data, e.g. the matrix run
+
+class DurationModel:
+    """Online estimate of sample wall times."""
+
+    def __init__(
+        self,
+        history: Iterable[SampleResult] = (),
+        sim_runtimes: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            history: Results of previous runs
+            sim_runtimes: Calibrated simulation seconds per design path
+        """
+        self.sim_runtimes = dict(sim_runtimes or {})
+        self._durations: Dict[Tuple[str, str, str], float] = {}
+        self._iterations: Dict[Tuple[str, str], float] = {}
+        self._method_iterations: Dict[str, float] = {}
+        self._llm_per_iteration: Dict[str, float] = {}
+        self._mean_llm_s = DEFAULT_LLM_S  # for models without history
+        self._lock = threading.Lock()
+        for result in history:
+            self._observe(result)
+
+    @staticmethod
+    def _ewma(table: dict, key: Any, value: float) -> None:
+        previous = table.get(key)
+        table[key] = value if previous is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * previous
+
+    def _observe(self, result: SampleResult) -> None:
+        if result.duration_s <= 0:
+            return
+        iterations = max(result.iterations, 1)
+        sim_s = self.sim_runtimes.get(result.design, DEFAULT_SIM_S)
+        self._ewma(self._durations, (result.design, result.method, result.model), result.duration_s)
+        self._ewma(self._iterations, (result.design, result.method), iterations)
+        self._ewma(self._method_iterations, result.method, iterations)
+        self._ewma(
+            self._llm_per_iteration, result.model,
+            max(result.duration_s / iterations - sim_s, 0.0)
+        )
+        self._mean_llm_s = statistics.fmean(self._llm_per_iteration.values())
+
+    def observe(self, result: SampleResult) -> None:
+        """Update the estimates with a completed sample; safe to call from worker threads."""
+        with self._lock:
+            self._observe(result)
+
+    def _estimate(self, design: str, method: str, model: str) -> float:
+        known = self._durations.get((design, method, model))
+        if known is not None:
+            return known
+        iterations = self._iterations.get(
+            (design, method), self._method_iterations.get(method, 1.0)
+        )
+        llm_s = self._llm_per_iteration.get(model, self._mean_llm_s)
+        return iterations * (llm_s + self.sim_runtimes.get(design, DEFAULT_SIM_S))
+
+    def estimate(self, design: str, method: str, model: str) -> float:
+        """Expected wall time in seconds of one sample."""
+        with self._lock:
+            return self._estimate(design, method, model)
+
+    def estimates(self, keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Tuple[float, bool]]:
+        """Estimate and whether it comes from the key's own history, for many (design, method, model) keys."""
+        with self._lock:
+            return {key: (self._estimate(*key), key in self._durations) for key in keys}
+
+    def task_estimate(self, task: ScheduledTask) -> float:
+        return self.estimate(task.design.path, task.method, task.model)
+
+def task_key(task: ScheduledTask) -> Tuple[str, str, str]:
+    return task.design.path, task.method, task.model
+
+class TaskQueue:
+    """
+    Pending tasks in longest-first order, with one lane per model.
+
+    Tasks of one (design, method, model) share an estimate and form a
+    group; each lane is a max-heap of its groups by estimate, whose stale
+    entries are skipped. The next task comes from the lane with the longest
+    head group; on ties, from the model with the fewest tasks in flight.
+    A completed task re-keys only its own group. Groups without history of
+    their own are estimated from shared averages that every completion
+    moves; they are re-estimated when they reach the head of their lane
+    instead of on every completion. Not thread-safe; run_scheduled
+    serializes access.
+    """
+
+    def __init__(self, tasks: Iterable[ScheduledTask], model: DurationModel):
+        self.model = model
+        self._groups: Dict[Tuple[str, str, str], List[ScheduledTask]] = {}
+        for task in tasks:
+            self._groups.setdefault(task_key(task), []).append(task)
+        for group in self._groups.values():
+            group.reverse()  # popped from the end, in submission order
+        self._lanes: Dict[str, list] = {}
+        self._estimates: Dict[Tuple[str, str, str], float] = {}
+        self._shared = set()  # groups estimated from shared averages
+        self._order = itertools.count()
+        self.in_flight: Dict[str, int] = {}
+        for key in self._groups:
+            self.in_flight.setdefault(key[2], 0)
+        self._rekey(self._groups)
+
+    def __len__(self) -> int:
+        return sum(len(group) for group in self._groups.values())
+
+    def _rekey(self, keys: Iterable[Tuple[str, str, str]]) -> None:
+        for key, (estimate, known) in self.model.estimates(keys).items():
+            if known:
+                self._shared.discard(key)
+            else:
+                self._shared.add(key)
+            if self._estimates.get(key) != estimate:
+                self._estimates[key] = estimate
+                heapq.heappush(self._lanes.setdefault(key[2], []), (-estimate, next(self._order), key))
+
+    def _head(self, lane: str) -> Optional[Tuple[float, Tuple[str, str, str]]]:
+        heap = self._lanes[lane]
+        while heap:
+            negative, _, key = heap[0]
+            if key not in self._groups or self._estimates[key] != -negative:
+                heapq.heappop(heap)  # stale entry
+            elif key in self._shared and self.model.estimate(*key) != -negative:
+                heapq.heappop(heap)
+                self._rekey([key])
+            else:
+                return -negative, key
+        return None
+
+    def pop(self) -> Optional[ScheduledTask]:
+        """Take the next task, or None when none is left."""
+        best = None
+        for lane in self._lanes:
+            head = self._head(lane)
+            if head is not None:
+                rank = (head[0], -self.in_flight[lane])
+                if best is None or rank > best[0]:
+                    best = (rank, head[1])
+        if best is None:
+            return None
+        key = best[1]
+        group = self._groups[key]
+        task = group.pop()
+        if not group:
+            del self._groups[key]
+            self._shared.discard(key)
+            del self._estimates[key]
+        self.in_flight[key[2]] += 1
+        return task
+
+    def done(self, task: ScheduledTask, result: SampleResult) -> None:
+        """Record a completed task and re-key the groups its result affects."""
+        self.in_flight[task.model] -= 1
+        self.model.observe(result)
+        key = task_key(task)
+        if key in self._groups:
+            self._rekey([key])
+
+def predict_makespan(durations: Iterable[float], workers: int) -> float:
+    """Finishing time of longest-first list scheduling on identical workers."""
+    loads = [0.0] * max(workers, 1)
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+def run_scheduled(
+    tasks: List[ScheduledTask],
+    execute: Callable[[ScheduledTask], SampleResult],
+    model: DurationModel,
+    workers: int,
+    logger: Any
+) -> List[SampleResult]:
+    """
+    Run tasks longest-first on a pool of worker threads.
+
+    Each idle worker takes the pending task with the largest current
+    estimate, spreading equal estimates over the models (see TaskQueue).
+    Estimates are updated after every completed task, so the remaining
+    order adapts to what the run observes.
+
+    Args:
+        tasks: Samples to run
+        execute: Runs one task and returns its result (must not raise)
+        model: Duration model, updated online
+        workers: Number of worker threads
+        logger: Logger instance
+
+    Returns:
+        Results in completion order
+    """
+    workers = max(1, min(workers, len(tasks)))
+    estimates = [model.task_estimate(t) for t in tasks]
+    print(
+        f"Scheduling {len(tasks)} samples on {workers} workers, "
+        f"estimated {sum(estimates):.0f}s of work, makespan ~{predict_makespan(estimates, workers):.0f}s"
+    )
+    logger.info(f"Scheduling {len(tasks)} samples on {workers} workers (longest first)")
+
+    pending = TaskQueue(tasks, model)
+    results: List[SampleResult] = []
+    lock = threading.Lock()
+
+    def next_task() -> Optional[ScheduledTask]:
+        with lock:
+            return pending.pop()
+
+    def worker() -> None:
+        while (task := next_task()) is not None:
+            expected = model.task_estimate(task)
+            result = execute(task)
+            with lock:
+                pending.done(task, result)
+            logger.info(
+                f"{task.design.path} ({task.model}, sample {task.sample}): "
+                f"{result.duration_s:.1f}s, estimated {expected:.1f}s"
+            )
+            with lock:
+                results.append(result)
+
+    threads = [
+        threading.Thread(target=worker, name=f"scheduler-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def sim_runtimes(entries: Iterable[Any]) -> Dict[str, float]:
+    """Calibrated simulation runtime per design path (see calibration.py)."""
+    return {
+        e.path: float(e.reference["runtime_s"])
+        for e in entries
+        if e.reference.get("status") == "ok"
+    }
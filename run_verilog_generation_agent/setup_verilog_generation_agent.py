@@ -8,22 +8,57 @@ This module provides configuration and setup functionality for:
 3. Loading design and reflection prompts
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Any, Tuple, Optional
+from typing import Any, List, Tuple, Optional
+import asyncio
+import inspect
 import logging
+import threading
 import yaml
 import os
 
+import anthropic
+import httpx
 from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI # poetry add langchain-openai
 from langchain_anthropic import ChatAnthropic # poetry add langchain-anthropic
 from langchain_google_genai import ChatGoogleGenerativeAI # poetry add langchain-google-genai 
 from langchain_openai import OpenAIEmbeddings
 
+from .budget import Budget
+from .hedging import HedgeConfig, hedged_client
+
 # Get the directory of this file
 CURRENT_DIR = Path(__file__).parent
+CONFIG_DIR = CURRENT_DIR.parent / "config"
+LOG_RETENTION = 50  # log files kept under logging/
+
+# Connection pool settings shared by every client of a provider
+HTTP_LIMITS = httpx.Limits(
+    max_connections=64,
+    max_keepalive_connections=32,
+    keepalive_expiry=120.0
+)
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+_async_transports: list = []  # transports of the pooled async clients
+
+# Model configs are built once per (provider, temperature, rag_dir, retrieval) and shared
+_model_configs: dict = {}
+_model_configs_lock = threading.Lock()
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    """Configuration for RAG reference selection."""
+    top_k: int = 3  # references included in the prompt
+    fetch_k: int = 20  # nearest neighbours considered for reranking
+    mmr_lambda: float = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+    min_relevance: float = 0.75  # cosine similarity below which hits are dropped
+    context_token_budget: int = 1500  # estimated tokens for all references
+    max_snippet_lines: int = 60  # code lines kept per reference
+    index: str = "chroma"  # 'chroma' or 'flat' (memory-mapped exact search)
 
 @dataclass
 class ModelConfig:
@@ -33,6 +68,7 @@ class ModelConfig:
     embeddings: OpenAIEmbeddings
     rag_persist_directory: str
     system_prompt: str
+    retrieval: RetrievalConfig = field(default_factory=RetrievalConfig)
 
 @dataclass
 class AgentConfig:
@@ -41,13 +77,21 @@ class AgentConfig:
     design_prompt: str
     verilog_reflection_prompt: str
     working_dir: Path
+    output_dir: Optional[Path] = None  # where design.v is written; defaults to working_dir
+    interactive: bool = True  # ask for confirmation before reflecting and regenerating
+    branches: int = 1  # candidate repairs generated and simulated concurrently per iteration
+    branch_temperatures: Optional[List[float]] = None  # per-branch temperatures; None keeps the model's
+    budget: Optional[Budget] = None  # token, wall-time and simulation limits of the design
 
-def create_logger(name: str = 'Verilog Generation Tool') -> logging.Logger:
+def create_logger(name: str = 'Verilog Generation Tool', keep: int = LOG_RETENTION) -> logging.Logger:
     """
     Create and configure a logger for the Verilog generation process.
     
+    Only the newest `keep` log files are retained under logging/.
+    
     Args:
         name: Name for the logger instance
+        keep: Number of log files to keep, including the new one
         
     Returns:
         Configured logger instance
@@ -61,6 +105,11 @@ def create_logger(name: str = 'Verilog Generation Tool') -> logging.Logger:
     log_dir = CURRENT_DIR.parent / "logging"
     log_dir.mkdir(exist_ok=True)
     
+    # Drop the oldest logs (timestamped names sort chronologically)
+    old_logs = sorted(log_dir.glob("*.log"))
+    for old_log in old_logs[:max(len(old_logs) - keep + 1, 0)]:
+        old_log.unlink(missing_ok=True)
+    
     log_file = log_dir / f"{timestamp}.log"
     log_file.touch()
     
@@ -81,10 +130,13 @@ def create_logger(name: str = 'Verilog Generation Tool') -> logging.Logger:
     
     return logger
 
-def load_reflection_prompt(config_dir: Path = CURRENT_DIR.parent.parent / "config") -> str:
+@lru_cache(maxsize=None)
+def load_reflection_prompt(config_dir: Path = CONFIG_DIR) -> str:
     """
     Load reflection prompt from YAML configuration.
     
+    The file is read once per process; later calls return the cached prompt.
+    
     Args:
         config_dir: Path to the config directory
         
@@ -112,10 +164,13 @@ def load_reflection_prompt(config_dir: Path = CURRENT_DIR.parent.parent / "confi
         
     return config['verilog_reflection_prompt']
 
-def load_system_prompt(config_dir: Path = CURRENT_DIR.parent / "config") -> str:
+@lru_cache(maxsize=None)
+def load_system_prompt(config_dir: Path = CONFIG_DIR) -> str:
     """
     Load system prompt from YAML configuration.
     
+    The file is read once per process; later calls return the cached prompt.
+    
     Args:
         config_dir: Path to the config directory
         
@@ -143,82 +198,238 @@ def load_system_prompt(config_dir: Path = CURRENT_DIR.parent / "config") -> str:
         
     return config['system_prompt']
 
-def create_model_config(
-    provider: str = "openai",
-    temperature: float = 0.7,
-    rag_dir: str = str(CURRENT_DIR / "rag_dataset" / "chroma")
-) -> ModelConfig:
+@lru_cache(maxsize=None)
+def get_http_client(provider: str) -> httpx.Client:
     """
-    Create model configuration for specified provider.
+    Get the pooled keep-alive HTTP transport for a provider.
+    
+    One client is created per provider and reused by every chat model and
+    embedding client talking to that provider, so TLS sessions and open
+    connections survive across designs, categories and worker threads.
+    
+    Args:
+        provider: Model provider name
+        
+    Returns:
+        Shared httpx client
+    """
+    return httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+class LoopPooledTransport(httpx.AsyncBaseTransport):
+    """
+    Async transport with one keep-alive connection pool per event loop.
+    
+    Async connections belong to the loop that opened them, and every
+    iteration of the speculative repairs runs on a new loop, so one shared
+    AsyncClient keeps a pool for each loop it is used on. Code running a
+    short-lived loop closes its pools with release_async_connections before
+    the loop ends; pools of loops closed without that are dropped when the
+    next loop opens one.
+    """
+    
+    def __init__(self):
+        self._pools: dict = {}  # event loop -> httpx.AsyncHTTPTransport
+        self._lock = threading.Lock()
+    
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                # Connections of a closed loop cannot be reused (or closed gracefully)
+                self._pools = {l: p for l, p in self._pools.items() if not l.is_closed()}
+                pool = self._pools[loop] = httpx.AsyncHTTPTransport(limits=HTTP_LIMITS)
+            return pool
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+    
+    async def aclose(self) -> None:
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+@lru_cache(maxsize=None)
+def get_async_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Get the pooled keep-alive async HTTP client for a provider.
+    
+    The async counterpart of get_http_client, used by ainvoke calls (e.g.
+    the speculative repair branches); connections are pooled per event loop.
+    
+    Args:
+        provider: Model provider name
+        
+    Returns:
+        Shared httpx async client
+    """
+    transport = LoopPooledTransport()
+    _async_transports.append(transport)
+    return httpx.AsyncClient(transport=transport, timeout=HTTP_TIMEOUT)
+
+async def release_async_connections() -> None:
+    """Close the connections the pooled async clients opened on the running event loop."""
+    for transport in list(_async_transports):
+        await transport.aclose()
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> OpenAIEmbeddings:
+    """
+    Get the process-wide embeddings client used for RAG.
+    
+    Returns:
+        Shared OpenAIEmbeddings instance
+    """
+    return OpenAIEmbeddings(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        http_client=get_http_client("openai"),
+        http_async_client=get_async_http_client("openai")
+    )
+
+def _pool_anthropic_clients(client: ChatAnthropic, provider: str) -> None:
+    """
+    Give a ChatAnthropic model SDK clients on the pooled transports.
+    
+    ChatAnthropic has no http_client option; it builds its sync and async
+    SDK clients lazily in the cached properties _client and _async_client.
+    Both are built here from the model's public settings and stored in
+    their place. A langchain-anthropic version without these cached
+    properties keeps its own (unpooled) clients.
+    """
+    if not all(
+        isinstance(inspect.getattr_static(ChatAnthropic, name, None), cached_property)
+        for name in ("_client", "_async_client")
+    ):
+        logging.getLogger(__name__).warning(
+            "ChatAnthropic no longer builds its SDK clients lazily; Anthropic calls are not pooled"
+        )
+        return
+    params: dict = {
+        "api_key": client.anthropic_api_key.get_secret_value(),
+        "base_url": client.anthropic_api_url,
+        "max_retries": client.max_retries,
+        "default_headers": client.default_headers or None
+    }
+    # As in ChatAnthropic: a non-positive timeout means the pool's timeout
+    if client.default_request_timeout is None or client.default_request_timeout > 0:
+        params["timeout"] = client.default_request_timeout
+    client.__dict__["_client"] = anthropic.Client(**params, http_client=get_http_client(provider))
+    client.__dict__["_async_client"] = anthropic.AsyncClient(
+        **params, http_client=get_async_http_client(provider)
+    )
+
+def create_chat_client(provider: str, temperature: float) -> BaseChatModel:
+    """
+    Create a chat client for the specified provider on its pooled transport.
     
     Args:
         provider: Model provider ('openai', 'anthropic', or 'gemini')
         temperature: Temperature parameter for generation
-        rag_dir: Directory for RAG dataset
         
     Returns:
-        ModelConfig instance
+        Chat model instance
         
     Raises:
         ValueError: If provider is invalid
     """
-    # Create embeddings for RAG
-    embeddings = OpenAIEmbeddings(api_key=os.getenv('OPENAI_API_KEY'))
-    
-    # Load system prompt
-    system_prompt = load_system_prompt()
-    
-    # Setup provider-specific clients
     if provider == "openai":
-        generation_client = ChatOpenAI(
+        return ChatOpenAI(
             api_key=os.getenv('OPENAI_API_KEY'),
             model="gpt-4o",
-            temperature=temperature
-        )
-        reflection_client = ChatOpenAI(
-            api_key=os.getenv('OPENAI_API_KEY'),
-            model="gpt-4o",
-            temperature=temperature
+            temperature=temperature,
+            http_client=get_http_client(provider),
+            http_async_client=get_async_http_client(provider)
         )
     elif provider == "anthropic":
-        generation_client = ChatAnthropic(
-            anthropic_api_key=os.getenv('ANTHROPIC_API_KEY'),
-            model="claude-3-sonnet-20240229",
-            temperature=temperature
-        )
-        reflection_client = ChatAnthropic(
+        client = ChatAnthropic(
             anthropic_api_key=os.getenv('ANTHROPIC_API_KEY'),
             model="claude-3-sonnet-20240229",
             temperature=temperature
         )
+        _pool_anthropic_clients(client, provider)
+        return client
     elif provider == "gemini":
-        generation_client = ChatGoogleGenerativeAI(
-            google_api_key=os.getenv('GOOGLE_API_KEY'),
-            model="gemini-pro",
-            temperature=temperature
-        )
-        reflection_client = ChatGoogleGenerativeAI(
+        # The Google client manages its own persistent gRPC channel
+        return ChatGoogleGenerativeAI(
             google_api_key=os.getenv('GOOGLE_API_KEY'),
             model="gemini-pro",
             temperature=temperature
         )
     else:
         raise ValueError(f"Invalid model provider: {provider}")
-            
-    return ModelConfig(
-        generation_client=generation_client,
-        reflection_client=reflection_client,
-        embeddings=embeddings,
-        rag_persist_directory=rag_dir,
-        system_prompt=system_prompt
-    )
+
+def create_model_config(
+    provider: str = "openai",
+    temperature: float = 0.7,
+    rag_dir: str = str(CURRENT_DIR / "rag_dataset" / "chroma"),
+    retrieval: Optional[RetrievalConfig] = None,
+    hedging: Optional[HedgeConfig] = None
+) -> ModelConfig:
+    """
+    Create model configuration for specified provider.
+    
+    Configurations are cached, so repeated calls with the same arguments
+    (e.g. once per category) return the same clients, embeddings and prompts.
+    
+    Args:
+        provider: Model provider ('openai', 'anthropic', or 'gemini')
+        temperature: Temperature parameter for generation
+        rag_dir: Directory for RAG dataset
+        retrieval: RAG reference selection settings (defaults if omitted)
+        hedging: Hedge slow calls (see hedging.py); None disables hedging
+        
+    Returns:
+        ModelConfig instance
+        
+    Raises:
+        ValueError: If provider is invalid
+    """
+    retrieval = retrieval or RetrievalConfig()
+    key = (provider, temperature, rag_dir, retrieval, hedging)
+    with _model_configs_lock:
+        if key in _model_configs:
+            return _model_configs[key]
+        
+        # Generation and reflection use identical settings, so share one client
+        chat_client = create_chat_client(provider, temperature)
+        if hedging:
+            secondary = create_chat_client(hedging.secondary, temperature) if hedging.secondary else None
+            chat_client = hedged_client(chat_client, hedging, secondary)
+        
+        model_config = ModelConfig(
+            generation_client=chat_client,
+            reflection_client=chat_client,
+            embeddings=get_embeddings(),
+            rag_persist_directory=rag_dir,
+            system_prompt=load_system_prompt(),
+            retrieval=retrieval
+        )
+        _model_configs[key] = model_config
+        return model_config
+
+def reload_prompts() -> None:
+    """
+    Re-read the prompt files after they were edited.
+    
+    Cached model configs keep their clients and take the new system prompt;
+    agent configs set up afterwards get the new reflection prompt.
+    """
+    load_reflection_prompt.cache_clear()
+    load_system_prompt.cache_clear()
+    system_prompt = load_system_prompt()
+    with _model_configs_lock:
+        for model_config in _model_configs.values():
+            model_config.system_prompt = system_prompt
 
 def setup_agent(
     working_dir: Path,
     model_provider: str = "openai",
     temperature: float = 0.7,
     max_loops: int = 3,
-    logger: Optional[logging.Logger] = None
+    logger: Optional[logging.Logger] = None,
+    retrieval: Optional[RetrievalConfig] = None,
+    hedging: Optional[HedgeConfig] = None
 ) -> Tuple[ModelConfig, AgentConfig]:
     """
     Set up all components needed for Verilog generation.
@@ -229,18 +440,21 @@ def setup_agent(
         temperature: Temperature for generation
         max_loops: Maximum iterations for agentic flow
         logger: Existing logger to use (optional)
+        retrieval: RAG reference selection settings (optional)
+        hedging: Hedging policy for slow LLM calls (optional)
         
     Returns:
         Tuple of (model config, agent config)
     """
-    # Load configurations
-    config_dir = CURRENT_DIR.parent / "config"
-    reflection_prompt = load_reflection_prompt(config_dir)
+    # Load configurations (cached after the first call)
+    reflection_prompt = load_reflection_prompt(CONFIG_DIR)
     
-    # Setup model
+    # Setup model (shared across categories)
     model_config = create_model_config(
         model_provider,
-        temperature
+        temperature,
+        retrieval=retrieval,
+        hedging=hedging
     )
     
     # Create agent config with empty design prompt - it will be set in process_rtllm_directory
@@ -251,4 +465,4 @@ def setup_agent(
         working_dir=working_dir
     )
     
-    return model_config, agent_config
\ No newline at end of file
+    return model_config, agent_config
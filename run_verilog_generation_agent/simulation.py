@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""
+Shared simulation helpers for the Verilog generation flows.
+
+This module provides:
+1. Running the testbench of a design directory, either in-process (an asyncio
+   subprocess pool on a background event loop) or through the iverilog MCP
+   server for remote use (one tool call per run over a new or a persistent
+   connection, or a submitted job that is polled until it finishes); all
+   share the simulator backends in MCP/simulators.py
+2. Staging a generated design next to a copy of its testbench and data files,
+   so several runs can simulate the same RTLLM design concurrently
+3. A content-addressed cache of simulation results, so identical designs
+   are only simulated once per process
+4. Fail-fast runs that stop at the first failure line of the output, and
+   streaming of the simulator output line by line as it is printed (in
+   process, or as log messages of the MCP server)
+5. arun_verilog_tests, an async counterpart of run_verilog_tests for
+   concurrent callers such as the speculative repair branches: cancelling
+   it kills the simulation (in process, or as a cancelled server-side job)
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from fastmcp import Client
+from mcp import types
+
+from MCP.simulators import TIMEOUT_MESSAGE, simulate
+
+from .budget import Budget
+from .manifest import DESCRIPTION_FILE, GENERATED_FILES, TESTBENCH_FILE
+
+DEFAULT_ENDPOINT = "http://localhost:8000/sse"
+DEFAULT_TIMEOUT_S = 300.0  # budget for designs without a calibrated reference
+JOB_POLL_S = 10.0  # longest single get_result wait on the server
+JOB_RECONNECTS = 5  # consecutive connection failures tolerated while polling a job
+JOB_CANCEL_S = 10.0  # longest wait for a cancel_job call
+
+OutputCallback = Callable[[str], None]  # receives each simulator output line of one run
+
+class SimulationCache:
+    """Thread-safe cache of simulation results keyed by design and testbench content."""
+
+    def __init__(self):
+        self._results: Dict[str, Tuple[bool, str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(working_dir: Path) -> Optional[str]:
+        """
+        Content key of a simulation: design.v, testbench.v and data files.
+
+        Returns:
+            Hex digest, or None if the directory has no design.v
+        """
+        design_file = working_dir / "design.v"
+        if not design_file.exists():
+            return None
+        digest = hashlib.sha256()
+        for path in sorted(_input_files(working_dir)) + [design_file]:
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[bool, str]]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, key: str, result: Tuple[bool, str]) -> None:
+        with self._lock:
+            self._results[key] = result
+
+class _BackgroundLoopBackend:
+    """Backend whose coroutines run on one background event loop shared by all threads."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="simulation", daemon=True
+                ).start()
+            return self._loop
+
+    async def _await_on_loop(self, coro) -> Any:
+        """
+        Await a coroutine run on the background loop from another event loop.
+
+        If the caller is cancelled, the coroutine is cancelled on the
+        background loop and awaited until it has finished (e.g. killed its
+        subprocesses) before the cancellation propagates.
+        """
+        loop = self._get_loop()
+        finished: concurrent.futures.Future = concurrent.futures.Future()
+        tasks = []
+
+        def start() -> None:
+            task = loop.create_task(coro)
+            tasks.append(task)
+            task.add_done_callback(lambda t: finished.done() or finished.set_result(t))
+
+        loop.call_soon_threadsafe(start)
+        waiter = asyncio.wrap_future(finished)
+        try:
+            task = await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # Scheduled after start, so the task exists
+            loop.call_soon_threadsafe(lambda: tasks[0].cancel())
+            await waiter
+            raise
+        return task.result()
+
+class LocalSimulationBackend(_BackgroundLoopBackend):
+    """
+    Runs simulations in this process.
+
+    Compile and simulation subprocesses are driven by one background event
+    loop shared by all threads, with at most max_workers simulations running
+    at a time.
+    """
+
+    def __init__(self, max_workers: int):
+        super().__init__()
+        self.max_workers = max_workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _simulate(
+        self,
+        working_dir: Path,
+        simulator: str,
+        timeout: Optional[float],
+        trace: bool,
+        fail_fast: bool,
+        on_output: Optional[OutputCallback]
+    ) -> dict:
+        # Created on the loop thread, the only thread that touches it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def emit(line: str) -> None:
+            on_output(line.rstrip("\n"))
+
+        async with self._semaphore:
+            return await simulate(
+                working_dir, simulator, timeout=timeout, trace=trace,
+                fail_fast=fail_fast, on_output=emit if on_output else None
+            )
+
+    def run(
+        self,
+        working_dir: Path,
+        logger,
+        simulator: str,
+        timeout: Optional[float] = None,
+        trace: bool = False,
+        fail_fast: bool = False,
+        on_output: Optional[OutputCallback] = None
+    ) -> tuple[bool, str, float]:
+        """Compile and simulate working_dir, returning (ran, output with any failure trace, subprocess CPU seconds)."""
+        try:
+            future = asyncio.run_coroutine_threadsafe(
+                self._simulate(working_dir, simulator, timeout, trace, fail_fast, on_output), self._get_loop()
+            )
+            result = future.result()
+            return True, with_trace(result), sim_cpu_seconds(result)
+        except Exception as e:
+            error_msg = f"Error running tests: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, 0.0
+
+    async def arun(
+        self,
+        working_dir: Path,
+        logger,
+        simulator: str,
+        timeout: Optional[float] = None,
+        trace: bool = False,
+        fail_fast: bool = False,
+        on_output: Optional[OutputCallback] = None
+    ) -> tuple[bool, str, float]:
+        """Like run, awaited on the caller's event loop; cancelling it kills the simulation."""
+        try:
+            result = await self._await_on_loop(
+                self._simulate(working_dir, simulator, timeout, trace, fail_fast, on_output)
+            )
+            return True, with_trace(result), sim_cpu_seconds(result)
+        except Exception as e:
+            error_msg = f"Error running tests: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, 0.0
+
+class _MCPJobRuns:
+    """Async runs of the MCP backends, as server-side jobs that can be cancelled."""
+
+    endpoint: str
+
+    async def arun(
+        self,
+        working_dir: Path,
+        logger,
+        simulator: str,
+        timeout: Optional[float] = None,
+        trace: bool = False,
+        fail_fast: bool = False,
+        on_output: Optional[OutputCallback] = None
+    ) -> tuple[bool, str, float]:
+        """
+        Run working_dir as a job, returning (ran, output with any failure trace, subprocess CPU seconds).
+
+        Cancelling the run cancels the job, which kills its simulator on the
+        server; output is not streamed.
+        """
+        return await run_verilog_job_mcp(working_dir, logger, self.endpoint, simulator, timeout, trace, fail_fast)
+
+class MCPSimulationBackend(_MCPJobRuns):
+    """Runs simulations through the iverilog MCP server."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def run(
+        self,
+        working_dir: Path,
+        logger,
+        simulator: str,
+        timeout: Optional[float] = None,
+        trace: bool = False,
+        fail_fast: bool = False,
+        on_output: Optional[OutputCallback] = None
+    ) -> tuple[bool, str, float]:
+        """Compile and simulate working_dir on the server, returning (ran, output with any failure trace, subprocess CPU seconds)."""
+        return asyncio.run(run_verilog_tests_mcp(
+            working_dir, logger, self.endpoint, simulator, timeout, trace, fail_fast, on_output
+        ))
+
+class MCPSessionBackend(_MCPJobRuns, _BackgroundLoopBackend):
+    """
+    Runs simulations through one persistent connection to the iverilog MCP server.
+
+    The connection is opened on first use and shared by all threads, saving
+    the SSE handshake MCPSimulationBackend pays per run; a dropped
+    connection is reopened once per run. Streamed output lines are routed
+    to their run by the working directory they are logged under.
+    """
+
+    def __init__(self, endpoint: str):
+        super().__init__()
+        self.endpoint = endpoint
+        self._client: Optional[Client] = None
+        self._listeners: Dict[str, OutputCallback] = {}
+
+    async def _on_log(self, message: types.LoggingMessageNotificationParams) -> None:
+        listener = self._listeners.get(message.logger or "")
+        if listener:
+            listener(str(message.data))
+
+    async def _disconnect(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await client.__aexit__(None, None, None)
+            except Exception:
+                pass  # the connection is already gone
+
+    async def _call(self, arguments: dict) -> list:
+        for attempt in range(2):
+            try:
+                if self._client is None:
+                    client = Client(self.endpoint, log_handler=self._on_log)
+                    await client.__aenter__()
+                    self._client = client
+                return await self._client.call_tool("run_verilog_tests", arguments)
+            except Exception:
+                await self._disconnect()
+                if attempt:
+                    raise
+
+    def run(
+        self,
+        working_dir: Path,
+        logger,
+        simulator: str,
+        timeout: Optional[float] = None,
+        trace: bool = False,
+        fail_fast: bool = False,
+        on_output: Optional[OutputCallback] = None
+    ) -> tuple[bool, str, float]:
+        """Compile and simulate working_dir on the server, returning (ran, output with any failure trace, subprocess CPU seconds)."""
+        arguments = tool_arguments(working_dir, simulator, timeout, trace, fail_fast, on_output is not None)
+        if on_output:
+            self._listeners[str(working_dir)] = on_output
+        try:
+            result = asyncio.run_coroutine_threadsafe(self._call(arguments), self._get_loop()).result()
+            return (True,) + tool_result(result[0])
+        except Exception as e:
+            error_msg = f"Error running tests: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, 0.0
+        finally:
+            self._listeners.pop(str(working_dir), None)
+
+    def close(self) -> None:
+        """Close the connection (it is reopened by the next run)."""
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._disconnect(), self._loop).result()
+
+class MCPJobBackend(_MCPJobRuns):
+    """
+    Runs simulations as jobs on the iverilog MCP server.
+    
+    The job is submitted once and its result collected with long-polling
+    get_result calls, so a dropped connection only costs a reconnect.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def run(
+        self,
+        working_dir: Path,
+        logger,
+        simulator: str,
+        timeout: Optional[float] = None,
+        trace: bool = False,
+        fail_fast: bool = False,
+        on_output: Optional[OutputCallback] = None
+    ) -> tuple[bool, str, float]:
+        """Submit working_dir as a job and wait for it, returning (ran, output with any failure trace, subprocess CPU seconds); output is not streamed."""
+        return asyncio.run(run_verilog_job_mcp(working_dir, logger, self.endpoint, simulator, timeout, trace, fail_fast))
+
+@dataclass
+class SimulationConfig:
+    """Configuration for running testbenches."""
+    backend: str = "local"  # 'local' (in-process), 'mcp', 'mcp-session' or 'mcp-jobs' (MCP server at endpoint)
+    endpoint: str = DEFAULT_ENDPOINT
+    simulator: str = "auto"  # 'icarus', 'verilator' or 'auto' (chosen per design)
+    max_workers: int = os.cpu_count() or 4  # concurrent local simulations
+    cache: Optional[SimulationCache] = field(default_factory=SimulationCache)
+    default_timeout: Optional[float] = DEFAULT_TIMEOUT_S
+    # Calibrated references keyed by testbench SHA-256 (see calibration.reference_index)
+    references: Dict[str, dict] = field(default_factory=dict)
+    trace: bool = False  # re-run failing designs with a port trace around the first mismatch
+    fail_fast: bool = False  # stop simulations at the first line matching the design's failure patterns
+    # Receives (working directory, line) for every simulator output line as it is printed
+    on_output: Optional[Callable[[Path, str], None]] = None
+
+    def __post_init__(self):
+        if self.backend == "local":
+            self.runner = LocalSimulationBackend(self.max_workers)
+        elif self.backend == "mcp":
+            self.runner = MCPSimulationBackend(self.endpoint)
+        elif self.backend == "mcp-session":
+            self.runner = MCPSessionBackend(self.endpoint)
+        elif self.backend == "mcp-jobs":
+            self.runner = MCPJobBackend(self.endpoint)
+        else:
+            raise ValueError(f"Unknown simulation backend: {self.backend}")
+
+    def reference_for(self, working_dir: Path) -> Optional[dict]:
+        """Calibrated reference of the design whose testbench is in working_dir."""
+        testbench = Path(working_dir) / TESTBENCH_FILE
+        if not self.references or not testbench.exists():
+            return None
+        return self.references.get(hashlib.sha256(testbench.read_bytes()).hexdigest())
+
+    def timeout_for(self, working_dir: Path) -> Optional[float]:
+        """Time budget for simulating working_dir."""
+        reference = self.reference_for(working_dir)
+        if reference and reference.get("timeout_s"):
+            return reference["timeout_s"]
+        return self.default_timeout
+
+@lru_cache(maxsize=None)
+def _default_sim_config() -> SimulationConfig:
+    """Uncached local simulation shared by callers without a configuration."""
+    return SimulationConfig(cache=None)
+
+def _input_files(design_dir: Path) -> list:
+    """Testbench and data files a simulation of design_dir depends on."""
+    return [
+        p for p in design_dir.iterdir()
+        if p.is_file()
+        and p.name not in GENERATED_FILES
+        and p.name != DESCRIPTION_FILE
+        and not p.name.startswith("verified_")
+    ]
+
+def stage_design(design_dir: Path, output_dir: Path) -> Path:
+    """
+    Prepare an output directory for simulating a design outside the source tree.
+
+    Hard-links (or, across file systems, copies) testbench.v and any data
+    files the testbench reads. Files already up to date are left alone.
+
+    Args:
+        design_dir: RTLLM design directory
+        output_dir: Directory the generated design.v will be written to
+
+    Returns:
+        The output directory
+    """
+    output_dir = Path(output_dir)
+    if output_dir.resolve() == Path(design_dir).resolve():
+        return output_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for src in _input_files(Path(design_dir)):
+        dst = output_dir / src.name
+        if dst.exists():
+            # Hard links share edits; copies keep the source's size and mtime
+            src_stat, dst_stat = src.stat(), dst.stat()
+            if os.path.samestat(src_stat, dst_stat) or (
+                dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+            ):
+                continue
+            # Never write through a stale hard link into the source tree
+            dst.unlink()
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    return output_dir
+
+def with_trace(result: dict) -> str:
+    """Output of a simulation result, followed by its failure trace if it has one."""
+    if result.get("trace"):
+        return f"{result['output'].rstrip()}\n{result['trace']}\n"
+    return result["output"]
+
+def print_output(working_dir: Path, line: str) -> None:
+    """SimulationConfig.on_output printing each line, prefixed with its design and sample directory."""
+    working_dir = Path(working_dir)
+    print(f"[{working_dir.parent.name}/{working_dir.name}] {line}", flush=True)
+
+def sim_cpu_seconds(result: dict) -> float:
+    """
+    Compiler and simulator CPU seconds of a simulation result.
+
+    Results of servers that predate cpu_s only carry wall seconds, which
+    are used instead.
+    """
+    if "cpu_s" in result:
+        return float(result["cpu_s"] or 0.0)
+    return float(result.get("compile_s") or 0.0) + float(result.get("sim_s") or 0.0)
+
+def tool_output(content: object) -> str:
+    """
+    Extract the compiler/simulator text from an MCP tool result.
+
+    The server returns {"success": ..., "output": ...}; only the output
+    text (and any failure trace) is kept, without the TextContent and JSON
+    wrapping.
+    """
+    text = content.text if isinstance(content, types.TextContent) else str(content)
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError:
+        return text
+    if isinstance(payload, dict) and "output" in payload:
+        return with_trace(payload)
+    return text
+
+def tool_arguments(
+    working_dir: Path,
+    simulator: str,
+    timeout: Optional[float],
+    trace: bool,
+    fail_fast: bool = False,
+    stream: bool = False
+) -> dict:
+    """Arguments of a run_verilog_tests call (submit_job takes all but stream)."""
+    arguments = {"working_dir": str(working_dir), "simulator": simulator, "timeout": timeout or 0, "trace": trace}
+    # Only sent when set, so servers without fail-fast support still accept plain runs
+    if fail_fast:
+        arguments["fail_fast"] = True
+    if stream:
+        arguments["stream"] = True
+    return arguments
+
+async def run_verilog_tests_mcp(
+    working_dir: Path,
+    logger,
+    endpoint: str = DEFAULT_ENDPOINT,
+    simulator: str = "auto",
+    timeout: Optional[float] = None,
+    trace: bool = False,
+    fail_fast: bool = False,
+    on_output: Optional[OutputCallback] = None
+) -> tuple[bool, str, float]:
+    """Compile and run Verilog tests using MCP client in the specified directory."""
+    async def on_log(message: types.LoggingMessageNotificationParams) -> None:
+        if message.logger == str(working_dir):
+            on_output(str(message.data))
+
+    try:
+        async with Client(endpoint, log_handler=on_log if on_output else None) as client:
+            result = await client.call_tool(
+                "run_verilog_tests",
+                tool_arguments(working_dir, simulator, timeout, trace, fail_fast, on_output is not None)
+            )
+
+            return (True,) + tool_result(result[0])
+
+    except Exception as e:
+        error_msg = f"Error running tests: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg, 0.0
+
+def tool_payload(content: object) -> dict:
+    """JSON payload of an MCP tool result."""
+    return json.loads(content.text if isinstance(content, types.TextContent) else str(content))
+
+def tool_result(content: object) -> tuple[str, float]:
+    """Output text and subprocess CPU seconds of a run_verilog_tests tool result."""
+    try:
+        seconds = sim_cpu_seconds(tool_payload(content))
+    except (json.JSONDecodeError, AttributeError):
+        seconds = 0.0
+    return tool_output(content), seconds
+
+async def run_verilog_job_mcp(
+    working_dir: Path,
+    logger,
+    endpoint: str = DEFAULT_ENDPOINT,
+    simulator: str = "auto",
+    timeout: Optional[float] = None,
+    trace: bool = False,
+    fail_fast: bool = False
+) -> tuple[bool, str, float]:
+    """Run Verilog tests as a server-side job, reconnecting while it runs; cancelling the run cancels the job."""
+    try:
+        async with Client(endpoint) as client:
+            result = await client.call_tool(
+                "submit_job", tool_arguments(working_dir, simulator, timeout, trace, fail_fast)
+            )
+            job_id = tool_payload(result[0])["job_id"]
+    except Exception as e:
+        error_msg = f"Error running tests: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg, 0.0
+    
+    try:
+        return await _collect_job(job_id, logger, endpoint)
+    except asyncio.CancelledError:
+        await cancel_job_mcp(job_id, logger, endpoint)
+        raise
+
+async def cancel_job_mcp(job_id: str, logger, endpoint: str = DEFAULT_ENDPOINT) -> None:
+    """Cancel a server-side job, killing its simulator (errors are only logged)."""
+    try:
+        async with Client(endpoint) as client:
+            await asyncio.wait_for(client.call_tool("cancel_job", {"job_id": job_id}), JOB_CANCEL_S)
+    except Exception as e:
+        logger.warning(f"Could not cancel job {job_id}: {str(e)}")
+
+async def _collect_job(job_id: str, logger, endpoint: str) -> tuple[bool, str, float]:
+    """Wait for a job's result with long-polling get_result calls, reconnecting as needed."""
+    failures = 0
+    while True:
+        try:
+            async with Client(endpoint) as client:
+                while True:
+                    result = await client.call_tool("get_result", {"job_id": job_id, "wait": JOB_POLL_S})
+                    payload = tool_payload(result[0])
+                    failures = 0
+                    if payload["status"] == "done":
+                        return True, with_trace(payload["result"]), sim_cpu_seconds(payload["result"])
+                    if payload["status"] not in ("queued", "running"):
+                        error_msg = f"Error running tests: job {job_id} {payload['status']} {payload.get('error', '')}"
+                        logger.error(error_msg)
+                        return False, error_msg.rstrip(), 0.0
+        except Exception as e:
+            failures += 1
+            if failures > JOB_RECONNECTS:
+                error_msg = f"Error running tests: {str(e)}"
+                logger.error(error_msg)
+                return False, error_msg, 0.0
+            logger.warning(f"Lost connection while waiting for job {job_id}, reconnecting: {str(e)}")
+            await asyncio.sleep(min(2 ** failures, 30))
+
+def run_verilog_tests(
+    working_dir: Path,
+    logger,
+    sim_config: Optional[SimulationConfig] = None,
+    budget: Optional[Budget] = None
+) -> tuple[bool, str]:
+    """
+    Compile and run the testbench of a working directory.
+
+    Results of successful tool calls are cached by content, so a design that
+    was already simulated (by another sample, provider or iteration) is not
+    simulated again. Each run is bounded by the design's calibrated time
+    budget (or the default timeout), and by the wall time left in the
+    resource budget, which is charged with the subprocess CPU seconds. With
+    fail_fast, failing designs stop at their first failure line, and their
+    (shorter) output is cached apart from full runs.
+
+    Args:
+        working_dir: Directory with design.v, testbench.v and data files
+        logger: Logger instance
+        sim_config: Simulation configuration (defaults to in-process simulation)
+        budget: Resource budget of the calling sample
+
+    Returns:
+        Tuple of (tool call succeeded, test output or error message)
+    """
+    sim_config = sim_config or _default_sim_config()
+    working_dir = Path(working_dir)
+    key, cached = _cached_run(working_dir, logger, sim_config)
+    if cached:
+        return cached
+    start = time.perf_counter()
+    ran, output, cpu_seconds = sim_config.runner.run(
+        working_dir, logger, sim_config.simulator, *_run_arguments(working_dir, sim_config, budget)
+    )
+    return _finish_run(key, sim_config, budget, ran, output, cpu_seconds, time.perf_counter() - start)
+
+async def arun_verilog_tests(
+    working_dir: Path,
+    logger,
+    sim_config: Optional[SimulationConfig] = None,
+    budget: Optional[Budget] = None
+) -> tuple[bool, str]:
+    """
+    Async counterpart of run_verilog_tests, awaited on the caller's event loop.
+
+    Cancelling it kills the simulation: in-process runs are cancelled on the
+    simulation loop, MCP runs are submitted as jobs and cancelled on the
+    server (so their output is not streamed). A cancelled run is neither
+    cached nor charged.
+
+    Args:
+        working_dir: Directory with design.v, testbench.v and data files
+        logger: Logger instance
+        sim_config: Simulation configuration (defaults to in-process simulation)
+        budget: Resource budget of the calling sample
+
+    Returns:
+        Tuple of (tool call succeeded, test output or error message)
+    """
+    sim_config = sim_config or _default_sim_config()
+    working_dir = Path(working_dir)
+    key, cached = _cached_run(working_dir, logger, sim_config)
+    if cached:
+        return cached
+    start = time.perf_counter()
+    ran, output, cpu_seconds = await sim_config.runner.arun(
+        working_dir, logger, sim_config.simulator, *_run_arguments(working_dir, sim_config, budget)
+    )
+    return _finish_run(key, sim_config, budget, ran, output, cpu_seconds, time.perf_counter() - start)
+
+def _cached_run(working_dir: Path, logger, sim_config: SimulationConfig) -> tuple[Optional[str], Optional[tuple[bool, str]]]:
+    """Cache key of a run and its cached result, if any."""
+    key = SimulationCache.key(working_dir) if sim_config.cache else None
+    if key and sim_config.fail_fast:
+        key += ":fail-fast"
+    cached = sim_config.cache.get(key) if key else None
+    if cached:
+        logger.info(f"Reusing cached simulation result for {working_dir}")
+    return key, cached
+
+def _run_arguments(working_dir: Path, sim_config: SimulationConfig, budget: Optional[Budget]) -> tuple:
+    """Timeout, trace, fail_fast and output callback of a backend run."""
+    timeout = sim_config.timeout_for(working_dir)
+    remaining = budget.remaining_wall_s() if budget else None
+    if remaining is not None:
+        timeout = max(min(timeout or remaining, remaining), 1.0)
+    on_output = sim_config.on_output
+    return (
+        timeout, sim_config.trace, sim_config.fail_fast,
+        (lambda line: on_output(working_dir, line)) if on_output else None
+    )
+
+def _finish_run(
+    key: Optional[str],
+    sim_config: SimulationConfig,
+    budget: Optional[Budget],
+    ran: bool,
+    output: str,
+    cpu_seconds: float,
+    seconds: float
+) -> tuple[bool, str]:
+    """Charge and cache the result of a backend run."""
+    if budget:
+        budget.charge_sim(cpu_seconds, seconds)
+    result = (ran, output)
+    # Timeouts may be caused by load, so they are not cached
+    if key and result[0] and TIMEOUT_MESSAGE not in result[1]:
+        sim_config.cache.put(key, result)
+    return result
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Watch mode: re-evaluate designs as their files are edited.
+
+One long-running process keeps the LLM clients, the simulation backend
+(the in-process subprocess loop, or one persistent MCP connection) and
+the simulation cache warm. It polls the files of the selected designs and
+re-runs only what changed once the edits settle (debounced):
+1. design.v in a design directory or a watched run directory
+   -> re-simulate that design.v
+2. testbench.v or a data file of a design
+   -> re-stage and re-simulate every watched design.v of the design
+3. design_description.txt
+   -> regenerate the design with the selected method and simulate it
+4. config/system_prompt.yml or config/reflection_prompt.yml
+   -> reload the prompts and regenerate every selected design
+
+Regenerated designs are written below runs/watch-<timestamp>/ (or
+--output-dir), which is watched as well, so hand edits of a regenerated
+design are re-simulated too.
+
+Usage:
+    # Re-simulate hand edits of designs and testbenches under RTLLM/Arithmetic
+    poetry run python -m run_verilog_generation_agent.watch -d Arithmetic
+
+    # Also watch the generated designs of a run, simulating everything once at start
+    poetry run python -m run_verilog_generation_agent.watch -d Arithmetic/Adder \
+        --runs runs/2025-05-01_12-00-00 --initial
+
+    # Iterate on prompts: regenerate with the RAG flow whenever a prompt file changes
+    poetry run python -m run_verilog_generation_agent.watch -d Control --method rag --model anthropic
+
+    # Simulate on the MCP server over one persistent connection
+    poetry run python -m run_verilog_generation_agent.watch -d Memory --sim-backend mcp
+
+    # Watch the simulator output of long testbenches as it is printed
+    poetry run python -m run_verilog_generation_agent.watch -d Miscellaneous/RISC-V --stream
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import argparse
+import os
+import time
+
+from .agentic_verilog_generation import run_agentic_generation
+from .artifacts import new_run_id
+from .basic_verilog_generation import basic_generation
+from .manifest import DESCRIPTION_FILE, GENERATED_FILES, DesignEntry, filter_designs, load_manifest
+from .matrix import RUNS_DIR
+from .rag_verilog_generation import rag_generation
+from .results import is_passing_output
+from .setup_verilog_generation_agent import CONFIG_DIR, create_logger, reload_prompts, setup_agent
+from .simulation import DEFAULT_ENDPOINT, SimulationConfig, print_output, run_verilog_tests, stage_design
+
+PROMPT_FILES = ("system_prompt.yml", "reflection_prompt.yml")
+METHODS = ("basic", "rag", "agentic")
+FAILURE_LINES = 6  # output lines shown for a failing design
+
+Stat = Tuple[int, int]  # (mtime_ns, size)
+
+@dataclass
+class WatchConfig:
+    """Configuration of the watch loop and of regeneration."""
+    method: str = "basic"  # 'basic', 'rag' or 'agentic'
+    provider: str = "openai"
+    temperature: float = 0.7
+    max_loops: int = 3  # agentic iterations
+    poll_s: float = 0.1  # interval between file scans
+    debounce_s: float = 0.2  # quiet time after the last change before re-running
+
+def _stat(path: Path) -> Optional[Stat]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class DesignWatcher:
+    """Polls design, testbench and prompt files and re-evaluates what changed."""
+
+    def __init__(
+        self,
+        designs: List[DesignEntry],
+        rtllm_dir: Path,
+        logger: Any,
+        sim_config: SimulationConfig,
+        config: Optional[WatchConfig] = None,
+        run_dirs: Iterable[Path] = (),
+        output_dir: Optional[Path] = None
+    ):
+        """
+        Args:
+            designs: Selected designs
+            rtllm_dir: Root RTLLM directory
+            logger: Logger instance
+            sim_config: Simulation configuration (its backend stays warm)
+            config: Watch and regeneration settings
+            run_dirs: Run directories whose generated design.v files are watched
+            output_dir: Where regenerated designs are written
+        """
+        self.designs = {design.path: design for design in designs}
+        self.rtllm_dir = rtllm_dir
+        self.logger = logger
+        self.sim_config = sim_config
+        self.config = config or WatchConfig()
+        self.output_dir = output_dir or RUNS_DIR / f"watch-{new_run_id()}"
+        self.run_dirs = [Path(d) for d in run_dirs] + [self.output_dir]
+        self._source_dirs = {design.directory(rtllm_dir).resolve(): design for design in designs}
+        self._owners: Dict[Path, Optional[DesignEntry]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=sim_config.max_workers, thread_name_prefix="watch")
+        self.model_config = None
+        self.agent_config = None
+        try:
+            # Built once; every regeneration reuses the clients and their connection pools
+            self.model_config, self.agent_config = setup_agent(
+                working_dir=rtllm_dir,
+                model_provider=self.config.provider,
+                temperature=self.config.temperature,
+                max_loops=self.config.max_loops,
+                logger=logger
+            )
+        except Exception as e:
+            print(f"Regeneration disabled, could not set up {self.config.provider}: {str(e)}")
+            logger.warning(f"Regeneration disabled, could not set up {self.config.provider}: {str(e)}")
+
+    def owner(self, work_dir: Path) -> Optional[DesignEntry]:
+        """Design whose testbench a watched design.v is simulated against."""
+        work_dir = work_dir.resolve()
+        if work_dir in self._source_dirs:
+            return self._source_dirs[work_dir]
+        if work_dir not in self._owners:
+            # Run directories nest the design path: <run>/<label>/<design>/sample_<n>/...
+            posix = f"/{work_dir.as_posix()}/"
+            matches = [d for path, d in self.designs.items() if f"/{path}/" in posix]
+            self._owners[work_dir] = max(matches, key=lambda d: len(d.path), default=None)
+        return self._owners[work_dir]
+
+    def scan(self) -> Dict[Path, Stat]:
+        """Modification time and size of every watched file."""
+        files: Dict[Path, Stat] = {}
+        for name in PROMPT_FILES:
+            stat = _stat(CONFIG_DIR / name)
+            if stat:
+                files[CONFIG_DIR / name] = stat
+        for source_dir in self._source_dirs:
+            try:
+                entries = list(os.scandir(source_dir))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name in GENERATED_FILES and entry.name != "design.v":
+                    continue
+                if entry.name.startswith("verified_") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        for run_dir in self.run_dirs:
+            for root, _, names in os.walk(run_dir):
+                if "design.v" in names:
+                    path = Path(root).resolve() / "design.v"
+                    stat = _stat(path)
+                    if stat:
+                        files[path] = stat
+        return files
+
+    def classify(self, changed: Set[Path]) -> Tuple[bool, Set[str], Set[Path]]:
+        """
+        Work caused by changed files.
+
+        Returns:
+            Tuple of (prompts changed, designs to regenerate, design.v
+            directories to re-simulate)
+        """
+        prompts = False
+        regenerate: Set[str] = set()
+        resimulate: Set[Path] = set()
+        for path in changed:
+            if path.parent == CONFIG_DIR:
+                prompts = True
+            elif path.parent in self._source_dirs:
+                design = self._source_dirs[path.parent]
+                if path.name == DESCRIPTION_FILE:
+                    regenerate.add(design.path)
+                elif path.name == "design.v":
+                    resimulate.add(path.parent)
+                else:
+                    resimulate.update(self.work_dirs(design))
+            else:
+                resimulate.add(path.parent)
+        if prompts:
+            regenerate = set(self.designs)
+        return prompts, regenerate, resimulate
+
+    def work_dirs(self, design: DesignEntry) -> List[Path]:
+        """Watched directories with a design.v simulated against a design's testbench."""
+        return [
+            path.parent for path in self.scan()
+            if path.name == "design.v" and self.owner(path.parent) is design
+        ]
+
+    def simulate(self, work_dir: Path, changed_at: float) -> None:
+        """Re-stage and simulate one design.v, printing its verdict."""
+        design = self.owner(work_dir)
+        if design is None or not (work_dir / "design.v").exists():
+            return
+        source_dir = design.directory(self.rtllm_dir)
+        if work_dir != source_dir.resolve():
+            stage_design(source_dir, work_dir)
+        ran, output = run_verilog_tests(work_dir, self.logger, self.sim_config)
+        self.report(design, work_dir, ran and is_passing_output(output), output, changed_at)
+
+    def regenerate(self, design: DesignEntry, changed_at: float) -> Path:
+        """
+        Generate a design again with the configured method and simulate it.
+
+        Returns:
+            Directory the design was written to
+        """
+        source_dir = design.directory(self.rtllm_dir)
+        output_dir = (self.output_dir / design.path).resolve()
+        if self.config.method == "agentic":
+            agent_config = replace(
+                self.agent_config,
+                design_prompt=(source_dir / DESCRIPTION_FILE).read_text(),
+                working_dir=source_dir,
+                output_dir=output_dir,
+                interactive=False
+            )
+            passed, output, _ = run_agentic_generation(self.logger, self.model_config, agent_config, self.sim_config)
+        else:
+            generate = basic_generation if self.config.method == "basic" else rag_generation
+            passed, output = generate(
+                self.logger, self.model_config, working_dir=source_dir,
+                output_dir=output_dir, sim_config=self.sim_config
+            )
+        self._owners[output_dir] = design
+        self.report(design, output_dir, passed, output, changed_at, regenerated=True)
+        return output_dir
+
+    def report(
+        self,
+        design: DesignEntry,
+        work_dir: Path,
+        passed: bool,
+        output: str,
+        changed_at: float,
+        regenerated: bool = False
+    ) -> None:
+        """Print the verdict of a design and the end of its output if it failed."""
+        action = f"regenerated ({self.config.method})" if regenerated else "simulated"
+        where = "" if work_dir == design.directory(self.rtllm_dir).resolve() else f" in {work_dir}"
+        line = (
+            f"[{datetime.now():%H:%M:%S}] {'PASS' if passed else 'FAIL'} {design.path}{where}, "
+            f"{action} {time.time() - changed_at:.2f}s after the change"
+        )
+        if not passed:
+            tail = [l for l in output.splitlines() if l.strip()][-FAILURE_LINES:]
+            line += "".join(f"\n    {l}" for l in tail)
+        print(line, flush=True)
+        self.logger.info(line)
+
+    def handle(
+        self,
+        changed: Dict[Path, Optional[Stat]],
+        snapshot: Dict[Path, Stat],
+        changed_at: Optional[float] = None
+    ) -> None:
+        """
+        Re-run the work of a settled set of changes.
+
+        Args:
+            changed: Changed files and their new stats (None if deleted)
+            snapshot: Stats the next scan is compared against
+            changed_at: Time of the change (default: the newest modification)
+        """
+        prompts, regenerate, resimulate = self.classify(set(changed))
+        if changed_at is None:
+            changed_at = max((stat[0] / 1e9 for stat in changed.values() if stat), default=time.time())
+        if prompts:
+            reload_prompts()
+            print("Reloaded prompts", flush=True)
+        if regenerate and self.model_config is None:
+            print(f"Not regenerating {len(regenerate)} designs: no LLM client", flush=True)
+            regenerate = set()
+        regenerated = [self.designs[path] for path in sorted(regenerate)]
+        output_dirs = {(self.output_dir / design.path).resolve() for design in regenerated}
+        # Regeneration simulates its own output
+        resimulate = {d for d in resimulate if not any(d.is_relative_to(o) for o in output_dirs)}
+        futures = [self._executor.submit(self.regenerate, design, changed_at) for design in regenerated]
+        futures += [self._executor.submit(self.simulate, d, changed_at) for d in sorted(resimulate)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Watch action failed: {str(e)}", flush=True)
+                self.logger.error(f"Watch action failed: {str(e)}")
+        if output_dirs:
+            # Absorb the files regeneration wrote, so they are not re-simulated
+            for path, stat in self.scan().items():
+                if any(path.is_relative_to(o) for o in output_dirs):
+                    snapshot[path] = stat
+
+    def run(self, initial: bool = False) -> None:
+        """
+        Watch until interrupted.
+
+        Args:
+            initial: Simulate every watched design.v once before watching
+        """
+        snapshot = self.scan()
+        designs_v = [path for path in snapshot if path.name == "design.v"]
+        print(
+            f"Watching {len(self.designs)} designs and {len(designs_v)} design.v files "
+            f"(regenerating with {self.config.method} into {self.output_dir}); Ctrl-C to stop",
+            flush=True
+        )
+        if initial:
+            self.handle({path: snapshot[path] for path in designs_v}, snapshot, time.time())
+        pending: Dict[Path, Optional[Stat]] = {}
+        last_change = 0.0
+        try:
+            while True:
+                time.sleep(self.config.poll_s)
+                current = self.scan()
+                changed = {
+                    path: current.get(path)
+                    for path in set(snapshot) | set(current)
+                    if snapshot.get(path) != current.get(path)
+                }
+                if changed:
+                    pending.update(changed)
+                    last_change = time.monotonic()
+                    snapshot = current
+                elif pending and time.monotonic() - last_change >= self.config.debounce_s:
+                    self.handle(pending, snapshot)
+                    pending = {}
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            close = getattr(self.sim_config.runner, "close", None)
+            if close:
+                close()
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Re-evaluate designs as their files are edited")
+    parser.add_argument('-d', '--directory', type=str, help="RTLLM subdirectory to watch (e.g. 'Arithmetic')")
+    parser.add_argument('--glob', action='append', default=[], help="Only designs matching this glob (repeatable)")
+    parser.add_argument('--tag', action='append', default=[], help="Only designs with this manifest tag (repeatable)")
+    parser.add_argument('--regex', type=str, help="Only designs whose path matches this regular expression")
+    parser.add_argument('--runs', type=Path, action='append', default=[],
+                        help="Run directory whose generated design.v files are watched too (repeatable)")
+    parser.add_argument('--output-dir', type=Path, help="Where regenerated designs are written")
+    parser.add_argument('--initial', action='store_true', help="Simulate every watched design.v once at start")
+    parser.add_argument('--method', default=WatchConfig.method, choices=METHODS,
+                        help="Generation method for changed descriptions and prompts")
+    parser.add_argument('--model', default=WatchConfig.provider, choices=['openai', 'anthropic', 'gemini'],
+                        help="LLM provider for regeneration")
+    parser.add_argument('--temperature', type=float, default=WatchConfig.temperature)
+    parser.add_argument('--max-loops', type=int, default=WatchConfig.max_loops, help="Agentic iterations")
+    parser.add_argument('--sim-backend', default='local', choices=['local', 'mcp'],
+                        help="Simulate in-process or on the MCP server (over one persistent connection)")
+    parser.add_argument('--mcp-endpoint', default=DEFAULT_ENDPOINT, help="SSE endpoint of the MCP server")
+    parser.add_argument('--simulator', default=SimulationConfig.simulator, choices=['auto', 'icarus', 'verilator'])
+    parser.add_argument('--fail-fast', action='store_true',
+                        help="Stop simulations at the first failure line of the output")
+    parser.add_argument('--stream', action='store_true', help="Print the simulator output while it runs")
+    parser.add_argument('--sim-workers', type=int, default=SimulationConfig.max_workers,
+                        help="Designs re-simulated concurrently")
+    parser.add_argument('--poll', type=float, default=WatchConfig.poll_s, help="Seconds between file scans")
+    parser.add_argument('--debounce', type=float, default=WatchConfig.debounce_s,
+                        help="Seconds without further changes before re-running")
+    args = parser.parse_args()
+
+    rtllm_dir = Path(__file__).parent.parent / "RTLLM"
+    designs = filter_designs(
+        load_manifest(rtllm_dir), prefix=args.directory, globs=args.glob, tags=args.tag, regex=args.regex
+    )
+    if not designs:
+        parser.error("No designs match the selection")
+    sim_config = SimulationConfig(
+        backend="mcp-session" if args.sim_backend == "mcp" else "local",
+        endpoint=args.mcp_endpoint,
+        simulator=args.simulator,
+        max_workers=args.sim_workers,
+        fail_fast=args.fail_fast,
+        on_output=print_output if args.stream else None
+    )
+    config = WatchConfig(
+        method=args.method,
+        provider=args.model,
+        temperature=args.temperature,
+        max_loops=args.max_loops,
+        poll_s=args.poll,
+        debounce_s=args.debounce
+    )
+    watcher = DesignWatcher(
+        designs, rtllm_dir, create_logger(), sim_config, config,
+        run_dirs=args.runs, output_dir=args.output_dir
+    )
+    watcher.run(initial=args.initial)
+
+if __name__ == "__main__":
+    main()
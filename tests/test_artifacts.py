@@ -0,0 +1,59 @@
+"""Tests for the content-addressed artifact store."""
+
+import pytest
+
+from run_verilog_generation_agent.artifacts import ArtifactStore, SampleArtifacts, _final_record, sample_key
+
+DESIGN = "Arithmetic/Adder/adder_8bit"
+
+def record_sample(store, run_id, model, iterations, sample=0, design=DESIGN):
+    """Record one sample's iterations: a list of (design text, passed)."""
+    artifacts = SampleArtifacts(store, run_id, design, sample, "agentic", model)
+    for iteration, (code, passed) in enumerate(iterations, start=1):
+        artifacts.record_iteration(iteration, passed, design=code)
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(tmp_path / "artifacts")
+
+def test_blobs_are_deduplicated(store):
+    first = store.put("module m; endmodule")
+    assert store.put("module m; endmodule") == first
+    assert store.get_text(store.resolve(first[:8])) == "module m; endmodule"
+    assert store.stats()["blobs"] == 1
+
+def test_final_record_is_filtered_by_model(store):
+    record_sample(store, "run", "openai@0.7", [("openai 1", False), ("openai 2", True)])
+    record_sample(store, "run", "anthropic@0.7", [("anthropic 1", False), ("anthropic 2", False), ("anthropic 3", True)])
+    records = list(store.records("run"))
+
+    openai = _final_record(records, DESIGN, 0, None, "openai@0.7")
+    assert store.get_text(openai["refs"]["design"]) == "openai 2"
+    anthropic = _final_record(records, DESIGN, 0, 2, "anthropic@0.7")
+    assert store.get_text(anthropic["refs"]["design"]) == "anthropic 2"
+
+def test_final_record_refuses_to_mix_models(store):
+    record_sample(store, "run", "openai@0.7", [("openai 1", True)])
+    record_sample(store, "run", "gemini@0.7", [("gemini 1", False), ("gemini 2", False)])
+    records = list(store.records("run"))
+
+    with pytest.raises(KeyError, match="several models"):
+        _final_record(records, DESIGN, 0, None)
+    with pytest.raises(KeyError):
+        _final_record(records, DESIGN, 0, None, "anthropic@0.7")
+    with pytest.raises(KeyError):
+        _final_record(records, DESIGN, 1, None, "openai@0.7")
+
+def test_final_record_prefers_a_passing_branch(store):
+    artifacts = SampleArtifacts(store, "run", DESIGN, 0, "agentic", "openai@0.7")
+    artifacts.record_iteration(1, False, design="first")
+    artifacts.record_iteration(2, True, branch=1, design="passing branch")
+    artifacts.record_iteration(2, False, branch=0, design="failing branch")
+    record = _final_record(list(store.records("run")), DESIGN, 0, None)
+    assert store.get_text(record["refs"]["design"]) == "passing branch"
+
+def test_samples_are_counted_per_model(store):
+    for model in ("openai@0.7", "anthropic@0.7"):
+        for sample in range(2):
+            record_sample(store, "run", model, [("a", False), ("b", True)], sample)
+    assert len({sample_key(r) for r in store.records("run")}) == 4
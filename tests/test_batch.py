@@ -0,0 +1,63 @@
+"""Tests for offline batch preparation and ingestion."""
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from run_verilog_generation_agent import batch
+from run_verilog_generation_agent.artifacts import ArtifactStore
+from run_verilog_generation_agent.batch import BatchKey, batch_response, response_content, write_jsonl
+from run_verilog_generation_agent.manifest import load_manifest
+from run_verilog_generation_agent.matrix import MatrixRun
+from run_verilog_generation_agent.results import ResultStore
+
+RTLLM_DIR = Path(__file__).parent.parent / "RTLLM"
+LOGGER = logging.getLogger(__name__)
+
+def request(design: str, sample: int = 0) -> dict:
+    key = BatchKey("basic", MatrixRun("openai", 0.7), design, sample)
+    return {
+        "custom_id": key.custom_id,
+        "method": "POST",
+        "url": batch.BATCH_ENDPOINT,
+        "body": {"model": "gpt", "messages": [{"role": "user", "content": f"Design {design}"}]},
+    }
+
+def test_batch_key_round_trip():
+    key = BatchKey("rag", MatrixRun("openai", 0.2), "Control/Finite State Machine/fsm", 3)
+    assert BatchKey.parse(key.custom_id) == key
+
+def test_response_content():
+    assert response_content(batch_response("id", "module m; endmodule")) == ("module m; endmodule", "")
+    assert response_content(batch_response("id", error="rate limited")) == ("", "rate limited")
+    assert response_content({"response": {"status_code": 500}})[1] == "Batch request failed with status 500"
+    assert response_content({"response": {"status_code": 200, "body": {}}})[1] == "Malformed batch response"
+
+def test_only_openai_requests_are_built():
+    with pytest.raises(ValueError, match="anthropic, gemini"):
+        batch.build_requests([], RTLLM_DIR, "basic", [MatrixRun("anthropic", 0.7), MatrixRun("gemini", 0.7)], 1, LOGGER)
+
+def test_ingest_skips_unknown_designs(tmp_path, monkeypatch):
+    manifest = load_manifest(RTLLM_DIR, tmp_path / "manifest.json")
+    requests = [request("Arithmetic/Adder/adder_8bit"), request("Arithmetic/Adder/removed_design"),
+                request("Arithmetic/Adder/adder_8bit", 1)]
+    write_jsonl(tmp_path / "requests.jsonl", requests + [{"custom_id": "not a key", "body": {}}])
+    write_jsonl(tmp_path / "results.jsonl", [
+        batch_response(requests[0]["custom_id"], "module adder_8bit(); endmodule"),
+        batch_response(requests[1]["custom_id"], "module removed_design(); endmodule"),
+    ])
+    monkeypatch.setattr(batch, "RUNS_DIR", tmp_path / "runs")
+    monkeypatch.setattr(batch, "run_verilog_tests", lambda *args: (True, "===========Your Design Passed===========\n"))
+
+    store = ResultStore(tmp_path / "results" / "r.jsonl")
+    results = batch.ingest(
+        tmp_path / "requests.jsonl", tmp_path / "results.jsonl", manifest, RTLLM_DIR, store, LOGGER,
+        artifact_store=ArtifactStore(tmp_path / "artifacts")
+    )
+    assert [(r.design, r.sample, r.passed) for r in results] == [
+        ("Arithmetic/Adder/adder_8bit", 0, True),
+        ("Arithmetic/Adder/adder_8bit", 1, False),
+    ]
+    assert results[1].output == "No batch result"
+    assert len(store.load()) == 2
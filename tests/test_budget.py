@@ -0,0 +1,52 @@
+"""Tests for resource budgets."""
+
+import pytest
+
+from run_verilog_generation_agent.budget import Budget, BudgetLimits, parse_budget
+
+def test_parse_budget():
+    assert parse_budget("tokens=50000,wall=600,sim=120") == BudgetLimits(50000, 600.0, 120.0)
+    assert not parse_budget("tokens=0")
+    for spec in ("cpu=5", "tokens=many", "wall=-1"):
+        with pytest.raises(ValueError):
+            parse_budget(spec)
+
+def test_child_charges_its_parent():
+    run = Budget(BudgetLimits(), "run")
+    first, second = run.child(BudgetLimits()), run.child(BudgetLimits())
+    first.charge_tokens(100, 1.5)
+    second.charge_tokens(50)
+    first.charge_sim(0.25, 2.0)
+    second.charge_sim(0.5)
+
+    assert (first.tokens, first.llm_s, first.sim_cpu_s, first.sim_s) == (100, 1.5, 0.25, 2.0)
+    assert (second.tokens, second.sim_cpu_s) == (50, 0.5)
+    assert (run.tokens, run.llm_s, run.sim_cpu_s, run.sim_s) == (150, 1.5, 0.75, 2.0)
+
+def test_exhausted_parent_stops_every_child():
+    run = Budget(BudgetLimits(tokens=100), "run")
+    first, second = run.child(BudgetLimits(tokens=80)), run.child(BudgetLimits(tokens=80))
+    first.charge_tokens(60)
+    assert not first.exhausted() and not second.exhausted()
+
+    second.charge_tokens(60)
+    assert second.exhausted().startswith("run token budget exhausted")
+    assert first.exhausted().startswith("run token budget exhausted")
+    second.charge_tokens(20)
+    assert second.exhausted().startswith("design token budget exhausted")
+
+def test_token_limits_can_be_ignored():
+    run = Budget(BudgetLimits(tokens=10, sim_cpu_s=1.0), "run")
+    design = run.child(BudgetLimits(tokens=10))
+    design.charge_tokens(20)
+    assert design.exhausted() and not design.exhausted(tokens=False)
+
+    design.charge_sim(1.0)
+    assert design.exhausted(tokens=False).startswith("run simulation budget exhausted")
+
+def test_remaining_wall_is_the_tightest_limit():
+    assert Budget(BudgetLimits()).remaining_wall_s() is None
+    run = Budget(BudgetLimits(wall_s=3600), "run")
+    assert run.child(BudgetLimits()).remaining_wall_s() <= 3600
+    assert run.child(BudgetLimits(wall_s=10)).remaining_wall_s() <= 10
+    assert run.child(BudgetLimits(wall_s=10)).remaining_wall_s() > 9
@@ -0,0 +1,29 @@
+"""Tests for simulation diagnostics."""
+
+from MCP.simulators import TRACE_HEADER
+from run_verilog_generation_agent.diagnostics import MAX_TRACE_WIDTH, Diagnostics, parse_output
+
+def trace(rows: int, width: int = 20) -> str:
+    lines = [f"{TRACE_HEADER} of dut around the first mismatch at t=40 (vectors in hex) ---", "time  a  b"]
+    return "\n".join(lines + [f"{t:>4}  " + "f" * width for t in range(rows)])
+
+def test_trace_is_split_from_the_output():
+    output = "Test failed: a = 1\n" + trace(3)
+    diagnostics = parse_output(output)
+    assert diagnostics.trace == trace(3)
+    assert diagnostics.failure_lines == ["Test failed: a = 1"]
+
+def test_prompt_keeps_the_trace_within_max_chars():
+    diagnostics = Diagnostics("simulation", False, failure_lines=["x" * 80] * 40, trace=trace(200))
+    prompt = diagnostics.to_prompt(1000)
+    assert len(prompt) <= 1000
+    assert "... (truncated)" in prompt and prompt.endswith("... (trace truncated)")
+    assert TRACE_HEADER in prompt
+
+def test_prompt_keeps_a_short_trace_whole():
+    diagnostics = Diagnostics("simulation", False, failure_lines=["Test failed"], trace=trace(3))
+    assert diagnostics.to_prompt().endswith(trace(3))
+
+def test_wide_trace_rows_are_cut():
+    diagnostics = Diagnostics("simulation", False, trace=trace(3, width=1000))
+    assert all(len(line) <= MAX_TRACE_WIDTH for line in diagnostics.to_prompt().splitlines())
@@ -0,0 +1,38 @@
+"""Tests for the fail-fast failure patterns."""
+
+from pathlib import Path
+
+from MCP.simulators import FAIL_PATTERNS_FILE, fail_pattern
+
+RTLLM_DIR = Path(__file__).parent.parent / "RTLLM"
+
+def test_default_patterns():
+    pattern = fail_pattern(Path("/nonexistent"))
+    for line in (
+        "Error: Data read from address 0 is incorrect",
+        "ERROR: testbench.v:12: $fatal",
+        "Test failed: a = 1, b = 2",
+        "Failed at fetch operation 1: clk=1",
+        "===========Error===========",
+    ):
+        assert pattern.search(line), line
+    for line in ("===========Your Design Passed===========", "Test completed with 0 errors.", "error = 0"):
+        assert not pattern.search(line), line
+
+def test_design_patterns_extend_the_defaults(tmp_path):
+    (tmp_path / FAIL_PATTERNS_FILE).write_text("# summary only\n\nwrong answer\n")
+    pattern = fail_pattern(tmp_path)
+    assert pattern.search("Wrong answer at cycle 3")
+    assert pattern.search("Test failed: a = 1")
+    assert not pattern.search("# summary only")
+
+def test_explicit_patterns_replace_the_defaults(tmp_path):
+    pattern = fail_pattern(tmp_path, ["wrong answer"])
+    assert pattern.search("wrong answer")
+    assert not pattern.search("Test failed: a = 1")
+
+def test_shipped_summary_patterns():
+    pattern = fail_pattern(RTLLM_DIR / "Arithmetic/Adder/adder_8bit")
+    assert pattern.search("===========Test completed with          3 /100 failures===========")
+    assert pattern.search("=========== Test completed with 12/20 failures ===========")
+    assert not pattern.search("=========== Test completed with           0 / 100 failures ===========")
@@ -0,0 +1,72 @@
+"""Tests for the staged basic/RAG pipeline."""
+
+import logging
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from run_verilog_generation_agent import pipeline
+from run_verilog_generation_agent.artifacts import ArtifactStore, SampleArtifacts
+from run_verilog_generation_agent.budget import parse_budget
+from run_verilog_generation_agent.manifest import load_manifest
+from run_verilog_generation_agent.matrix import MatrixRun
+from run_verilog_generation_agent.results import ResultStore
+from run_verilog_generation_agent.setup_verilog_generation_agent import ModelConfig
+
+RTLLM_DIR = Path(__file__).parent.parent / "RTLLM"
+PASSED = "===========Your Design Passed===========\n"
+
+@pytest.fixture
+def sweep(tmp_path, monkeypatch):
+    """Run a basic pipeline sweep with fake LLMs and simulations; returns (results, generation order)."""
+    designs = [
+        d for d in load_manifest(RTLLM_DIR, tmp_path / "manifest.json")
+        if d.name in ("adder_8bit", "adder_16bit")
+    ]
+    order = []
+
+    class RecordingModel(FakeListChatModel):
+        def invoke(self, messages, *args, **kwargs):
+            order.append(self.responses[0].split()[1].rstrip("();"))
+            return super().invoke(messages, *args, **kwargs)
+
+    def model_config(provider, *args, **kwargs):
+        response = f"module {provider}(); endmodule"
+        return ModelConfig(RecordingModel(responses=[response]), None, None, "", "system prompt")
+
+    monkeypatch.setattr(pipeline, "create_model_config", model_config)
+    monkeypatch.setattr(pipeline, "RUNS_DIR", tmp_path / "runs")
+    monkeypatch.setattr(pipeline, "run_verilog_tests", lambda *args: (True, PASSED))
+
+    def run(runs, **kwargs):
+        store = ResultStore(tmp_path / "results.jsonl")
+        results = pipeline.run_pipeline(
+            [MatrixRun(provider, 0.7) for provider in runs], designs, RTLLM_DIR, "basic", store,
+            logging.getLogger(__name__), samples=2, artifact_store=ArtifactStore(tmp_path / "artifacts"),
+            config=pipeline.PipelineConfig(retrieve_workers=1, generate_workers=1, simulate_workers=1),
+            **kwargs
+        )
+        return results, order
+    return run
+
+def test_providers_are_interleaved_without_history(sweep):
+    results, order = sweep(["openai", "anthropic", "gemini"])
+    assert len(results) == 12 and all(r.passed for r in results)
+    assert order[:3] == ["openai", "anthropic", "gemini"]
+    assert all(order[i] != order[i + 1] for i in range(len(order) - 1))
+
+def test_score_errors_are_recorded(sweep, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(SampleArtifacts, "record_iteration", fail)
+    results, _ = sweep(["openai"])
+    assert len(results) == 4
+    assert all(not r.passed and r.output == "Error during score: disk full" for r in results)
+
+def test_run_budget_skips_samples(sweep):
+    results, order = sweep(["openai"], run_budget=parse_budget("tokens=1"))
+    assert len(order) == 1
+    skipped = [r for r in results if r.iterations == 0]
+    assert len(skipped) == 3
+    assert all(r.aborted.startswith("run token budget exhausted") and r.duration_s == 0.0 for r in skipped)
@@ -0,0 +1,40 @@
+"""Tests for recovering interrupted RAG compactions."""
+
+import chromadb
+import pytest
+
+from run_verilog_generation_agent.rag_index import COMPACT_SUFFIX, recover_compaction
+
+NAME = "langchain"
+COPY = f"{NAME}{COMPACT_SUFFIX}"
+
+def add(collection, *ids):
+    collection.add(ids=list(ids), documents=list(ids), embeddings=[[float(i), 1.0] for i in range(len(ids))])
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(path=str(tmp_path))
+
+def collections(client) -> dict:
+    return {c.name: client.get_collection(c.name).count() for c in client.list_collections()}
+
+def test_incomplete_copy_is_dropped(client, tmp_path):
+    add(client.create_collection(NAME), "a", "b", "c")
+    add(client.create_collection(COPY), "a")
+    recover_compaction(str(tmp_path))
+    assert collections(client) == {NAME: 3}
+
+def test_copy_replaces_a_deleted_collection(client, tmp_path):
+    add(client.create_collection(COPY), "a", "b")
+    recover_compaction(str(tmp_path))
+    assert collections(client) == {NAME: 2}
+
+def test_copy_replaces_an_empty_collection(client, tmp_path):
+    client.create_collection(NAME)
+    add(client.create_collection(COPY), "a", "b")
+    recover_compaction(str(tmp_path))
+    assert collections(client) == {NAME: 2}
+
+def test_missing_store_is_left_alone(tmp_path):
+    recover_compaction(str(tmp_path / "missing"))
+    assert not (tmp_path / "missing").exists()
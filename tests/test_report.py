@@ -0,0 +1,37 @@
+"""Tests for the vectorized report statistics."""
+
+from math import comb
+
+import numpy as np
+
+from run_verilog_generation_agent.report import group_percentiles, pass_at_k
+
+def test_pass_at_k_matches_the_closed_form():
+    n = np.array([10, 10, 10, 5, 3])
+    c = np.array([0, 3, 10, 1, 2])
+    for k in (1, 2, 5):
+        expected = [1 - comb(ni - ci, k) / comb(ni, k) if ni >= k else np.nan for ni, ci in zip(n, c)]
+        np.testing.assert_allclose(pass_at_k(n, c, k), expected)
+
+def test_pass_at_1_is_the_pass_rate():
+    np.testing.assert_allclose(pass_at_k(np.array([4, 8]), np.array([1, 6]), 1), [0.25, 0.75])
+
+def test_group_percentiles_match_numpy():
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, 3, 200)
+    values = rng.exponential(2.0, 200)
+    values[::7] = 0.0
+    values[::11] = np.nan
+    counts, means, result = group_percentiles(ids, values, 4, (50, 90, 99))
+
+    for group in range(3):
+        kept = values[(ids == group) & (values > 0)]
+        assert counts[group] == len(kept)
+        np.testing.assert_allclose(means[group], kept.mean())
+        np.testing.assert_allclose(result[group], np.percentile(kept, [50, 90, 99]))
+    assert counts[3] == 0 and np.isnan(means[3]) and np.isnan(result[3]).all()
+
+def test_group_percentiles_of_a_single_value():
+    counts, means, result = group_percentiles(np.array([0, 0]), np.array([1.5, 0.0]), 1)
+    assert counts.tolist() == [1] and means.tolist() == [1.5]
+    assert result.tolist() == [[1.5, 1.5, 1.5]]
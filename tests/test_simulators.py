@@ -0,0 +1,23 @@
+"""Tests for the simulator backends."""
+
+import asyncio
+from pathlib import Path
+
+from MCP import simulators
+from MCP.simulators import TIMEOUT_MESSAGE, IcarusBackend
+
+def test_compile_and_simulation_share_the_timeout(monkeypatch):
+    calls = []
+
+    async def exec_(*cmd, cwd, timeout=None, on_line=None):
+        calls.append((cmd[0], timeout))
+        return 0, "", 0.75, 0.5
+
+    monkeypatch.setattr(simulators, "_exec", exec_)
+    res = asyncio.run(IcarusBackend().run(Path("."), timeout=1.0))
+    assert res["success"] and calls == [("iverilog", 1.0), ("vvp", 0.25)]
+
+    calls.clear()
+    res = asyncio.run(IcarusBackend().run(Path("."), timeout=0.5))
+    assert not res["success"] and calls == [("iverilog", 0.5)]
+    assert res["output"].startswith(f"{TIMEOUT_MESSAGE} after 0.5s")
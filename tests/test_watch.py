@@ -0,0 +1,57 @@
+"""Tests for classifying watched file changes."""
+
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+
+from run_verilog_generation_agent import watch
+from run_verilog_generation_agent.manifest import load_manifest
+from run_verilog_generation_agent.setup_verilog_generation_agent import CONFIG_DIR
+from run_verilog_generation_agent.simulation import SimulationConfig
+
+RTLLM_DIR = Path(__file__).parent.parent / "RTLLM"
+DESIGNS = ("Arithmetic/Adder/adder_8bit", "Arithmetic/Adder/adder_16bit")
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    """Watcher over two copied designs, with a run holding a generated design.v of each."""
+    rtllm_dir = tmp_path / "RTLLM"
+    for design in DESIGNS:
+        shutil.copytree(RTLLM_DIR / design, rtllm_dir / design)
+    (rtllm_dir / DESIGNS[0] / "design.v").write_text("module adder_8bit(); endmodule\n")
+    run_dir = tmp_path / "runs" / "run"
+    for design in DESIGNS:
+        (run_dir / "openai@0.7" / design / "sample_0").mkdir(parents=True)
+        (run_dir / "openai@0.7" / design / "sample_0" / "design.v").write_text("module m(); endmodule\n")
+
+    monkeypatch.setattr(watch, "setup_agent", lambda **kwargs: (None, None))
+    designs = load_manifest(rtllm_dir, tmp_path / "manifest.json")
+    watcher = watch.DesignWatcher(
+        designs, rtllm_dir, logging.getLogger(__name__), SimulationConfig(),
+        run_dirs=[run_dir], output_dir=tmp_path / "watch"
+    )
+    yield watcher, rtllm_dir.resolve(), run_dir.resolve()
+    watcher._executor.shutdown()
+
+def test_description_change_regenerates_the_design(watcher):
+    watcher, rtllm_dir, _ = watcher
+    assert watcher.classify({rtllm_dir / DESIGNS[1] / "design_description.txt"}) == (False, {DESIGNS[1]}, set())
+
+def test_design_change_resimulates_only_that_design(watcher):
+    watcher, rtllm_dir, run_dir = watcher
+    source = rtllm_dir / DESIGNS[0]
+    generated = run_dir / "openai@0.7" / DESIGNS[1] / "sample_0"
+    assert watcher.classify({source / "design.v", generated / "design.v"}) == (False, set(), {source, generated})
+
+def test_testbench_change_resimulates_every_design_of_it(watcher):
+    watcher, rtllm_dir, run_dir = watcher
+    source = rtllm_dir / DESIGNS[0]
+    assert watcher.classify({source / "testbench.v"}) == (
+        False, set(), {source, run_dir / "openai@0.7" / DESIGNS[0] / "sample_0"}
+    )
+
+def test_prompt_change_regenerates_every_design(watcher):
+    watcher, _, _ = watcher
+    assert watcher.classify({CONFIG_DIR / "system_prompt.yml"}) == (True, set(DESIGNS), set())